@@ -0,0 +1,146 @@
+import re
+from itertools import combinations
+
+import numpy as np
+
+# Dimensões do cubo, na ordem canônica usada nas chaves das agregações
+CONTRIBUTION_DIMENSIONS = ('categoria', 'status', 'party', 'deputy_id')
+CONTRIBUTION_MEASURES = ('total', 'from_allocated_intention', 'from_free_verba', 'count')
+EMENDA_DIMENSIONS = ('categoria', 'status')
+EMENDA_MEASURES = ('count', 'valor_necessario', 'funded_amount', 'missing_amount')
+
+NO_PARTY = "Sem partido"
+_PARTY_PATTERN = re.compile(r"\(([^()]+)\)\s*$")
+
+
+def party_from_name(name):
+    """Extrai a sigla do partido do nome no formato 'Fábio Félix (PSOL)'."""
+    if not isinstance(name, str):
+        return NO_PARTY
+    match = _PARTY_PATTERN.search(name)
+    return match.group(1).strip() if match else NO_PARTY
+
+
+class _Rollups:
+    """
+    Todas as agregações (somas e contagens) de uma tabela de fatos para cada
+    subconjunto de dimensões, materializadas de uma vez. Consultas com filtros por
+    igualdade são uma busca em dicionário; filtros com vários valores somam a
+    combinação das buscas.
+    """
+    def __init__(self, fact, dimensions, measures):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.values = {dim: sorted(fact[dim].dropna().unique().tolist(), key=str) for dim in dimensions}
+        self._zero = np.zeros(len(measures))
+        self._levels = {} # {dims (tupla canônica): {chave: medidas}}
+        self._slices = {} # {(dims, dim): {chave sem dim: {valor de dim: medidas}}}
+
+        sums = [m for m in measures if m != 'count']
+        for size in range(len(dimensions) + 1):
+            for dims in combinations(dimensions, size):
+                if dims:
+                    grouped = fact.groupby(list(dims), sort=False)
+                    table = grouped[sums].sum()
+                    table['count'] = grouped.size()
+                    keys = table.index if len(dims) > 1 else [(k,) for k in table.index]
+                    level = dict(zip(keys, table[list(measures)].to_numpy(dtype=float)))
+                else:
+                    totals = fact[sums].sum()
+                    totals['count'] = len(fact)
+                    level = {(): totals[list(measures)].to_numpy(dtype=float)}
+                self._levels[dims] = level
+                for pos, dim in enumerate(dims):
+                    slices = self._slices.setdefault((dims, dim), {})
+                    for key, measures_row in level.items():
+                        rest = key[:pos] + key[pos + 1:]
+                        slices.setdefault(rest, {})[key[pos]] = measures_row
+
+    def total(self, filters):
+        """Medidas somadas para os filtros {dimensão: valor ou coleção de valores}."""
+        dims, choices = self._normalize(filters)
+        level = self._levels[dims]
+        result = self._zero
+        for key in self._product(choices):
+            result = result + level.get(key, self._zero)
+        return self._as_dict(result)
+
+    def breakdown(self, dimension, filters):
+        """{valor da dimensão: medidas} para os filtros informados (a dimensão em si não é filtrada)."""
+        filters = {dim: value for dim, value in filters.items() if dim != dimension}
+        dims, choices = self._normalize(filters)
+        level_dims = tuple(d for d in self.dimensions if d in dims or d == dimension)
+        slices = self._slices[(level_dims, dimension)]
+        result = {}
+        for key in self._product(choices):
+            for value, measures_row in slices.get(key, {}).items():
+                result[value] = result.get(value, self._zero) + measures_row
+        return {value: self._as_dict(result[value]) for value in sorted(result, key=str)}
+
+    def _as_dict(self, measures_row):
+        return {m: int(v) if m == 'count' else v for m, v in zip(self.measures, measures_row.tolist())}
+
+    def _normalize(self, filters):
+        dims = []
+        choices = []
+        for dim in self.dimensions:
+            value = filters.get(dim)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set, frozenset)):
+                value = list(value)
+                if not value: # Coleção vazia = sem filtro, como um multiselect vazio
+                    continue
+            else:
+                value = [value]
+            dims.append(dim)
+            choices.append(value)
+        return tuple(dims), choices
+
+    @staticmethod
+    def _product(choices):
+        keys = [()]
+        for values in choices:
+            keys = [key + (value,) for key in keys for value in values]
+        return keys
+
+
+class AggregateCube:
+    """
+    Cubo de agregados materializado a partir de um ReportModel (uma vez por alocação confirmada).
+    - contribuições: total, parcela da intenção, parcela da verba livre e quantidade,
+      por categoria × status da emenda × partido × deputado
+    - emendas: quantidade, valor necessário, contemplado e faltante, por categoria × status
+    Qualquer combinação de filtros é respondida a partir dos agregados pré-calculados,
+    sem percorrer as emendas.
+    """
+    def __init__(self, model):
+        contributions = model.contributions.merge(
+            model.emendas[['id', 'status']].rename(columns={'id': 'emenda_id'}), on='emenda_id', how='left'
+        )
+        contributions['party'] = contributions['deputy_name'].map(party_from_name)
+        self.deputy_names = dict(zip(model.deputies['id'], model.deputies['name']))
+        self._contributions = _Rollups(contributions, CONTRIBUTION_DIMENSIONS, CONTRIBUTION_MEASURES)
+        self._emendas = _Rollups(model.emendas, EMENDA_DIMENSIONS, EMENDA_MEASURES)
+
+    def dimension_values(self, dimension):
+        rollups = self._emendas if dimension in EMENDA_DIMENSIONS else self._contributions
+        values = set(rollups.values[dimension])
+        if dimension in EMENDA_DIMENSIONS:
+            values.update(self._contributions.values[dimension])
+        return sorted(values, key=str)
+
+    def contributions(self, categoria=None, status=None, party=None, deputy_id=None):
+        """Somatório das contribuições para os filtros (valor, coleção de valores ou None = todos)."""
+        return self._contributions.total({'categoria': categoria, 'status': status, 'party': party, 'deputy_id': deputy_id})
+
+    def contributions_by(self, dimension, categoria=None, status=None, party=None, deputy_id=None):
+        """Contribuições agrupadas por uma dimensão: {valor: medidas}."""
+        return self._contributions.breakdown(dimension, {'categoria': categoria, 'status': status, 'party': party, 'deputy_id': deputy_id})
+
+    def emendas(self, categoria=None, status=None):
+        """Quantidade e valores das emendas para os filtros de categoria/status."""
+        return self._emendas.total({'categoria': categoria, 'status': status})
+
+    def emendas_by(self, dimension, categoria=None, status=None):
+        return self._emendas.breakdown(dimension, {'categoria': categoria, 'status': status})
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+CHANGE_NEW = 'nova'
+CHANGE_REMOVED = 'removida'
+CHANGE_CHANGED = 'alterada'
+NO_STATUS = '—' # Emenda inexistente em um dos lados
+TOLERANCE = 0.005 # Diferenças menores que meio centavo são ignoradas
+
+LEDGER_AMOUNTS = ['total', 'from_allocated_intention', 'from_free_verba']
+
+
+class AllocationDiff:
+    """
+    Diferença entre dois estados de alocação (ReportModel de dois snapshots), calculada
+    sobre os livros de contribuições (emenda × deputado). Os dois livros são ordenados
+    por uma chave composta e combinados com união/searchsorted do NumPy, sem laços em Python.
+    - contributions: contribuições novas, removidas ou alteradas (antes, depois, delta)
+    - status_transitions: emendas cujo status mudou
+    - deputy_deltas: variação do total contribuído por deputado
+    """
+    def __init__(self, before, after, before_version=None, after_version=None):
+        self.before_version = before_version
+        self.after_version = after_version
+        self.contributions = self._diff_contributions(before, after)
+        self.status_transitions = self._diff_status(before.emendas, after.emendas)
+        self.deputy_deltas = self._deputy_deltas(self.contributions)
+
+    @property
+    def is_empty(self):
+        return self.contributions.empty and self.status_transitions.empty
+
+    def summary(self):
+        counts = self.contributions['change'].value_counts()
+        return {
+            'new': int(counts.get(CHANGE_NEW, 0)),
+            'removed': int(counts.get(CHANGE_REMOVED, 0)),
+            'changed': int(counts.get(CHANGE_CHANGED, 0)),
+            'status_transitions': len(self.status_transitions),
+            'deputies': len(self.deputy_deltas),
+        }
+
+    @staticmethod
+    def _ledger_keys(ledger, width):
+        return ledger['emenda_id'].to_numpy(dtype=np.int64) * width + ledger['deputy_id'].to_numpy(dtype=np.int64)
+
+    @staticmethod
+    def _sorted_union(a, b):
+        """União ordenada e sem repetições de dois vetores já ordenados (intercalação, não hash)."""
+        merged = np.sort(np.concatenate([a, b]), kind='stable') # Timsort: apenas intercala as duas sequências
+        if len(merged) == 0:
+            return merged
+        keep = np.empty(len(merged), dtype=bool)
+        keep[0] = True
+        np.not_equal(merged[1:], merged[:-1], out=keep[1:])
+        return merged[keep]
+
+    def _diff_contributions(self, before, after):
+        ledger_before = before.contributions
+        ledger_after = after.contributions
+        max_deputy = max([0] + [int(l['deputy_id'].max()) for l in (ledger_before, ledger_after) if not l.empty])
+        width = max_deputy + 1
+
+        keys_before = self._ledger_keys(ledger_before, width)
+        keys_after = self._ledger_keys(ledger_after, width)
+        order_before = np.argsort(keys_before, kind='stable')
+        order_after = np.argsort(keys_after, kind='stable')
+        keys_before = keys_before[order_before]
+        keys_after = keys_after[order_after]
+
+        keys = self._sorted_union(keys_before, keys_after)
+        amounts = {}
+        present = {}
+        for side, ledger, sorted_keys, order in (('before', ledger_before, keys_before, order_before),
+                                                 ('after', ledger_after, keys_after, order_after)):
+            pos = np.searchsorted(sorted_keys, keys)
+            found = pos < len(sorted_keys)
+            found[found] = sorted_keys[pos[found]] == keys[found]
+            present[side] = found
+            source_rows = order[pos[found]]
+            for column in LEDGER_AMOUNTS:
+                values = np.zeros(len(keys))
+                values[found] = ledger[column].to_numpy(dtype=float)[source_rows]
+                amounts[(side, column)] = values
+
+        delta = amounts[('after', 'total')] - amounts[('before', 'total')]
+        moved = (np.abs(delta) > TOLERANCE) | (present['before'] != present['after']) | np.any(
+            [np.abs(amounts[('after', c)] - amounts[('before', c)]) > TOLERANCE for c in LEDGER_AMOUNTS[1:]], axis=0)
+        keys = keys[moved]
+        change = np.where(~present['before'][moved], CHANGE_NEW, np.where(~present['after'][moved], CHANGE_REMOVED, CHANGE_CHANGED))
+
+        result = pd.DataFrame({
+            'emenda_id': keys // width,
+            'deputy_id': keys % width,
+            'change': change,
+            'before': amounts[('before', 'total')][moved],
+            'after': amounts[('after', 'total')][moved],
+            'delta': delta[moved],
+            'from_allocated_intention_delta': (amounts[('after', 'from_allocated_intention')] - amounts[('before', 'from_allocated_intention')])[moved],
+            'from_free_verba_delta': (amounts[('after', 'from_free_verba')] - amounts[('before', 'from_free_verba')])[moved],
+        })
+        names = pd.concat([before.deputies[['id', 'name']], after.deputies[['id', 'name']]]).drop_duplicates('id', keep='last').set_index('id')['name']
+        descriptions = pd.concat([before.emendas[['id', 'description']], after.emendas[['id', 'description']]]).drop_duplicates('id', keep='last').set_index('id')['description']
+        result.insert(1, 'description', result['emenda_id'].map(descriptions))
+        result.insert(3, 'deputy_name', result['deputy_id'].map(names))
+        return result
+
+    @staticmethod
+    def _diff_status(emendas_before, emendas_after):
+        columns = ['id', 'description', 'status', 'funded_amount']
+        merged = emendas_before[columns].merge(emendas_after[columns], on='id', how='outer', suffixes=('_before', '_after'), sort=True)
+        merged['description'] = merged['description_after'].fillna(merged['description_before'])
+        merged[['status_before', 'status_after']] = merged[['status_before', 'status_after']].fillna(NO_STATUS)
+        merged[['funded_amount_before', 'funded_amount_after']] = merged[['funded_amount_before', 'funded_amount_after']].fillna(0.0)
+        changed = merged[merged['status_before'] != merged['status_after']]
+        return changed[['id', 'description', 'status_before', 'status_after', 'funded_amount_before', 'funded_amount_after']].reset_index(drop=True)
+
+    @staticmethod
+    def _deputy_deltas(contributions):
+        if contributions.empty:
+            return pd.DataFrame(columns=['deputy_id', 'deputy_name', 'before', 'after', 'delta', 'changed_contributions'])
+        grouped = contributions.groupby('deputy_id', sort=True)
+        deltas = grouped[['before', 'after', 'delta']].sum()
+        deltas['changed_contributions'] = grouped.size()
+        deltas.insert(0, 'deputy_name', grouped['deputy_name'].first())
+        return deltas.reset_index()
+
+    def display_tables(self):
+        """Tabelas rotuladas para exibição: {título: DataFrame}."""
+        return {
+            "Contribuições Alteradas": self.contributions.rename(columns={
+                'emenda_id': "ID Emenda", 'description': "Emenda", 'deputy_id': "ID Deputado", 'deputy_name': "Deputado",
+                'change': "Mudança", 'before': "Antes", 'after': "Depois", 'delta': "Variação",
+                'from_allocated_intention_delta': "Variação (Intenção)", 'from_free_verba_delta': "Variação (Verba Livre)",
+            }),
+            "Mudanças de Status": self.status_transitions.rename(columns={
+                'id': "ID Emenda", 'description': "Emenda", 'status_before': "Status Antes", 'status_after': "Status Depois",
+                'funded_amount_before': "Contemplado Antes", 'funded_amount_after': "Contemplado Depois",
+            }),
+            "Variação por Deputado": self.deputy_deltas.rename(columns={
+                'deputy_id': "ID Deputado", 'deputy_name': "Deputado", 'before': "Contribuído Antes",
+                'after': "Contribuído Depois", 'delta': "Variação", 'changed_contributions': "Contribuições Alteradas",
+            }),
+        }
@@ -1,42 +1,98 @@
+import copy
 import math
+import time
 from Deputy import Deputy
 from Emenda import Emenda
 from DeputyManager import DeputyManager
 from EmendaManager import EmendaManager
 from DataManager import DataManager # Importar DataManager
+import EventBus as events
+from Metrics import metrics
+
+# Fases reportadas ao callback de progresso: fase -> (início, fim) da fração total
+PHASE_RESET = "Zerando contribuições"
+PHASE_INTENTION = "Fase 1: verba alocada por categoria"
+PHASE_FREE = "Fase 2: verba livre"
+PHASE_SAVE = "Gravando resultados"
+PHASE_RANGES = {PHASE_RESET: (0.0, 0.05), PHASE_INTENTION: (0.05, 0.5), PHASE_FREE: (0.5, 0.95), PHASE_SAVE: (0.95, 1.0)}
+
+
+class OptimizationCancelled(Exception):
+    """Levantada pelo callback de progresso para interromper a otimização; o estado anterior é restaurado."""
+
 
 class AllocationOptimizer:
-    def __init__(self, deputy_manager: DeputyManager, emenda_manager: EmendaManager, data_manager: DataManager): 
+    def __init__(self, deputy_manager: DeputyManager, emenda_manager: EmendaManager, data_manager: DataManager, event_bus=None): 
         self.deputy_manager = deputy_manager
         self.emenda_manager = emenda_manager
         self.data_manager = data_manager
+        # Por padrão, compartilha o barramento de eventos do DeputyManager
+        self.event_bus = event_bus if event_bus is not None else deputy_manager.event_bus
+
+    @staticmethod
+    def _report_progress(progress, phase, done, total):
+        """
+        Informa ao callback progress(fase, fração) o avanço dentro da fase. O callback pode
+        levantar OptimizationCancelled para interromper a otimização (cancelamento cooperativo).
+        """
+        if progress is None:
+            return
+        start, end = PHASE_RANGES[phase]
+        progress(phase, start + (end - start) * (done / total if total else 1.0))
+
+    def _capture_state(self):
+        """Registros serializados de todos os deputados e emendas, para restaurar se a otimização não for concluída."""
+        return (
+            {d.id: copy.deepcopy(d.serialize()) for d in self.deputy_manager.list_deputies()},
+            {e.id: copy.deepcopy(e.serialize()) for e in self.emenda_manager.list_emendas()},
+        )
+
+    def _restore_state(self, captured):
+        deputy_records, emenda_records = captured
+        self.deputy_manager.apply_records(deputy_records)
+        self.emenda_manager.apply_records(emenda_records)
 
     def _reset_all_emenda_contributions(self):
         """
         Zera todas as contribuições de todas as emendas e o valor total financiado.
+        Retorna os IDs das emendas que tinham alguma contribuição.
         """
+        touched_emenda_ids = set()
         for emenda in self.emenda_manager.list_emendas():
+            if emenda.current_contributions or emenda.current_funded_amount:
+                touched_emenda_ids.add(emenda.id)
             emenda.current_funded_amount = 0.0
             emenda.current_contributions = {}
         # Não precisamos salvar aqui, pois será salvo ao final da otimização.
+        return touched_emenda_ids
 
     def _reset_specific_deputy_contributions(self, deputy_id):
         """
         Remove todas as contribuições de um deputado específico de todas as emendas.
         Ajusta o valor financiado e as contribuições das emendas.
+        Retorna os IDs das emendas alteradas.
         """
+        touched_emenda_ids = set()
         for emenda in self.emenda_manager.list_emendas():
-            if deputy_id in emenda.current_contributions:
-                removed_amount = emenda.current_contributions[deputy_id]['total']
-                emenda.current_funded_amount = max(0, emenda.current_funded_amount - removed_amount)
-                del emenda.current_contributions[deputy_id]
+            # Contribuições lidas do JSON têm chave string; as criadas na sessão também usam str(deputy.id)
+            for key in (str(deputy_id), deputy_id):
+                if key in emenda.current_contributions:
+                    removed_amount = emenda.current_contributions[key]['total']
+                    emenda.current_funded_amount = max(0, emenda.current_funded_amount - removed_amount)
+                    del emenda.current_contributions[key]
+                    touched_emenda_ids.add(emenda.id)
         # Não precisamos salvar aqui, pois será salvo ao final da otimização.
+        return touched_emenda_ids
 
-    def _distribute_funds_from_deputies(self, deputies_to_distribute: list[Deputy], all_emendas: list[Emenda]):
+    def _distribute_funds_from_deputies(self, deputies_to_distribute: list[Deputy], all_emendas: list[Emenda], progress=None):
         """
         Aplica a lógica de distribuição de fundos para uma lista de deputados
         e emendas, atualizando o estado _real_ das emendas e quanto cada deputado gastou.
+        Retorna os IDs das emendas que receberam contribuições.
         """
+        touched_emenda_ids = set()
+        emendas_scanned = 0 # Emendas examinadas nas duas fases (métrica optimizer.emendas_scanned)
+        phase_started = time.perf_counter()
         
         deputy_effective_available_funds = {}
         for deputy in deputies_to_distribute:
@@ -44,13 +100,15 @@ class AllocationOptimizer:
              deputy.actual_spent_amount = 0.0 
 
         # --- FASE 1: Verba ALOCADA POR CATEGORIA (INTENÇÃO) ---
-        for deputy in deputies_to_distribute:
+        for position, deputy in enumerate(deputies_to_distribute):
+            self._report_progress(progress, PHASE_INTENTION, position, len(deputies_to_distribute))
             for category, allocated_amount_from_deputy_intention in deputy.allocated_by_category.items():
                 if allocated_amount_from_deputy_intention <= 0 or deputy_effective_available_funds[deputy.id] <= 0:
                     continue
 
                 emendas_in_category = [e for e in all_emendas if e.categoria == category]
                 emendas_in_category.sort(key=lambda e: e.valor_necessario) 
+                emendas_scanned += len(all_emendas)
 
                 current_deputy_funds_for_category = min(allocated_amount_from_deputy_intention, deputy_effective_available_funds[deputy.id])
                 
@@ -64,12 +122,13 @@ class AllocationOptimizer:
 
                     if amount_to_contribute > 0:
                         emenda_obj.current_funded_amount += amount_to_contribute
+                        touched_emenda_ids.add(emenda_obj.id)
                         
-                        if deputy.id not in emenda_obj.current_contributions:
-                            emenda_obj.current_contributions[deputy.id] = {'total': 0, 'from_allocated_intention': 0, 'from_free_verba': 0}
-                        
-                        emenda_obj.current_contributions[deputy.id]['total'] += amount_to_contribute
-                        emenda_obj.current_contributions[deputy.id]['from_allocated_intention'] += amount_to_contribute
+                        contribution = emenda_obj.current_contributions.setdefault(
+                            str(deputy.id), {'total': 0, 'from_allocated_intention': 0, 'from_free_verba': 0}
+                        )
+                        contribution['total'] += amount_to_contribute
+                        contribution['from_allocated_intention'] += amount_to_contribute
                         
                         current_deputy_funds_for_category -= amount_to_contribute
                         deputy_effective_available_funds[deputy.id] -= amount_to_contribute 
@@ -78,14 +137,19 @@ class AllocationOptimizer:
                     if current_deputy_funds_for_category <= 0 or deputy_effective_available_funds[deputy.id] <= 0:
                         break
 
+        metrics.observe("optimizer.phase1.ms", (time.perf_counter() - phase_started) * 1000)
+        phase_started = time.perf_counter()
+
         # --- FASE 2: Verba REMANESCENTE/LIVRE do deputado ---
-        for deputy in deputies_to_distribute:
+        for position, deputy in enumerate(deputies_to_distribute):
+            self._report_progress(progress, PHASE_FREE, position, len(deputies_to_distribute))
             remaining_verba_for_deputy = deputy_effective_available_funds[deputy.id] 
             
             if remaining_verba_for_deputy <= 0:
                 continue
 
             potential_emendas_for_free_funds = []
+            emendas_scanned += len(all_emendas)
             for emenda_obj in all_emendas: 
                 if emenda_obj.valor_necessario - emenda_obj.current_funded_amount > 0: 
                     inclination_score = deputy.get_inclination_score(emenda_obj.categoria)
@@ -105,43 +169,67 @@ class AllocationOptimizer:
 
                 if amount_to_contribute > 0:
                     emenda_obj.current_funded_amount += amount_to_contribute
+                    touched_emenda_ids.add(emenda_obj.id)
                     
-                    if deputy.id not in emenda_obj.current_contributions:
-                        emenda_obj.current_contributions[deputy.id] = {'total': 0, 'from_allocated_intention': 0, 'from_free_verba': 0}
-                    
-                    emenda_obj.current_contributions[deputy.id]['total'] += amount_to_contribute
-                    emenda_obj.current_contributions[deputy.id]['from_free_verba'] += amount_to_contribute
+                    contribution = emenda_obj.current_contributions.setdefault(
+                        str(deputy.id), {'total': 0, 'from_allocated_intention': 0, 'from_free_verba': 0}
+                    )
+                    contribution['total'] += amount_to_contribute
+                    contribution['from_free_verba'] += amount_to_contribute
                     
                     remaining_verba_for_deputy -= amount_to_contribute
                     deputy_effective_available_funds[deputy.id] -= amount_to_contribute 
                     deputy.actual_spent_amount += amount_to_contribute 
         
-        self.data_manager.save_emendas(all_emendas) 
-        self.data_manager.save_deputies(self.deputy_manager.list_deputies())
+        metrics.observe("optimizer.phase2.ms", (time.perf_counter() - phase_started) * 1000)
+        metrics.increment("optimizer.emendas_scanned", emendas_scanned)
+        metrics.observe("optimizer.deputies_distributed", len(deputies_to_distribute))
 
+        self._report_progress(progress, PHASE_SAVE, 0, 1)
+        with metrics.timer("optimizer.save.ms"):
+            self.data_manager.save_emendas(all_emendas) 
+            self.data_manager.save_deputies(self.deputy_manager.list_deputies())
+        return touched_emenda_ids
 
-    def perform_full_redistribution(self):
+
+    @metrics.timed("optimizer.full.ms")
+    def perform_full_redistribution(self, progress=None):
         """
         Executa uma redistribuição completa de todas as verbas de todos os deputados para todas as emendas.
+        progress(fase, fração), se informado, recebe o andamento e pode cancelar a otimização.
         """
         all_emendas = self.emenda_manager.list_emendas()
         all_deputies = self.deputy_manager.list_deputies()
+        deputy_ids = [d.id for d in all_deputies]
+        captured = self._capture_state()
+        self.event_bus.emit(events.ALLOCATION_STARTED, deputy_ids=deputy_ids, mode='full')
+
+        try:
+            self._report_progress(progress, PHASE_RESET, 0, 1)
+            touched_emenda_ids = self._reset_all_emenda_contributions() 
 
-        self._reset_all_emenda_contributions() 
+            for deputy in all_deputies:
+                deputy.actual_spent_amount = 0.0
+            self.data_manager.save_deputies(all_deputies) 
 
-        for deputy in all_deputies:
-            deputy.actual_spent_amount = 0.0
-        self.data_manager.save_deputies(all_deputies) 
+            touched_emenda_ids |= self._distribute_funds_from_deputies(all_deputies, all_emendas, progress)
+
+            self.deputy_manager.clear_needs_reallocation_flags() 
+            self.event_bus.emit(events.ALLOCATION_COMMITTED, deputy_ids=deputy_ids, emenda_ids=sorted(touched_emenda_ids), mode='full')
+        except Exception:
+            # Nada é confirmado: o estado vivo volta ao de antes e os leitores continuam vendo o último snapshot publicado
+            self._restore_state(captured)
+            self.event_bus.emit(events.ALLOCATION_ABORTED, deputy_ids=deputy_ids, mode='full')
+            raise
 
-        self._distribute_funds_from_deputies(all_deputies, all_emendas)
-        
-        self.deputy_manager.clear_needs_reallocation_flags() 
         return "Redistribuição completa de verbas realizada com sucesso."
 
-    def perform_partial_redistribution(self, deputy_ids_to_reallocate: list[int]):
+    @metrics.timed("optimizer.partial.ms")
+    def perform_partial_redistribution(self, deputy_ids_to_reallocate: list[int], progress=None):
         """
         Executa uma redistribuição parcial de verbas apenas para os deputados especificados.
         As contribuições de outros deputados (não especificados) permanecem inalteradas.
+        progress(fase, fração), se informado, recebe o andamento e pode cancelar a otimização.
         """
         if not deputy_ids_to_reallocate:
             return "Nenhum deputado selecionado para redistribuição parcial."
@@ -150,19 +238,30 @@ class AllocationOptimizer:
         all_deputies = self.deputy_manager.list_deputies()
         
         deputies_to_reallocate_objs = [d for d in all_deputies if d.id in deputy_ids_to_reallocate]
-        
-        for dep_id in deputy_ids_to_reallocate:
-            self._reset_specific_deputy_contributions(dep_id)
-            deputy = self.deputy_manager.get_deputy_by_id(dep_id)
-            if deputy:
-                deputy.actual_spent_amount = 0.0
-        
-        self.data_manager.save_emendas(all_emendas)
-        self.data_manager.save_deputies(all_deputies) 
+        captured = self._capture_state()
+        self.event_bus.emit(events.ALLOCATION_STARTED, deputy_ids=deputy_ids_to_reallocate, mode='partial')
+
+        try:
+            touched_emenda_ids = set()
+            for position, dep_id in enumerate(deputy_ids_to_reallocate):
+                self._report_progress(progress, PHASE_RESET, position, len(deputy_ids_to_reallocate))
+                touched_emenda_ids |= self._reset_specific_deputy_contributions(dep_id)
+                deputy = self.deputy_manager.get_deputy_by_id(dep_id)
+                if deputy:
+                    deputy.actual_spent_amount = 0.0
+
+            self.data_manager.save_emendas(all_emendas)
+            self.data_manager.save_deputies(all_deputies) 
+
+            touched_emenda_ids |= self._distribute_funds_from_deputies(deputies_to_reallocate_objs, all_emendas, progress)
+
+            self.deputy_manager.clear_needs_reallocation_flags(deputy_ids_to_reallocate) 
+            self.event_bus.emit(events.ALLOCATION_COMMITTED, deputy_ids=deputy_ids_to_reallocate, emenda_ids=sorted(touched_emenda_ids), mode='partial')
+        except Exception:
+            # Nada é confirmado: o estado vivo volta ao de antes e os leitores continuam vendo o último snapshot publicado
+            self._restore_state(captured)
+            self.event_bus.emit(events.ALLOCATION_ABORTED, deputy_ids=deputy_ids_to_reallocate, mode='partial')
+            raise
 
-        self._distribute_funds_from_deputies(deputies_to_reallocate_objs, all_emendas)
-        
-        self.deputy_manager.clear_needs_reallocation_flags(deputy_ids_to_reallocate) 
-        
         return f"Redistribuição parcial de verbas realizada para {len(deputy_ids_to_reallocate)} deputado(s)."
 
@@ -0,0 +1,160 @@
+import copy
+import threading
+from collections import deque
+
+import EventBus as events
+from Deputy import Deputy
+from Emenda import Emenda
+
+
+class AllocationSnapshot:
+    """
+    Estado de alocação confirmado e imutável (deputados e emendas com suas contribuições).
+    Expõe a mesma interface de leitura dos managers (list_deputies, list_emendas,
+    get_deputy_by_id, get_emenda_by_id), mas sobre cópias que o otimizador nunca altera.
+    Um leitor que guarda a referência a um snapshot tem uma visão consistente, mesmo
+    que uma otimização esteja em andamento ou que um novo snapshot seja publicado.
+    """
+    def __init__(self, version, deputies, emendas, previous_version=None, changed_deputy_ids=None, changed_emenda_ids=None):
+        self.version = version
+        # O que mudou em relação ao snapshot anterior (None = tudo), para atualizações incrementais
+        self.previous_version = previous_version
+        self.changed_deputy_ids = frozenset(changed_deputy_ids) if changed_deputy_ids is not None else None
+        self.changed_emenda_ids = frozenset(changed_emenda_ids) if changed_emenda_ids is not None else None
+        self._deputies = tuple(deputies)
+        self._emendas = tuple(emendas)
+        self._deputies_by_id = {d.id: d for d in self._deputies}
+        self._emendas_by_id = {e.id: e for e in self._emendas}
+
+    def list_deputies(self):
+        return self._deputies
+
+    def list_emendas(self):
+        return self._emendas
+
+    def get_deputy_by_id(self, deputy_id):
+        return self._deputies_by_id.get(deputy_id)
+
+    def get_emenda_by_id(self, emenda_id):
+        return self._emendas_by_id.get(emenda_id)
+
+    def __repr__(self):
+        return f"AllocationSnapshot(version={self.version}, deputados={len(self._deputies)}, emendas={len(self._emendas)})"
+
+
+class SnapshotStore:
+    """
+    Publica snapshots versionados (MVCC) do estado dos managers.
+    - Leitores chamam current() e usam o snapshot obtido do início ao fim (sem locks).
+    - Durante uma otimização (entre allocation_started e allocation_committed) nada é
+      publicado; ao final, o novo snapshot é trocado atomicamente (uma única atribuição).
+    - Fora de otimizações, cada edição publica um snapshot que copia apenas os
+      deputados/emendas afetados e reaproveita as cópias inalteradas do anterior.
+    """
+    def __init__(self, deputy_manager, emenda_manager, event_bus=None):
+        self.deputy_manager = deputy_manager
+        self.emenda_manager = emenda_manager
+        self.event_bus = event_bus if event_bus is not None else deputy_manager.event_bus
+
+        self._write_lock = threading.Lock() # Serializa apenas os escritores; leitores nunca bloqueiam
+        self._optimizations_running = 0
+        self._pending_deputy_ids = set()
+        self._pending_emenda_ids = set()
+        self._change_log = deque(maxlen=64) # [(versão, deputy_ids, emenda_ids)] dos últimos snapshots
+
+        self._current = AllocationSnapshot(
+            1,
+            [self._copy_deputy(d) for d in deputy_manager.list_deputies()],
+            [self._copy_emenda(e) for e in emenda_manager.list_emendas()],
+        )
+        self.event_bus.subscribe(events.ALL_EVENTS, self._on_event)
+
+    def current(self):
+        """Snapshot confirmado mais recente. Guarde a referência para leituras consistentes."""
+        return self._current
+
+    def changed_since(self, version):
+        """
+        IDs (deputy_ids, emenda_ids) alterados entre a versão informada e a atual,
+        ou None se o histórico não cobrir o intervalo (caso em que tudo deve ser recalculado).
+        """
+        current = self._current
+        if version == current.version:
+            return set(), set()
+        log = [entry for entry in list(self._change_log) if version < entry[0] <= current.version]
+        if len(log) != current.version - version:
+            return None
+        deputy_ids, emenda_ids = set(), set()
+        for _, changed_deputies, changed_emendas in log:
+            if changed_deputies is None or changed_emendas is None:
+                return None
+            deputy_ids |= changed_deputies
+            emenda_ids |= changed_emendas
+        return deputy_ids, emenda_ids
+
+    def is_optimization_running(self):
+        return self._optimizations_running > 0
+
+    def publish(self, deputy_ids=None, emenda_ids=None):
+        """
+        Publica um novo snapshot recopiando os deputados/emendas indicados
+        (None recopia todos). Retorna o snapshot publicado.
+        """
+        with self._write_lock:
+            previous = self._current
+            deputies, deputy_ids = self._merge(previous.get_deputy_by_id, self.deputy_manager.list_deputies(), deputy_ids, self._copy_deputy)
+            emendas, emenda_ids = self._merge(previous.get_emenda_by_id, self.emenda_manager.list_emendas(), emenda_ids, self._copy_emenda)
+            snapshot = AllocationSnapshot(previous.version + 1, deputies, emendas, previous.version, deputy_ids, emenda_ids)
+            self._change_log.append((snapshot.version, snapshot.changed_deputy_ids, snapshot.changed_emenda_ids))
+            self._current = snapshot # Troca atômica: leitores veem o snapshot anterior ou o novo, nunca um intermediário
+            return snapshot
+
+    def _on_event(self, event):
+        if event.type == events.ALLOCATION_STARTED:
+            self._optimizations_running += 1
+            return
+        if event.type == events.ALLOCATION_ABORTED:
+            # O estado vivo pode estar pela metade: mantém o último snapshot confirmado
+            self._optimizations_running = max(0, self._optimizations_running - 1)
+            return
+        self._pending_deputy_ids.update(event.deputy_ids)
+        self._pending_emenda_ids.update(event.emenda_ids)
+        if event.type == events.ALLOCATION_COMMITTED:
+            self._optimizations_running = max(0, self._optimizations_running - 1)
+        if self._optimizations_running or not (self._pending_deputy_ids or self._pending_emenda_ids):
+            return
+        deputy_ids, self._pending_deputy_ids = self._pending_deputy_ids, set()
+        emenda_ids, self._pending_emenda_ids = self._pending_emenda_ids, set()
+        self.publish(deputy_ids, emenda_ids)
+
+    @staticmethod
+    def _merge(previous_lookup, live_items, changed_ids, copy_func):
+        """Retorna (itens do novo snapshot, IDs efetivamente recopiados ou None se todos)."""
+        if changed_ids is None:
+            return [copy_func(item) for item in live_items], None
+        changed_ids = set(changed_ids)
+        items = []
+        for item in live_items:
+            previous_item = previous_lookup(item.id)
+            if item.id in changed_ids or previous_item is None:
+                items.append(copy_func(item))
+                changed_ids.add(item.id)
+            else:
+                # Itens inalterados reaproveitam a cópia do snapshot anterior
+                items.append(previous_item)
+        return items, changed_ids
+
+    @staticmethod
+    def _copy_deputy(deputy):
+        record = copy.deepcopy(deputy.serialize())
+        record.pop('profile', None) # Os relatórios não mostram perfis: os snapshots não os carregam
+        record.pop('profile_revision', None)
+        return Deputy.deserialize(record, warn=False)
+
+    @staticmethod
+    def _copy_emenda(emenda):
+        snapshot_emenda = Emenda.deserialize(copy.deepcopy(emenda.serialize()), warn=False)
+        # Normaliza as chaves de contribuição para string, como no JSON persistido
+        # (durante a sessão o otimizador grava os IDs dos deputados como inteiros)
+        snapshot_emenda.current_contributions = {str(dep_id): detail for dep_id, detail in snapshot_emenda.current_contributions.items()}
+        return snapshot_emenda
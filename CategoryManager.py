@@ -1,8 +1,11 @@
 import json
+import EventBus as events
+from EventBus import EventBus
 
 class CategoryManager:
-    def __init__(self, data_manager):
+    def __init__(self, data_manager, event_bus=None):
         self.data_manager = data_manager
+        self.event_bus = event_bus if event_bus is not None else EventBus()
         self.categories = self.data_manager.load_categories()
 
     def add_category(self, category_name):
@@ -14,6 +17,7 @@ class CategoryManager:
         
         self.categories.append(category_name_formatted)
         self.data_manager.save_categories(self.categories)
+        self.event_bus.emit(events.CATEGORY_ADDED, categories=[category_name_formatted])
         return True, f"Categoria '{category_name_formatted}' adicionada com sucesso."
 
     def list_categories(self):
@@ -27,5 +31,11 @@ class CategoryManager:
         if category_name_formatted in self.categories:
             self.categories.remove(category_name_formatted)
             self.data_manager.save_categories(self.categories)
+            self.event_bus.emit(events.CATEGORY_DELETED, categories=[category_name_formatted])
             return True, f"Categoria '{category_name_formatted}' excluída com sucesso."
         return False, "Categoria não encontrada."
+
+    def replace_categories(self, categories):
+        """Substitui a lista de categorias (usado por StateHistory para desfazer/refazer)."""
+        self.categories = list(categories)
+        self.data_manager.save_categories(self.categories)
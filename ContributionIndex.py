@@ -0,0 +1,56 @@
+class ContributionIndex:
+    """
+    Índice invertido deputado → [(emenda, contribuição)] sobre um AllocationSnapshot.
+    Construído uma vez por estado de alocação; quando um snapshot seguinte é publicado,
+    advance() reindexa apenas as emendas cujas contribuições mudaram.
+    """
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self._by_deputy = {} # {deputy_id: {emenda_id: (emenda, contrib_detail)}}
+        self._deputies_by_emenda = {} # {emenda_id: [deputy_id, ...]}
+        for emenda in snapshot.list_emendas():
+            self._add_emenda(emenda)
+
+    def contributions_for(self, deputy_id):
+        """Lista de (emenda, contrib_detail) do deputado, na ordem dos IDs das emendas."""
+        entries = self._by_deputy.get(deputy_id)
+        if not entries:
+            return []
+        return [entries[emenda_id] for emenda_id in sorted(entries)]
+
+    def advance(self, snapshot, changed_emenda_ids=None):
+        """
+        Atualiza o índice para o snapshot informado, reindexando apenas as emendas alteradas
+        (changed_emenda_ids, ou as do próprio snapshot se ele suceder diretamente o indexado).
+        Retorna False se não for possível fazê-lo de forma incremental.
+        """
+        if snapshot.version == self.version:
+            return True
+        if changed_emenda_ids is None:
+            if snapshot.previous_version != self.version or snapshot.changed_emenda_ids is None:
+                return False
+            changed_emenda_ids = snapshot.changed_emenda_ids
+        for emenda_id in changed_emenda_ids:
+            self._remove_emenda(emenda_id)
+            emenda = snapshot.get_emenda_by_id(emenda_id)
+            if emenda is not None:
+                self._add_emenda(emenda)
+        self.version = snapshot.version
+        return True
+
+    def _add_emenda(self, emenda):
+        deputy_ids = []
+        for dep_id_str, contrib_detail in emenda.current_contributions.items():
+            dep_id = int(dep_id_str) # No snapshot as chaves são strings, como no JSON
+            self._by_deputy.setdefault(dep_id, {})[emenda.id] = (emenda, contrib_detail)
+            deputy_ids.append(dep_id)
+        if deputy_ids:
+            self._deputies_by_emenda[emenda.id] = deputy_ids
+
+    def _remove_emenda(self, emenda_id):
+        for dep_id in self._deputies_by_emenda.pop(emenda_id, []):
+            entries = self._by_deputy.get(dep_id)
+            if entries is not None:
+                entries.pop(emenda_id, None)
+                if not entries:
+                    del self._by_deputy[dep_id]
@@ -2,18 +2,34 @@ import json
 import os
 from Deputy import Deputy
 from Emenda import Emenda
+from DataValidator import DataValidator
+from TextStore import TextStore
+from Metrics import metrics
+
+DATA_DIR_VARIABLE = 'EMENDAS_DATA_DIR' # Pasta dos arquivos de dados, se data_dir não for informado (padrão: data)
 
 class DataManager: # <-- AQUI DEVE SER 'DataManager' EXATAMENTE ASSIM
-    def __init__(self):
-        self.data_dir = 'data'
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir if data_dir is not None else os.environ.get(DATA_DIR_VARIABLE, 'data')
         os.makedirs(self.data_dir, exist_ok=True)
         self.deputies_file = os.path.join(self.data_dir, 'deputies.json')
         self.emendas_file = os.path.join(self.data_dir, 'emendas.json')
         self.categories_file = os.path.join(self.data_dir, 'categories.json')
+        # Perfis dos deputados ficam fora de deputies.json e são lidos sob demanda
+        self.profile_store = TextStore(os.path.join(self.data_dir, 'profiles'))
+        # Último relatório de validação em lote de cada arquivo (DataFrame de erros do DataValidator)
+        self.validation_errors = {}
+        self._loaded_deputy_ids = None
+
+    @staticmethod
+    def _metric_name(filepath):
+        return os.path.splitext(os.path.basename(filepath))[0]
 
     def _load_json(self, filepath):
         if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
+            with metrics.timer(f"data.load.{self._metric_name(filepath)}.ms"), open(filepath, 'r', encoding='utf-8') as f:
+                if metrics.enabled:
+                    metrics.observe(f"data.load.{self._metric_name(filepath)}.bytes", os.fstat(f.fileno()).st_size)
                 try:
                     return json.load(f)
                 except json.JSONDecodeError:
@@ -21,20 +37,58 @@ class DataManager: # <-- AQUI DEVE SER 'DataManager' EXATAMENTE ASSIM
         return []
 
     def _save_json(self, data, filepath):
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with metrics.timer(f"data.save.{self._metric_name(filepath)}.ms"), open(filepath, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+            if metrics.enabled:
+                metrics.observe(f"data.save.{self._metric_name(filepath)}.bytes", f.tell())
+
+    def _report_validation(self, kind, filepath, errors):
+        self.validation_errors[kind] = errors
+        if not errors.empty:
+            # Um único aviso por arquivo, em vez de um por registro
+            print(f"AVISO: {len(errors)} problema(s) de validação em '{filepath}'. Veja DataManager.validation_errors['{kind}'].")
 
     def load_deputies(self):
         deputy_data = self._load_json(self.deputies_file)
-        return [Deputy.deserialize(d) for d in deputy_data]
+        validator = DataValidator(self.load_categories())
+        with metrics.timer("data.validate.deputies.ms"):
+            errors = validator.validate_deputies(deputy_data)
+        self._report_validation('deputies', self.deputies_file, errors)
+        self._loaded_deputy_ids = [d.get('id') for d in deputy_data]
+        deputies = [Deputy.deserialize(d, warn=False) for d in deputy_data]
+        if any('profile' in d for d in deputy_data):
+            # Migra perfis embutidos (formato antigo) para o TextStore e regrava o JSON sem eles
+            self.save_deputies(deputies)
+        else:
+            for deputy in deputies:
+                deputy.bind_text_store(self.profile_store)
+        self._prune_profiles(deputies)
+        return deputies
+
+    def _prune_profiles(self, deputies):
+        """
+        Remove do TextStore os perfis de deputados que não existem mais. As revisões de quem foi
+        excluído ficam lá durante a sessão (desfazer a exclusão as usa) e saem na carga seguinte.
+        """
+        live_ids = {str(d.id) for d in deputies}
+        for key in self.profile_store.keys():
+            if key.split('.', 1)[0] not in live_ids:
+                self.profile_store.delete(key)
 
     def save_deputies(self, deputies):
+        for deputy in deputies:
+            deputy.bind_text_store(self.profile_store)
+            deputy.flush_profile() # Só grava perfis alterados
         deputy_data = [d.serialize() for d in deputies]
         self._save_json(deputy_data, self.deputies_file)
 
     def load_emendas(self):
         emenda_data = self._load_json(self.emendas_file)
-        return [Emenda.deserialize(e) for e in emenda_data]
+        validator = DataValidator(self.load_categories())
+        with metrics.timer("data.validate.emendas.ms"):
+            errors = validator.validate_emendas(emenda_data, self._loaded_deputy_ids)
+        self._report_validation('emendas', self.emendas_file, errors)
+        return [Emenda.deserialize(e, warn=False) for e in emenda_data]
 
     def save_emendas(self, emendas):
         emenda_data = [e.serialize() for e in emendas]
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+INCLINATION_LIMIT = 10 # Mesmo limite usado em DeputyManager.update_deputy_inclinations
+ERROR_COLUMNS = ['row', 'id', 'field', 'category', 'value', 'message']
+
+
+class DataValidator:
+    """
+    Validação em lote (vetorizada com pandas/NumPy) dos dados de deputados e emendas.
+    Em vez de validar registro a registro, monta um DataFrame por regra e verifica
+    o conjunto inteiro de uma vez. O resultado é um DataFrame de erros com uma linha
+    por problema encontrado (colunas: row, id, field, category, value, message),
+    onde 'row' é a posição do registro no lote validado.
+    """
+    def __init__(self, categories=None, inclination_limit=INCLINATION_LIMIT):
+        # categories=None desativa a verificação de categorias conhecidas
+        self.categories = list(categories) if categories is not None else None
+        self.inclination_limit = inclination_limit
+
+    # --- Deputados ---
+
+    def validate_deputies(self, deputy_data):
+        """Valida uma lista de deputados serializados (dicionários, como em deputies.json)."""
+        base = pd.DataFrame(list(deputy_data), columns=['id', 'name', 'total_verba_disponivel', 'actual_spent_amount'])
+        errors = [self._validate_ids(base), self._validate_required_text(base, 'name', "Nome do deputado ausente.")]
+
+        verba, verba_errors = self._validate_amount(base, 'total_verba_disponivel', "Verba total")
+        errors.append(verba_errors)
+        errors.append(self._validate_amount(base, 'actual_spent_amount', "Verba efetivamente usada")[1])
+
+        allocations, structure_errors = self._explode_mapping(deputy_data, 'allocated_by_category', base)
+        errors.append(structure_errors)
+        errors.append(self._validate_category_values(allocations, base, 'allocated_by_category', "Alocação"))
+        allocated_total = allocations.groupby('row')['amount'].sum()
+        verba_by_row = verba.reindex(allocated_total.index)
+        exceeds = (allocated_total > verba_by_row) & ~np.isclose(allocated_total, verba_by_row)
+        errors.append(self._errors_from_rows(
+            base, allocated_total.index[exceeds.to_numpy()], 'allocated_by_category', allocated_total[exceeds],
+            "Soma das alocações excede a verba total disponível do deputado."
+        ))
+
+        inclinations, structure_errors = self._explode_mapping(deputy_data, 'inclinacao_por_categoria', base)
+        errors.append(structure_errors)
+        errors.append(self._validate_category_values(inclinations, base, 'inclinacao_por_categoria', "Inclinação"))
+        inclination_total = inclinations.groupby('row')['amount'].sum()
+        exceeds = inclination_total > self.inclination_limit
+        errors.append(self._errors_from_rows(
+            base, inclination_total.index[exceeds.to_numpy()], 'inclinacao_por_categoria', inclination_total[exceeds],
+            f"Soma das inclinações excede o limite de {self.inclination_limit} pontos."
+        ))
+
+        return self._concat(errors)
+
+    # --- Emendas ---
+
+    def validate_emendas(self, emenda_data, deputy_ids=None):
+        """
+        Valida uma lista de emendas serializadas (dicionários, como em emendas.json).
+        Se deputy_ids for informado, verifica também se os contribuintes existem.
+        """
+        base = pd.DataFrame(list(emenda_data), columns=['id', 'description', 'valor_necessario', 'categoria', 'current_funded_amount'])
+        errors = [self._validate_ids(base), self._validate_required_text(base, 'description', "Descrição da emenda ausente.")]
+
+        errors.append(self._validate_amount(base, 'valor_necessario', "Valor necessário")[1])
+        funded, funded_errors = self._validate_amount(base, 'current_funded_amount', "Valor contemplado")
+        errors.append(funded_errors)
+
+        if self.categories is not None:
+            unknown = base['categoria'].notna() & ~base['categoria'].isin(self.categories)
+            errors.append(self._errors_from_mask(base, unknown, 'categoria', base['categoria'], "Categoria desconhecida.", category_col='categoria'))
+
+        rows = []
+        structure_rows = []
+        for row, record in enumerate(emenda_data):
+            contributions = record.get('current_contributions') or {}
+            if not isinstance(contributions, dict):
+                structure_rows.append(row)
+                continue
+            for dep_id, detail in contributions.items():
+                detail = detail if isinstance(detail, dict) else {}
+                rows.append((row, str(dep_id), detail.get('total'), detail.get('from_allocated_intention', 0), detail.get('from_free_verba', 0)))
+        errors.append(self._errors_from_rows(base, pd.Index(structure_rows, dtype='int64'), 'current_contributions', None,
+                                             "As contribuições devem ser um dicionário {deputado: detalhes}."))
+
+        contributions = pd.DataFrame(rows, columns=['row', 'deputy_id', 'total', 'from_allocated_intention', 'from_free_verba'])
+        if not contributions.empty:
+            amounts = contributions[['total', 'from_allocated_intention', 'from_free_verba']].apply(pd.to_numeric, errors='coerce')
+            invalid = amounts.isna().any(axis=1)
+            negative = (amounts < 0).any(axis=1)
+            mismatch = ~invalid & ~np.isclose(amounts['total'], amounts['from_allocated_intention'] + amounts['from_free_verba'])
+            for mask, message in ((invalid, "Contribuição com valor não numérico."),
+                                  (negative, "Contribuição com valor negativo."),
+                                  (mismatch, "Total da contribuição difere da soma intenção + verba livre.")):
+                errors.append(self._errors_from_mask(base, mask, 'current_contributions', contributions['total'], message,
+                                                     rows=contributions['row'], category=contributions['deputy_id']))
+            if deputy_ids is not None:
+                known = pd.Series([str(d) for d in deputy_ids], dtype=object)
+                unknown = ~contributions['deputy_id'].isin(known)
+                errors.append(self._errors_from_mask(base, unknown, 'current_contributions', contributions['deputy_id'],
+                                                     "Contribuição de deputado inexistente.",
+                                                     rows=contributions['row'], category=contributions['deputy_id']))
+
+            contributed = amounts['total'].groupby(contributions['row']).sum()
+            funded_by_row = funded.reindex(contributed.index)
+            mismatch = funded_by_row.notna() & ~np.isclose(contributed, funded_by_row)
+            errors.append(self._errors_from_rows(
+                base, contributed.index[mismatch.to_numpy()], 'current_funded_amount', funded_by_row[mismatch],
+                "Valor contemplado difere da soma das contribuições."
+            ))
+
+        return self._concat(errors)
+
+    # --- Utilitários ---
+
+    @staticmethod
+    def summarize(errors):
+        """Resumo legível de um DataFrame de erros (uma linha por registro afetado)."""
+        if errors is None or errors.empty:
+            return "Nenhum problema encontrado."
+        lines = [f"{len(errors)} problema(s) em {errors['row'].nunique()} registro(s):"]
+        for (row, record_id), group in errors.groupby(['row', 'id'], dropna=False, sort=True):
+            lines.append(f"  - Registro {row} (ID: {record_id}): " + "; ".join(group['message'].unique()))
+        return "\n".join(lines)
+
+    def _validate_ids(self, base):
+        missing = base['id'].isna()
+        duplicated = base['id'].notna() & base['id'].duplicated(keep=False)
+        return self._concat([
+            self._errors_from_mask(base, missing, 'id', base['id'], "ID ausente."),
+            self._errors_from_mask(base, duplicated, 'id', base['id'], "ID duplicado."),
+        ])
+
+    def _validate_required_text(self, base, field, message):
+        missing = base[field].isna() | (base[field].astype(str).str.strip() == '')
+        return self._errors_from_mask(base, missing, field, base[field], message)
+
+    def _validate_amount(self, base, field, label):
+        """Converte a coluna para número; valores ausentes valem 0.0, como em deserialize."""
+        raw = base[field]
+        amount = pd.to_numeric(raw, errors='coerce')
+        invalid = amount.isna() & raw.notna()
+        negative = amount < 0
+        errors = self._concat([
+            self._errors_from_mask(base, invalid, field, raw, f"{label} não é um número válido."),
+            self._errors_from_mask(base, negative, field, raw, f"{label} com valor negativo."),
+        ])
+        return amount.where(raw.notna(), 0.0).fillna(0.0), errors
+
+    def _explode_mapping(self, records, field, base):
+        """Transforma {categoria: valor} de todos os registros em um DataFrame longo (row, category, value, amount)."""
+        rows = []
+        structure_rows = []
+        for row, record in enumerate(records):
+            mapping = record.get(field) or {}
+            if not isinstance(mapping, dict):
+                structure_rows.append(row)
+                continue
+            rows.extend((row, category, value) for category, value in mapping.items())
+        frame = pd.DataFrame(rows, columns=['row', 'category', 'value'])
+        frame['amount'] = pd.to_numeric(frame['value'], errors='coerce')
+        structure_errors = self._errors_from_rows(base, pd.Index(structure_rows, dtype='int64'), field, None,
+                                                  "O campo deve ser um dicionário {categoria: valor}.")
+        return frame, structure_errors
+
+    def _validate_category_values(self, frame, base, field, label):
+        if frame.empty:
+            return self._empty()
+        invalid = frame['amount'].isna()
+        negative = frame['amount'] < 0
+        errors = [
+            self._errors_from_mask(base, invalid, field, frame['value'], f"{label} não é um número válido.", rows=frame['row'], category=frame['category']),
+            self._errors_from_mask(base, negative, field, frame['value'], f"{label} com valor negativo.", rows=frame['row'], category=frame['category']),
+        ]
+        if self.categories is not None:
+            unknown = ~frame['category'].isin(self.categories)
+            errors.append(self._errors_from_mask(base, unknown, field, frame['value'], f"{label} para categoria desconhecida.",
+                                                 rows=frame['row'], category=frame['category']))
+        return self._concat(errors)
+
+    def _errors_from_mask(self, base, mask, field, values, message, rows=None, category=None, category_col=None):
+        mask = mask.fillna(False).to_numpy(dtype=bool)
+        if not mask.any():
+            return self._empty()
+        row_index = (rows.to_numpy() if rows is not None else base.index.to_numpy())[mask]
+        if category_col is not None:
+            category = base[category_col]
+        return pd.DataFrame({
+            'row': row_index,
+            'id': base['id'].to_numpy()[row_index],
+            'field': field,
+            'category': category.to_numpy()[mask] if category is not None else None,
+            'value': values.to_numpy()[mask] if values is not None else None,
+            'message': message,
+        }, columns=ERROR_COLUMNS)
+
+    def _errors_from_rows(self, base, row_index, field, values, message):
+        if len(row_index) == 0:
+            return self._empty()
+        row_index = np.asarray(row_index, dtype='int64')
+        return pd.DataFrame({
+            'row': row_index,
+            'id': base['id'].to_numpy()[row_index],
+            'field': field,
+            'category': None,
+            'value': values.to_numpy() if values is not None else None,
+            'message': message,
+        }, columns=ERROR_COLUMNS)
+
+    @staticmethod
+    def _empty():
+        return pd.DataFrame(columns=ERROR_COLUMNS)
+
+    @staticmethod
+    def _concat(frames):
+        frames = [f for f in frames if f is not None and not f.empty]
+        if not frames:
+            return DataValidator._empty()
+        return pd.concat(frames, ignore_index=True).sort_values(['row', 'field'], kind='stable').reset_index(drop=True)
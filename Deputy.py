@@ -1,5 +1,13 @@
 import json
 
+_NOT_LOADED = object() # Perfil guardado no TextStore e ainda não lido
+PROFILE_REVISIONS_KEPT = 50 # Revisões anteriores do perfil mantidas no TextStore (desfazer/refazer)
+
+
+def profile_key(deputy_id, revision):
+    """Chave do perfil no TextStore: a revisão 0 (formato anterior às revisões) usa só o ID."""
+    return str(deputy_id) if revision == 0 else f"{deputy_id}.{revision}"
+
 class Deputy:
     def __init__(self, name, total_verba_disponivel, profile=None):
         self.id = None 
@@ -7,10 +15,55 @@ class Deputy:
         self.total_verba_disponivel = float(total_verba_disponivel) # Garante que seja float
         self.allocated_by_category = {}
         self.inclinacao_por_categoria = {} 
-        self.profile = profile
+        self._text_store = None
+        self.profile_revision = 0
+        self.profile = profile # Um deputado novo tem o perfil pendente de gravação
         self.actual_spent_amount = 0.0 
         self.needs_reallocation = True 
 
+    @property
+    def profile(self):
+        if self._profile is _NOT_LOADED:
+            # Carregado sob demanda: só as páginas de detalhe leem o perfil (o TextStore mantém um cache LRU)
+            return self._text_store.get(profile_key(self.id, self.profile_revision)) if self._text_store is not None else None
+        return self._profile
+
+    @profile.setter
+    def profile(self, value):
+        # Cada alteração vira uma nova revisão no TextStore; as anteriores continuam lá, e os
+        # registros do histórico guardam só o número da revisão, não o texto
+        self._profile = value
+        self._profile_dirty = True
+        self.profile_revision += 1
+
+    def bind_text_store(self, text_store):
+        """Passa a guardar o perfil no TextStore em vez de no JSON dos deputados."""
+        self._text_store = text_store
+
+    def flush_profile(self):
+        """Grava o perfil pendente no TextStore e o libera da memória. Retorna True se gravou."""
+        if self._text_store is None or not self._profile_dirty:
+            return False
+        self._text_store.put(profile_key(self.id, self.profile_revision), self._profile)
+        if self.profile_revision >= PROFILE_REVISIONS_KEPT:
+            self._text_store.delete(profile_key(self.id, self.profile_revision - PROFILE_REVISIONS_KEPT))
+        self._profile = _NOT_LOADED
+        self._profile_dirty = False
+        return True
+
+    def copy_state_from(self, other):
+        """Copia os dados de outro Deputy (perfil pela revisão, lido sob demanda), preservando o TextStore deste objeto."""
+        self.id = other.id
+        self.name = other.name
+        self.total_verba_disponivel = other.total_verba_disponivel
+        self.allocated_by_category = other.allocated_by_category
+        self.inclinacao_por_categoria = other.inclinacao_por_categoria
+        self.actual_spent_amount = other.actual_spent_amount
+        self.needs_reallocation = other.needs_reallocation
+        self.profile_revision = other.profile_revision
+        self._profile = other._profile
+        self._profile_dirty = other._profile_dirty
+
     def get_allocated_total(self):
         return sum(self.allocated_by_category.values())
 
@@ -21,32 +74,40 @@ class Deputy:
         return self.inclinacao_por_categoria.get(category, 0)
 
     def serialize(self):
-        return {
+        data = {
             'id': self.id,
             'name': self.name,
             'total_verba_disponivel': self.total_verba_disponivel,
             'allocated_by_category': self.allocated_by_category,
             'inclinacao_por_categoria': self.inclinacao_por_categoria,
-            'profile': self.profile,
             'actual_spent_amount': self.actual_spent_amount,
             'needs_reallocation': self.needs_reallocation
         }
+        if self._text_store is None:
+            # Sem TextStore (formato antigo), o perfil segue embutido no registro
+            data['profile'] = self.profile
+        else:
+            data['profile_revision'] = self.profile_revision
+        return data
 
     @classmethod
-    def deserialize(cls, data):
+    def deserialize(cls, data, warn=True):
+        # warn=False quando o lote já foi validado por DataValidator (evita avisos registro a registro)
         # Tenta converter total_verba_disponivel para float de forma mais segura
         # Se não for possível, define como 0.0
         try:
             total_verba_disponivel = float(data.get('total_verba_disponivel', 0.0))
         except (ValueError, TypeError):
-            print(f"AVISO: 'total_verba_disponivel' para deputado {data.get('name', 'desconhecido')} não é um número válido. Usando 0.0.")
+            if warn:
+                print(f"AVISO: 'total_verba_disponivel' para deputado {data.get('name', 'desconhecido')} não é um número válido. Usando 0.0.")
             total_verba_disponivel = 0.0
             
         # Tenta converter actual_spent_amount para float de forma mais segura
         try:
             actual_spent_amount = float(data.get('actual_spent_amount', 0.0))
         except (ValueError, TypeError):
-            print(f"AVISO: 'actual_spent_amount' para deputado {data.get('name', 'desconhecido')} não é um número válido. Usando 0.0.")
+            if warn:
+                print(f"AVISO: 'actual_spent_amount' para deputado {data.get('name', 'desconhecido')} não é um número válido. Usando 0.0.")
             actual_spent_amount = 0.0
 
         deputy = cls(
@@ -59,4 +120,9 @@ class Deputy:
         deputy.inclinacao_por_categoria = data.get('inclinacao_por_categoria', {})
         deputy.actual_spent_amount = actual_spent_amount
         deputy.needs_reallocation = data.get('needs_reallocation', True)
+        if 'profile' not in data:
+            # Perfil guardado à parte (TextStore): só é lido quando acessado
+            deputy._profile = _NOT_LOADED
+            deputy._profile_dirty = False
+            deputy.profile_revision = data.get('profile_revision', 0)
         return deputy
\ No newline at end of file
@@ -1,28 +1,50 @@
+import copy
 import json
+import math
 from Deputy import Deputy
+from DataValidator import DataValidator
+from Metrics import metrics
+import EventBus as events
+from EventBus import EventBus
 # A linha abaixo deve estar REMOVIDA, pois DataManager será passado no construtor
 # from DataManager import DataManager 
 
+def _changed_keys(old, new):
+    """Retorna as chaves (categorias) cujo valor difere entre dois dicionários."""
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
 class DeputyManager:
+    # Eventos que exigem uma futura redistribuição de verbas (ver handle_data_change)
+    REALLOCATION_TRIGGER_EVENTS = (
+        events.DEPUTY_ADDED, events.DEPUTY_DELETED, events.DEPUTY_UPDATED,
+        events.DEPUTY_ALLOCATIONS_UPDATED, events.DEPUTY_INCLINATIONS_UPDATED,
+        events.EMENDA_ADDED, events.EMENDA_DELETED,
+    )
+
     # O construtor **DEVE** receber uma instância de DataManager
-    def __init__(self, data_manager): 
+    def __init__(self, data_manager, event_bus=None): 
         self.data_manager = data_manager
-        self.deputies = self.data_manager.load_deputies()
+        self.event_bus = event_bus if event_bus is not None else EventBus()
+        with metrics.timer("deputies.load.ms"):
+            self.deputies = self.data_manager.load_deputies()
+        self._deputies_by_id = {d.id: d for d in self.deputies} # Índice para busca por ID em O(1)
         self.next_deputy_id = max([d.id for d in self.deputies] or [0]) + 1
 
     def add_deputy(self, name, total_verba_disponivel, profile=None):
         new_deputy = Deputy(name, total_verba_disponivel, profile)
         new_deputy.id = self.next_deputy_id
         self.deputies.append(new_deputy)
+        self._deputies_by_id[new_deputy.id] = new_deputy
         self.next_deputy_id += 1
         self.data_manager.save_deputies(self.deputies)
+        self.event_bus.emit(events.DEPUTY_ADDED, deputy_ids=[new_deputy.id])
         return new_deputy
 
     def list_deputies(self):
         return self.deputies
 
     def get_deputy_by_id(self, deputy_id):
-        return next((d for d in self.deputies if d.id == deputy_id), None)
+        return self._deputies_by_id.get(deputy_id)
 
     def update_deputy(self, deputy_id, new_name=None, new_verba=None, new_profile=None):
         deputy = self.get_deputy_by_id(deputy_id)
@@ -30,15 +52,21 @@ class DeputyManager:
             return False, "Deputado não encontrado.", None
         
         old_total_verba = deputy.total_verba_disponivel # Para comparação posterior
+        changed_fields = []
 
-        if new_name is not None:
+        if new_name is not None and new_name != deputy.name:
             deputy.name = new_name
-        if new_verba is not None:
+            changed_fields.append('name')
+        if new_verba is not None and not math.isclose(new_verba, old_total_verba):
             deputy.total_verba_disponivel = new_verba
-        if new_profile is not None:
+            changed_fields.append('total_verba_disponivel')
+        if new_profile is not None and new_profile != deputy.profile:
             deputy.profile = new_profile
+            changed_fields.append('profile')
 
-        self.data_manager.save_deputies(self.deputies)
+        if changed_fields:
+            self.data_manager.save_deputies(self.deputies)
+            self.event_bus.emit(events.DEPUTY_UPDATED, deputy_ids=[deputy.id], changed_fields=changed_fields)
         return True, "Deputado atualizado com sucesso.", old_total_verba
 
     def update_deputy_allocations(self, deputy_id, new_allocations):
@@ -51,8 +79,11 @@ class DeputyManager:
         if total_allocated > deputy.total_verba_disponivel:
             return False, "Soma das alocações excede a verba total disponível do deputado."
 
+        changed_categories = _changed_keys(deputy.allocated_by_category, new_allocations)
         deputy.allocated_by_category = new_allocations
-        self.data_manager.save_deputies(self.deputies)
+        if changed_categories:
+            self.data_manager.save_deputies(self.deputies)
+            self.event_bus.emit(events.DEPUTY_ALLOCATIONS_UPDATED, deputy_ids=[deputy.id], categories=changed_categories)
         return True, "Distribuição de verbas atualizada com sucesso."
 
     def update_deputy_inclinations(self, deputy_id, new_inclinations):
@@ -65,27 +96,135 @@ class DeputyManager:
         if total_inclination_score > 10:
             return False, "Soma das inclinações excede o limite de 10 pontos."
 
+        changed_categories = _changed_keys(deputy.inclinacao_por_categoria, new_inclinations)
         deputy.inclinacao_por_categoria = new_inclinations
-        self.data_manager.save_deputies(self.deputies)
+        if changed_categories:
+            self.data_manager.save_deputies(self.deputies)
+            self.event_bus.emit(events.DEPUTY_INCLINATIONS_UPDATED, deputy_ids=[deputy.id], categories=changed_categories)
         return True, "Inclinação por categoria atualizada com sucesso."
 
+    def update_category_matrix(self, allocations_by_id=None, inclinations_by_id=None, validator=None):
+        """
+        Aplica em lote novas alocações e/ou inclinações de vários deputados ({deputy_id: {categoria: valor}}).
+        Só os deputados cujo mapa mudou são considerados: todos são validados de uma vez pelo
+        DataValidator (verba total, limite de inclinação, categorias) e, sem erros, o arquivo é
+        gravado uma única vez e cada tipo de alteração emite um evento só com os deputados afetados.
+        Retorna (sucesso, mensagem, DataFrame de erros ou None).
+        """
+        allocations_by_id = allocations_by_id or {}
+        inclinations_by_id = inclinations_by_id or {}
+        missing = sorted(d_id for d_id in set(allocations_by_id) | set(inclinations_by_id) if d_id not in self._deputies_by_id)
+        if missing:
+            return False, f"Deputado(s) não encontrado(s): {', '.join(map(str, missing))}.", None
+
+        allocation_changes = {d_id: values for d_id, values in allocations_by_id.items()
+                              if _changed_keys(self._deputies_by_id[d_id].allocated_by_category, values)}
+        inclination_changes = {d_id: values for d_id, values in inclinations_by_id.items()
+                               if _changed_keys(self._deputies_by_id[d_id].inclinacao_por_categoria, values)}
+        changed_ids = sorted(set(allocation_changes) | set(inclination_changes))
+        if not changed_ids:
+            return True, "Nenhuma alteração a salvar.", None
+
+        records = []
+        for deputy_id in changed_ids:
+            deputy = self._deputies_by_id[deputy_id]
+            record = dict(deputy.serialize())
+            record['allocated_by_category'] = allocation_changes.get(deputy_id, deputy.allocated_by_category)
+            record['inclinacao_por_categoria'] = inclination_changes.get(deputy_id, deputy.inclinacao_por_categoria)
+            records.append(record)
+        validator = validator if validator is not None else DataValidator(self.data_manager.load_categories())
+        errors = validator.validate_deputies(records)
+        if not errors.empty:
+            return False, f"{len(errors)} problema(s) em {errors['id'].nunique()} deputado(s). Nada foi salvo.", errors
+
+        allocation_categories = set()
+        for deputy_id, values in allocation_changes.items():
+            deputy = self._deputies_by_id[deputy_id]
+            allocation_categories.update(_changed_keys(deputy.allocated_by_category, values))
+            deputy.allocated_by_category = dict(values)
+        inclination_categories = set()
+        for deputy_id, values in inclination_changes.items():
+            deputy = self._deputies_by_id[deputy_id]
+            inclination_categories.update(_changed_keys(deputy.inclinacao_por_categoria, values))
+            deputy.inclinacao_por_categoria = dict(values)
+        self.data_manager.save_deputies(self.deputies)
+        metrics.observe("deputies.matrix.changed_deputies", len(changed_ids))
+        if allocation_changes:
+            self.event_bus.emit(events.DEPUTY_ALLOCATIONS_UPDATED, deputy_ids=sorted(allocation_changes), categories=sorted(allocation_categories))
+        if inclination_changes:
+            self.event_bus.emit(events.DEPUTY_INCLINATIONS_UPDATED, deputy_ids=sorted(inclination_changes), categories=sorted(inclination_categories))
+        return True, f"Alterações salvas para {len(changed_ids)} deputado(s).", errors
+
     def delete_deputy(self, deputy_id):
         initial_len = len(self.deputies)
         self.deputies = [d for d in self.deputies if d.id != deputy_id]
         if len(self.deputies) < initial_len:
+            # O perfil fica no TextStore para desfazer a exclusão; é removido na próxima carga dos dados
+            self._deputies_by_id.pop(deputy_id, None)
             self.data_manager.save_deputies(self.deputies)
+            self.event_bus.emit(events.DEPUTY_DELETED, deputy_ids=[deputy_id])
             return True, "Deputado excluído com sucesso."
         return False, "Deputado não encontrado."
 
     def get_deputies_needing_reallocation(self):
         return [d for d in self.deputies if d.needs_reallocation]
 
+    def handle_data_change(self, event):
+        """
+        Assinante do barramento de eventos: marca para redistribuição os deputados
+        afetados por uma mudança nos dados.
+        """
+        if event.type in (events.DEPUTY_ADDED, events.DEPUTY_DELETED, events.EMENDA_ADDED, events.EMENDA_DELETED):
+            # Mudanças no conjunto de deputados ou emendas afetam a distribuição de todos
+            self.mark_for_reallocation()
+        elif event.type in (events.DEPUTY_ALLOCATIONS_UPDATED, events.DEPUTY_INCLINATIONS_UPDATED):
+            self.mark_for_reallocation(event.deputy_ids)
+        elif event.type == events.DEPUTY_UPDATED and 'total_verba_disponivel' in event.details.get('changed_fields', []):
+            self.mark_for_reallocation(event.deputy_ids)
+
+    def mark_for_reallocation(self, deputy_ids=None):
+        """Marca deputados (todos, se deputy_ids for None) para uma futura redistribuição de verbas."""
+        return self._set_needs_reallocation_flags(True, deputy_ids)
+
     def clear_needs_reallocation_flags(self, deputy_ids=None):
-        if deputy_ids is None: # Limpa todos
-            for d in self.deputies:
-                d.needs_reallocation = False
-        else: # Limpa apenas os IDs específicos
-            for d in self.deputies:
-                if d.id in deputy_ids:
-                    d.needs_reallocation = False
+        return self._set_needs_reallocation_flags(False, deputy_ids)
+
+    def _set_needs_reallocation_flags(self, value, deputy_ids=None):
+        changed_ids = []
+        for d in self.deputies:
+            if deputy_ids is not None and d.id not in deputy_ids: # None altera todos
+                continue
+            if d.needs_reallocation != value:
+                d.needs_reallocation = value
+                changed_ids.append(d.id)
+        if changed_ids:
+            self.data_manager.save_deputies(self.deputies)
+            self.event_bus.emit(events.REALLOCATION_FLAGS_CHANGED, deputy_ids=changed_ids, needs_reallocation=value)
+        return changed_ids
+
+    def apply_records(self, records_by_id):
+        """
+        Substitui o estado dos deputados indicados a partir de registros serializados
+        (usado por StateHistory para desfazer/refazer). Um registro None remove o deputado.
+        Objetos existentes são atualizados no lugar para preservar referências. O perfil volta
+        pela revisão do registro e só é lido do TextStore quando acessado.
+        """
+        inserted = False
+        for deputy_id, record in records_by_id.items():
+            current = self._deputies_by_id.get(deputy_id)
+            if record is None:
+                if current is not None:
+                    self.deputies.remove(current)
+                    del self._deputies_by_id[deputy_id]
+                continue
+            restored = Deputy.deserialize(copy.deepcopy(record), warn=False)
+            if current is not None:
+                current.copy_state_from(restored)
+            else:
+                self.deputies.append(restored)
+                self._deputies_by_id[deputy_id] = restored
+                inserted = True
+        if inserted:
+            self.deputies.sort(key=lambda d: d.id)
+        self.next_deputy_id = max([self.next_deputy_id] + [d_id + 1 for d_id in self._deputies_by_id])
         self.data_manager.save_deputies(self.deputies)
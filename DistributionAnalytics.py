@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+
+def concentration_by_group(groups, values):
+    """
+    Concentração de valores dentro de cada grupo, vetorizada: uma ordenação global
+    (grupo, valor) e somas por grupo com np.add.reduceat.
+    Retorna DataFrame indexado pelo grupo com n, total, hhi (soma dos quadrados das
+    participações, 1/n a 1) e gini (0 = igualitário, 1 = concentrado).
+    """
+    groups = np.asarray(groups)
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return pd.DataFrame(columns=['n', 'total', 'hhi', 'gini'])
+    order = np.lexsort((values, groups))
+    groups = groups[order]
+    values = values[order]
+
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    totals = np.add.reduceat(values, starts)
+    group_totals = np.repeat(totals, counts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(group_totals > 0, values / group_totals, 0.0)
+        hhi = np.add.reduceat(shares ** 2, starts)
+        # Gini = 2·Σ(i·x_i) / (n·Σx) − (n+1)/n, com x em ordem crescente e i = 1..n dentro do grupo
+        ranks = np.arange(len(values)) - np.repeat(starts, counts) + 1
+        weighted = np.add.reduceat(ranks * values, starts)
+        gini = np.where(totals > 0, 2 * weighted / (counts * totals) - (counts + 1) / counts, 0.0)
+    return pd.DataFrame({'n': counts, 'total': totals, 'hhi': hhi, 'gini': gini}, index=groups[starts])
+
+
+def gini(values):
+    """Índice de Gini de um vetor de valores não negativos."""
+    result = concentration_by_group(np.zeros(len(values), dtype=int), values)
+    return float(result['gini'].iloc[0]) if not result.empty else 0.0
+
+
+class DistributionAnalytics:
+    """
+    Indicadores de distribuição calculados sobre um ReportModel:
+    - category_coverage: valor necessário × contemplado e taxa de cobertura por categoria
+    - emenda_concentration / deputy_concentration: HHI e Gini das contribuições de cada
+      emenda (entre deputados) e de cada deputado (entre emendas)
+    - intention_honoured: quanto da intenção de alocação de cada deputado virou contribuição
+    - unused_by_category: intenção não utilizada por categoria
+    - indicators: resumo geral
+    """
+    def __init__(self, model):
+        emendas = model.emendas
+        contributions = model.contributions
+        deputies = model.deputies.drop_duplicates('id')
+        self._emenda_names = emendas.set_index('id')['description']
+        self._deputy_names = deputies.set_index('id')['name']
+
+        coverage = emendas.groupby('categoria').agg(
+            emendas=('id', 'size'), valor_necessario=('valor_necessario', 'sum'), funded_amount=('funded_amount', 'sum'))
+        coverage['coverage'] = np.divide(coverage['funded_amount'], coverage['valor_necessario'],
+                                         out=np.zeros(len(coverage)), where=coverage['valor_necessario'].to_numpy() > 0)
+        self.category_coverage = coverage.reset_index()
+
+        self.emenda_concentration = concentration_by_group(contributions['emenda_id'], contributions['total'])
+        self.emenda_concentration.index.name = 'emenda_id'
+        self.deputy_concentration = concentration_by_group(contributions['deputy_id'], contributions['total'])
+        self.deputy_concentration.index.name = 'deputy_id'
+
+        intended = model.intentions.groupby(['deputy_id', 'categoria'])['amount'].sum()
+        used = contributions.groupby(['deputy_id', 'categoria'])['from_allocated_intention'].sum()
+        by_deputy_category = pd.concat([intended.rename('intended'), used.rename('used')], axis=1).fillna(0.0)
+        by_deputy_category['unused'] = (by_deputy_category['intended'] - by_deputy_category['used']).clip(lower=0.0)
+
+        honoured = by_deputy_category.groupby(level='deputy_id')[['intended', 'used']].sum()
+        honoured = deputies[['id', 'name']].set_index('id').join(honoured).fillna({'intended': 0.0, 'used': 0.0})
+        honoured['honoured_share'] = np.divide(honoured['used'], honoured['intended'],
+                                               out=np.full(len(honoured), np.nan), where=honoured['intended'].to_numpy() > 0)
+        free_used = contributions.groupby('deputy_id')['from_free_verba'].sum()
+        honoured['free_available'] = deputies.set_index('id')['remaining_verba']
+        honoured['free_used'] = free_used.reindex(honoured.index).fillna(0.0)
+        honoured.index.name = 'deputy_id'
+        self.intention_honoured = honoured.reset_index()
+
+        self.unused_by_category = by_deputy_category.groupby(level='categoria')[['intended', 'used', 'unused']].sum().reset_index()
+
+        total_needed = float(emendas['valor_necessario'].sum())
+        total_intended = float(honoured['intended'].sum())
+        self.indicators = {
+            'coverage': float(emendas['funded_amount'].sum()) / total_needed if total_needed > 0 else 0.0,
+            'deputy_gini': gini(deputies['contributed_total'].to_numpy()),
+            'emenda_gini': gini(emendas['funded_amount'].to_numpy()),
+            'mean_emenda_hhi': float(self.emenda_concentration['hhi'].mean()) if not self.emenda_concentration.empty else 0.0,
+            'intention_honoured': float(honoured['used'].sum()) / total_intended if total_intended > 0 else 0.0,
+            'unused_intention': float(by_deputy_category['unused'].sum()),
+            # Verba disponível e não gasta: verba total menos o valor efetivamente contribuído (intenção + verba livre)
+            'unused_free_verba': float((deputies['total_verba_disponivel'] - deputies['actual_spent_amount']).clip(lower=0.0).sum()),
+        }
+
+    def display_tables(self):
+        """Tabelas rotuladas para exibição: {título: DataFrame}."""
+        emenda_concentration = self.emenda_concentration.reset_index()
+        emenda_concentration.insert(1, 'description', emenda_concentration['emenda_id'].map(self._emenda_names))
+        deputy_concentration = self.deputy_concentration.reset_index()
+        deputy_concentration.insert(1, 'name', deputy_concentration['deputy_id'].map(self._deputy_names))
+        labels = {
+            'categoria': "Categoria", 'emendas': "Emendas", 'valor_necessario': "Valor Necessário",
+            'funded_amount': "Valor Contemplado", 'coverage': "Cobertura", 'emenda_id': "ID Emenda",
+            'description': "Emenda", 'deputy_id': "ID Deputado", 'name': "Deputado", 'n': "Contribuições",
+            'total': "Total", 'hhi': "HHI", 'gini': "Gini", 'intended': "Intenção", 'used': "Intenção Utilizada",
+            'honoured_share': "Intenção Atendida", 'free_available': "Verba Livre", 'free_used': "Verba Livre Utilizada",
+            'unused': "Intenção Não Utilizada",
+        }
+        return {
+            "Cobertura por Categoria": self.category_coverage.rename(columns=labels),
+            "Concentração por Emenda": emenda_concentration.rename(columns=labels),
+            "Concentração por Deputado": deputy_concentration.rename(columns=labels),
+            "Intenção Atendida": self.intention_honoured.rename(columns=labels),
+            "Verba Não Utilizada por Categoria": self.unused_by_category.rename(columns=labels),
+        }
@@ -0,0 +1,248 @@
+import base64
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from LRUCache import LRUCache
+
+# Formatos suportados: formato -> (tipo MIME, extensão)
+FORMATS = {'html': ('text/html', 'html'), 'pdf': ('application/pdf', 'pdf')}
+ARTIFACT_CACHE_SIZE = 8 # Documentos prontos mantidos em memória (por versão e formato)
+PDF_LINES_PER_PAGE = 80
+
+STATUS_PENDING = 'pendente'
+STATUS_RUNNING = 'renderizando'
+STATUS_DONE = 'concluído'
+STATUS_FAILED = 'falhou'
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>{{ title }}</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; color: #222; }
+  h1, h2 { color: #1f3b5a; }
+  table { border-collapse: collapse; margin-bottom: 1.5em; font-size: 0.9em; }
+  th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }
+  th { background: #eef2f6; }
+  td:first-child, th:first-child { text-align: left; }
+  pre { background: #f7f7f7; padding: 1em; font-size: 0.85em; white-space: pre-wrap; }
+  .charts img { max-width: 48%; margin-right: 1%; }
+</style>
+</head>
+<body>
+<h1>{{ title }}</h1>
+<p>Versão dos dados: {{ version }}{% if generated_at %} &middot; Gerado em {{ generated_at }}{% endif %}</p>
+<div class="charts">
+{% for chart in charts %}<img alt="{{ chart.title }}" src="data:image/png;base64,{{ chart.png }}">
+{% endfor %}</div>
+{% for table in tables %}<h2>{{ table.title }}</h2>
+{{ table.html | safe }}
+{% endfor %}<h2>Relatório Detalhado</h2>
+{% for section in sections %}<pre>{{ section }}</pre>
+{% endfor %}</body>
+</html>
+"""
+
+
+class RenderJob:
+    """Estado de uma renderização em segundo plano, consultado pela interface a cada rerun."""
+    def __init__(self, version, fmt):
+        self.version = version
+        self.format = fmt
+        self.status = STATUS_PENDING
+        self.progress = 0.0
+        self.message = "Aguardando na fila..."
+        self.data = None # bytes do documento quando concluído
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in (STATUS_DONE, STATUS_FAILED)
+
+    @property
+    def mime(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def file_name(self):
+        return f"relatorio_v{self.version}.{FORMATS[self.format][1]}"
+
+    def _update(self, progress, message):
+        self.progress = min(max(progress, 0.0), 1.0)
+        self.message = message
+
+
+class DocumentRenderer:
+    """
+    Gera versões formatadas (HTML via Jinja2 e PDF via matplotlib) do relatório em uma
+    thread de segundo plano, para não travar o script do Streamlit. Cada documento é
+    renderizado a partir de um snapshot fixo; os prontos ficam em cache por
+    (versão do snapshot, formato) e pedidos repetidos reaproveitam o job existente.
+    """
+    def __init__(self, report_generator, max_workers=1):
+        self.report_generator = report_generator
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='render-relatorio')
+        self._jobs = LRUCache(ARTIFACT_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self._environment = None # Jinja2 só é carregado no primeiro documento gerado
+
+    def submit(self, fmt, snapshot=None):
+        """Agenda a renderização (se ainda não feita para esta versão) e retorna o RenderJob."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato de documento desconhecido: {fmt}")
+        snapshot = snapshot if snapshot is not None else self.report_generator.snapshot_store.current()
+        key = (snapshot.version, fmt)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != STATUS_FAILED:
+                return job
+            job = RenderJob(snapshot.version, fmt)
+            self._jobs.put(key, job)
+        self._executor.submit(self._run, job, snapshot)
+        return job
+
+    def get_job(self, fmt, snapshot=None):
+        """Job existente para a versão/formato, ou None se ainda não foi pedido."""
+        snapshot = snapshot if snapshot is not None else self.report_generator.snapshot_store.current()
+        return self._jobs.get((snapshot.version, fmt))
+
+    def render_now(self, fmt, snapshot=None, timestamped=True):
+        """
+        Renderiza o documento na thread atual e retorna os bytes (para exportações em lote).
+        Com timestamped=False o HTML sai sem a data de geração e depende só do snapshot.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato de documento desconhecido: {fmt}")
+        snapshot = snapshot if snapshot is not None else self.report_generator.snapshot_store.current()
+        job = RenderJob(snapshot.version, fmt)
+        if fmt == 'html':
+            return self._render_html(snapshot, job, timestamped)
+        return self._render_pdf(snapshot, job)
+
+    def _run(self, job, snapshot):
+        job.status = STATUS_RUNNING
+        try:
+            render = self._render_html if job.format == 'html' else self._render_pdf
+            job.data = render(snapshot, job)
+            job._update(1.0, "Documento pronto.")
+            job.status = STATUS_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = STATUS_FAILED
+            job.message = f"Erro ao gerar o documento: {e}"
+            print(f"AVISO: falha ao renderizar o relatório ({job.format}, versão {job.version}): {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def _template_environment(self):
+        if self._environment is None:
+            from jinja2 import Environment
+
+            self._environment = Environment(autoescape=True)
+        return self._environment
+
+    # --- HTML ---
+
+    def _render_html(self, snapshot, job, timestamped=True):
+        model = self.report_generator.get_report_model(snapshot)
+        job._update(0.05, "Gerando gráficos...")
+        charts = [{'title': title, 'png': base64.b64encode(self._figure_png(figure)).decode('ascii')}
+                  for title, figure in self._chart_figures(snapshot)]
+        job._update(0.2, "Montando tabelas...")
+        tables = [{'title': title, 'html': table.to_html(index=title == "Deputado × Categoria", float_format=lambda v: f"{v:,.2f}", border=0)}
+                  for title, table in model.display_tables().items()]
+
+        sections = []
+        report_sections = self.report_generator.list_report_sections(snapshot)
+        for position, (section_key, title) in enumerate(report_sections, start=1):
+            sections.append(self._document_text(self.report_generator.iter_section_lines(section_key, snapshot)))
+            job._update(0.3 + 0.65 * position / len(report_sections), f"Seção {position} de {len(report_sections)}: {title}")
+
+        html = self._template_environment().from_string(HTML_TEMPLATE).render(
+            title="Relatório de Distribuição de Verbas e Status das Emendas",
+            version=snapshot.version,
+            generated_at=time.strftime('%d/%m/%Y %H:%M') if timestamped else None,
+            charts=charts, tables=tables, sections=sections,
+        )
+        return html.encode('utf-8')
+
+    # --- PDF ---
+
+    def _render_pdf(self, snapshot, job):
+        from matplotlib.backends.backend_pdf import PdfPages
+        from matplotlib.figure import Figure
+
+        buffer = io.BytesIO()
+        with PdfPages(buffer) as pdf:
+            job._update(0.05, "Gerando gráficos...")
+            for _, figure in self._chart_figures(snapshot):
+                pdf.savefig(figure)
+
+            report_sections = self.report_generator.list_report_sections(snapshot)
+            page_lines = []
+            for position, (section_key, title) in enumerate(report_sections, start=1):
+                page_lines.extend(self._document_text(self.report_generator.iter_section_lines(section_key, snapshot)).split("\n"))
+                while len(page_lines) >= PDF_LINES_PER_PAGE:
+                    pdf.savefig(self._text_page(Figure, page_lines[:PDF_LINES_PER_PAGE]))
+                    del page_lines[:PDF_LINES_PER_PAGE]
+                job._update(0.1 + 0.85 * position / len(report_sections), f"Seção {position} de {len(report_sections)}: {title}")
+            if page_lines:
+                pdf.savefig(self._text_page(Figure, page_lines))
+        return buffer.getvalue()
+
+    @staticmethod
+    def _text_page(figure_class, lines):
+        figure = figure_class(figsize=(8.27, 11.69)) # A4
+        step = 0.92 / PDF_LINES_PER_PAGE
+        for i, line in enumerate(lines):
+            # parse_math=False: os valores em R$ não devem ser interpretados como fórmulas
+            figure.text(0.05, 0.96 - i * step, line, family='monospace', fontsize=6.5, va='top', parse_math=False)
+        return figure
+
+    # --- Gráficos ---
+
+    def _chart_figures(self, snapshot):
+        from matplotlib.figure import Figure
+
+        figures = []
+        summary = self.report_generator.get_summary_for_chart(snapshot)
+        values = [max(s['data'], 0.0) for s in summary['series']]
+        if sum(values) > 0:
+            figure = Figure(figsize=(6, 4.5))
+            ax = figure.subplots()
+            ax.pie(values, labels=[s['name'] for s in summary['series']], autopct='%1.1f%%', startangle=90)
+            ax.set_title(summary['title']['text'])
+            figures.append((summary['title']['text'], figure))
+
+        by_category = self.report_generator.get_category_chart(snapshot)
+        if by_category['categories']:
+            title = by_category['title']['text']
+            funded, missing = (s['data'] for s in by_category['series'])
+            figure = Figure(figsize=(6, 4.5))
+            ax = figure.subplots()
+            ax.bar(by_category['categories'], funded, label="Contemplado")
+            ax.bar(by_category['categories'], missing, bottom=funded, label="Faltante")
+            ax.set_title(title)
+            ax.legend()
+            ax.tick_params(axis='x', labelrotation=30)
+            figure.tight_layout()
+            figures.append((title, figure))
+        return figures
+
+    @staticmethod
+    def _figure_png(figure):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        buffer = io.BytesIO()
+        FigureCanvasAgg(figure).print_png(buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _document_text(lines):
+        # O texto do relatório traz "R\\$" (escape herdado da interface); nos documentos o cifrão é literal
+        return "\n".join(lines).replace("R\\$", "R$")
@@ -20,19 +20,22 @@ class Emenda:
         }
 
     @classmethod
-    def deserialize(cls, data):
+    def deserialize(cls, data, warn=True):
+        # warn=False quando o lote já foi validado por DataValidator (evita avisos registro a registro)
         # Tenta converter valor_necessario para float de forma mais segura
         try:
             valor_necessario = float(data.get('valor_necessario', 0.0))
         except (ValueError, TypeError):
-            print(f"AVISO: 'valor_necessario' para emenda {data.get('description', 'desconhecida')} não é um número válido. Usando 0.0.")
+            if warn:
+                print(f"AVISO: 'valor_necessario' para emenda {data.get('description', 'desconhecida')} não é um número válido. Usando 0.0.")
             valor_necessario = 0.0
 
         # Tenta converter current_funded_amount para float de forma mais segura
         try:
             current_funded_amount = float(data.get('current_funded_amount', 0.0))
         except (ValueError, TypeError):
-            print(f"AVISO: 'current_funded_amount' para emenda {data.get('description', 'desconhecida')} não é um número válido. Usando 0.0.")
+            if warn:
+                print(f"AVISO: 'current_funded_amount' para emenda {data.get('description', 'desconhecida')} não é um número válido. Usando 0.0.")
             current_funded_amount = 0.0
 
         emenda = cls(
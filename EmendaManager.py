@@ -1,32 +1,72 @@
+import copy
 from Emenda import Emenda
+import EventBus as events
+from EventBus import EventBus
+from Metrics import metrics
 # A linha abaixo deve estar REMOVIDA, pois DataManager será passado no construtor
 # from DataManager import DataManager 
 
 class EmendaManager:
     # O construtor **DEVE** receber uma instância de DataManager
-    def __init__(self, data_manager):
+    def __init__(self, data_manager, event_bus=None):
         self.data_manager = data_manager
-        self.emendas = self.data_manager.load_emendas()
+        self.event_bus = event_bus if event_bus is not None else EventBus()
+        with metrics.timer("emendas.load.ms"):
+            self.emendas = self.data_manager.load_emendas()
+        self._emendas_by_id = {e.id: e for e in self.emendas} # Índice para busca por ID em O(1)
         self.next_emenda_id = max([e.id for e in self.emendas] or [0]) + 1
 
     def add_emenda(self, description, valor_necessario, categoria):
         new_emenda = Emenda(description, valor_necessario, categoria)
         new_emenda.id = self.next_emenda_id
         self.emendas.append(new_emenda)
+        self._emendas_by_id[new_emenda.id] = new_emenda
         self.next_emenda_id += 1
         self.data_manager.save_emendas(self.emendas)
+        self.event_bus.emit(events.EMENDA_ADDED, emenda_ids=[new_emenda.id], categories=[categoria])
         return new_emenda
 
     def list_emendas(self):
         return self.emendas
 
     def get_emenda_by_id(self, emenda_id):
-        return next((e for e in self.emendas if e.id == emenda_id), None)
+        return self._emendas_by_id.get(emenda_id)
 
     def delete_emenda(self, emenda_id):
+        emenda = self.get_emenda_by_id(emenda_id)
         initial_len = len(self.emendas)
         self.emendas = [e for e in self.emendas if e.id != emenda_id]
         if len(self.emendas) < initial_len:
+            self._emendas_by_id.pop(emenda_id, None)
             self.data_manager.save_emendas(self.emendas)
+            # Deputados que contribuíam para a emenda excluída também são afetados
+            self.event_bus.emit(events.EMENDA_DELETED, emenda_ids=[emenda_id], categories=[emenda.categoria],
+                                deputy_ids=[int(dep_id) for dep_id in emenda.current_contributions])
             return True, "Emenda excluída com sucesso."
         return False, "Emenda não encontrada."
+
+    def apply_records(self, records_by_id):
+        """
+        Substitui o estado das emendas indicadas a partir de registros serializados
+        (usado por StateHistory para desfazer/refazer). Um registro None remove a emenda.
+        Objetos existentes são atualizados no lugar para preservar referências.
+        """
+        inserted = False
+        for emenda_id, record in records_by_id.items():
+            current = self._emendas_by_id.get(emenda_id)
+            if record is None:
+                if current is not None:
+                    self.emendas.remove(current)
+                    del self._emendas_by_id[emenda_id]
+                continue
+            restored = Emenda.deserialize(copy.deepcopy(record), warn=False)
+            if current is not None:
+                vars(current).update(vars(restored))
+            else:
+                self.emendas.append(restored)
+                self._emendas_by_id[emenda_id] = restored
+                inserted = True
+        if inserted:
+            self.emendas.sort(key=lambda e: e.id)
+        self.next_emenda_id = max([self.next_emenda_id] + [e_id + 1 for e_id in self._emendas_by_id])
+        self.data_manager.save_emendas(self.emendas)
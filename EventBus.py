@@ -0,0 +1,75 @@
+from Metrics import metrics
+
+# Tipos de eventos emitidos pelos managers e pelo otimizador.
+DEPUTY_ADDED = 'deputy_added'
+DEPUTY_UPDATED = 'deputy_updated'
+DEPUTY_DELETED = 'deputy_deleted'
+DEPUTY_ALLOCATIONS_UPDATED = 'deputy_allocations_updated'
+DEPUTY_INCLINATIONS_UPDATED = 'deputy_inclinations_updated'
+REALLOCATION_FLAGS_CHANGED = 'reallocation_flags_changed'
+EMENDA_ADDED = 'emenda_added'
+EMENDA_DELETED = 'emenda_deleted'
+CATEGORY_ADDED = 'category_added'
+CATEGORY_DELETED = 'category_deleted'
+ALLOCATION_STARTED = 'allocation_started'
+ALLOCATION_COMMITTED = 'allocation_committed'
+ALLOCATION_ABORTED = 'allocation_aborted' # Otimização interrompida por erro (nada é confirmado)
+STATE_RESTORED = 'state_restored' # Desfazer/refazer (StateHistory)
+
+ALL_EVENTS = '*'
+
+
+class Event:
+    """
+    Notificação de mudança nos dados. Carrega o tipo do evento e os IDs afetados,
+    para que caches e índices invalidem apenas o que mudou.
+    """
+    def __init__(self, event_type, deputy_ids=(), emenda_ids=(), categories=(), **details):
+        self.type = event_type
+        self.deputy_ids = tuple(deputy_ids)
+        self.emenda_ids = tuple(emenda_ids)
+        self.categories = tuple(categories)
+        self.details = details
+
+    def __repr__(self):
+        return (f"Event({self.type!r}, deputy_ids={self.deputy_ids}, "
+                f"emenda_ids={self.emenda_ids}, categories={self.categories}, details={self.details})")
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = {} # {event_type: [callback, ...]}
+
+    def subscribe(self, event_types, callback):
+        """
+        Registra um callback para um ou mais tipos de evento (ou ALL_EVENTS).
+        O callback recebe um único argumento: o Event emitido.
+        """
+        if isinstance(event_types, str):
+            event_types = [event_types]
+        for event_type in event_types:
+            callbacks = self._subscribers.setdefault(event_type, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback, event_types=None):
+        if isinstance(event_types, str):
+            event_types = [event_types]
+        for event_type in (event_types or list(self._subscribers.keys())):
+            callbacks = self._subscribers.get(event_type, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def emit(self, event_type, deputy_ids=(), emenda_ids=(), categories=(), **details):
+        event = Event(event_type, deputy_ids, emenda_ids, categories, **details)
+        # Copia as listas para permitir (des)inscrição durante a notificação
+        callbacks = list(self._subscribers.get(event_type, [])) + list(self._subscribers.get(ALL_EVENTS, []))
+        with metrics.timer(f"events.{event_type}.ms"): # Tempo gasto pelos assinantes (caches, snapshots, índices)
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception as e:
+                    # Um assinante com erro não deve impedir os demais nem a operação que gerou o evento
+                    print(f"AVISO: erro ao processar o evento '{event_type}' em {getattr(callback, '__name__', callback)}: {e}")
+        return event
@@ -0,0 +1,348 @@
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.testing.v1 import AppTest
+from streamlit.util import calc_md5
+
+from DataManager import DataManager, DATA_DIR_VARIABLE
+from Deputy import Deputy
+from Emenda import Emenda
+from Metrics import MetricsRegistry, metrics
+from PublicBundleExporter import wait_for_background_exports
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_app.py')
+RERUN_TIMEOUT_SECONDS = 120
+OPTIMIZATION_TIMEOUT_SECONDS = 300
+OPTIMIZATION_POLL_SECONDS = 0.25
+LATENCY_WINDOW = 100000 # Amostras de latência mantidas por fluxo (todas, na prática)
+# Páginas abertas por cada sessão antes de medir a memória retida: listagem (leitura e busca) e edição (histórico)
+SESSION_WARMUP_PAGES = ('deputados', 'deputados-detalhes')
+
+PARTIES = ["PT", "PSOL", "PL", "MDB", "PSD", "PP", "UNIÃO", "PSB", "REPUBLICANOS", "PDT"]
+CATEGORY_NAMES = ["Saúde", "Educação", "Mobilidade", "Habitação", "Serviço social", "Cultura", "Esporte",
+                  "Segurança", "Meio ambiente", "Saneamento", "Assistência", "Turismo"]
+PLACES = ["Gama", "Taguatinga", "Ceilândia", "Sobradinho", "Planaltina", "Brazlândia", "Guará", "Samambaia",
+          "Recanto das Emas", "Santa Maria", "Paranoá", "Riacho Fundo"]
+WORKS = ["Reforma", "Construção", "Ampliação", "Implantação", "Manutenção", "Aquisição de equipamentos para"]
+FACILITIES = ["unidade básica de saúde", "escola", "ponte", "praça", "centro comunitário", "quadra poliesportiva",
+              "biblioteca", "ciclovia", "creche", "restaurante comunitário"]
+
+# Peso de cada fluxo no sorteio das ações de uma sessão simulada
+FLOW_WEIGHTS = {'listar': 4, 'relatorio': 3, 'editar': 2, 'otimizar': 1}
+
+# O AppTest troca o Runtime global do Streamlit a cada execução e não pode rodar dois scripts ao
+# mesmo tempo no processo: as sessões se revezam nesta trava, como os reruns disputam o GIL em um
+# servidor real. A latência medida inclui a espera pela vez; as tarefas em segundo plano
+# (otimização, documentos, exportação) continuam rodando em paralelo.
+_APP_TEST_LOCK = threading.Lock()
+
+
+# --- Dados sintéticos ---
+
+def generate_dataset(data_dir, deputies=50, emendas=2000, categories=8, seed=0):
+    """
+    Gera um conjunto de dados sintético (categorias, deputados com alocações e inclinações
+    válidas, e emendas) em data_dir, no mesmo formato lido pelo DataManager.
+    """
+    rng = random.Random(seed)
+    data_manager = DataManager(data_dir)
+    category_names = [CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Categoria {i + 1}" for i in range(categories)]
+    data_manager.save_categories(category_names)
+
+    deputy_list = []
+    for deputy_id in range(1, deputies + 1):
+        verba = rng.randrange(2_000_000, 20_000_000, 100_000)
+        deputy = Deputy(f"Deputado {deputy_id} ({rng.choice(PARTIES)})", verba,
+                        f"Atuação em {rng.choice(category_names).lower()} e {rng.choice(category_names).lower()} na região de {rng.choice(PLACES)}.")
+        deputy.id = deputy_id
+        chosen = rng.sample(category_names, k=min(len(category_names), rng.randint(0, 3)))
+        share = rng.uniform(0.2, 0.8) / max(len(chosen), 1)
+        deputy.allocated_by_category = {category: float(round(verba * share, 2)) for category in chosen}
+        points = 10
+        for category in rng.sample(category_names, k=min(len(category_names), rng.randint(0, 4))):
+            if points <= 0:
+                break
+            score = rng.randint(1, points)
+            deputy.inclinacao_por_categoria[category] = score
+            points -= score
+        deputy_list.append(deputy)
+    data_manager.save_deputies(deputy_list)
+
+    emenda_list = []
+    for emenda_id in range(1, emendas + 1):
+        emenda = Emenda(f"{rng.choice(WORKS)} {rng.choice(FACILITIES)} em {rng.choice(PLACES)}",
+                        rng.randrange(100_000, 5_000_000, 10_000), rng.choice(category_names))
+        emenda.id = emenda_id
+        emenda_list.append(emenda)
+    data_manager.save_emendas(emenda_list)
+    return data_manager
+
+
+# --- Sessões simuladas ---
+
+class SimulatedSession:
+    """
+    Uma sessão do Streamlit conduzida pelo AppTest. Cada rerun é cronometrado por fluxo em
+    latencies (incluindo a espera pela vez de executar) e em run_times (só a execução).
+    """
+    def __init__(self, number, latencies, run_times, timeout=RERUN_TIMEOUT_SECONDS):
+        self.number = number
+        self.app = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+        self.latencies = latencies
+        self.run_times = run_times
+        self.errors = [] # (fluxo, mensagens das exceções exibidas pela aplicação)
+        self.actions = 0
+
+    def run(self, flow):
+        requested = time.perf_counter()
+        with _APP_TEST_LOCK:
+            started = time.perf_counter()
+            self.app.run()
+            finished = time.perf_counter()
+        self.latencies.observe(flow, (finished - requested) * 1000)
+        self.run_times.observe(flow, (finished - started) * 1000)
+        if self.app.exception:
+            self.errors.append((flow, [e.value for e in self.app.exception]))
+
+    def open_page(self, url_path, flow):
+        # As páginas são funções registradas no st.navigation; o AppTest só troca de página por
+        # arquivo, então a página é escolhida pelo hash da URL, como faz a navegação do Streamlit
+        self.app._page_hash = calc_md5(url_path)
+        self.run(flow)
+
+    def button(self, label):
+        return next((b for b in self.app.button if b.label == label), None)
+
+    # --- Fluxos típicos ---
+
+    def flow_listar(self, rng):
+        self.open_page('deputados', 'listar')
+        if self.app.text_input:
+            self.app.text_input(key='deputy_listing_search').set_value(rng.choice(PARTIES).lower())
+            self.run('listar')
+        self.open_page('emendas', 'listar')
+        if self.app.text_input:
+            self.app.text_input(key='emenda_listing_search').set_value(rng.choice(PLACES))
+            self.run('listar')
+
+    def flow_relatorio(self, rng):
+        self.open_page('relatorios', 'relatorio')
+        self.open_page('painel', 'relatorio')
+
+    def flow_editar(self, rng):
+        self.open_page('deputados-detalhes', 'editar')
+        if not self.app.selectbox:
+            return
+        selector = self.app.selectbox(key='select_deputy_edit')
+        selector.set_value(rng.choice(selector.options))
+        self.run('editar')
+        deputy_id = int(re.search(r"\(ID: (\d+)\)$", selector.value).group(1))
+        verba = self.app.number_input(key=f"edit_verba_{deputy_id}")
+        verba.set_value(round(verba.value * rng.uniform(0.95, 1.05), 2))
+        submit = self.button("Atualizar Dados do Deputado")
+        if submit is not None:
+            submit.click()
+            self.run('editar')
+
+    def flow_otimizar(self, rng):
+        self.open_page('otimizar', 'otimizar')
+        button = self.button("Otimização Parcial") or self.button("Executar Otimização Geral")
+        if button is None:
+            return
+        button.click()
+        self.run('otimizar')
+        # A otimização roda em segundo plano; a página é reexecutada como faria o painel de progresso
+        runner = self.app.session_state['optimization_runner'] if 'optimization_runner' in self.app.session_state else None
+        deadline = time.monotonic() + OPTIMIZATION_TIMEOUT_SECONDS
+        while runner is not None and runner.running and time.monotonic() < deadline:
+            time.sleep(OPTIMIZATION_POLL_SECONDS)
+            self.run('otimizar')
+
+    def perform(self, flow, rng):
+        getattr(self, f"flow_{flow}")(rng)
+        self.actions += 1
+
+
+def _rss_mb():
+    """Memória residente atual do processo (MB), lida de /proc (Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _start_sessions(count, latencies, run_times):
+    """
+    Abre as sessões uma a uma, medindo a memória retida por cada uma (tracemalloc). A Home não
+    cria nenhum subsistema, então cada sessão também abre as páginas de SESSION_WARMUP_PAGES
+    (dados, snapshots, índice de busca e histórico) antes da medição.
+    """
+    sessions = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for number in range(count):
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            session = SimulatedSession(number, latencies, run_times)
+            session.run('inicio')
+            for url_path in SESSION_WARMUP_PAGES:
+                session.open_page(url_path, 'inicio')
+            gc.collect()
+            retained.append((tracemalloc.get_traced_memory()[0] - before) / 2**20)
+            sessions.append(session)
+    finally:
+        tracemalloc.stop()
+    return sessions, retained
+
+
+def run_load_test(sessions=10, iterations=5, flows=None, think_seconds=0.0, workers=None, seed=0):
+    """
+    Conduz sessões simuladas em paralelo sobre a pasta de dados de EMENDAS_DATA_DIR.
+    Cada sessão executa iterations ações sorteadas (por FLOW_WEIGHTS) entre os fluxos pedidos.
+    Retorna um dicionário com a distribuição de latência dos reruns por fluxo, a memória
+    por sessão e as exceções exibidas pela aplicação.
+    """
+    flows = list(flows or FLOW_WEIGHTS)
+    weights = [FLOW_WEIGHTS[flow] for flow in flows]
+    latencies = MetricsRegistry(enabled=True, window=LATENCY_WINDOW)
+    run_times = MetricsRegistry(enabled=True, window=LATENCY_WINDOW)
+
+    # Sessão de aquecimento (importações e caches do processo), fora das medições
+    warmup = SimulatedSession(-1, MetricsRegistry(), MetricsRegistry())
+    warmup.run('aquecimento')
+    for url_path in SESSION_WARMUP_PAGES:
+        warmup.open_page(url_path, 'aquecimento')
+    del warmup
+    rss_before = _rss_mb()
+    simulated, retained = _start_sessions(sessions, latencies, run_times)
+    rss_started = _rss_mb()
+
+    def drive(session):
+        rng = random.Random(seed * 100003 + session.number)
+        for _ in range(iterations):
+            if think_seconds:
+                time.sleep(rng.uniform(0, 2 * think_seconds))
+            try:
+                session.perform(rng.choices(flows, weights)[0], rng)
+            except Exception as e:
+                # Falha do roteiro (widget ausente, timeout): registra e segue com a próxima ação
+                session.errors.append(('roteiro', [f"{type(e).__name__}: {e}"]))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or sessions, thread_name_prefix='sessao-simulada') as executor:
+        list(executor.map(drive, simulated))
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_mb()
+
+    return {
+        'sessions': sessions,
+        'iterations': iterations,
+        'seconds': elapsed,
+        'actions': sum(s.actions for s in simulated),
+        'latency_ms': latencies.histograms(),
+        'run_ms': run_times.histograms(),
+        'memory_mb': {
+            'retained_per_session': retained,
+            'rss_before_sessions': rss_before,
+            'rss_after_start': rss_started,
+            'rss_after_flows': rss_after,
+            'rss_per_session': (rss_after - rss_before) / sessions if rss_before is not None and rss_after is not None and sessions else None,
+        },
+        'errors': [(s.number, flow, messages) for s in simulated for flow, messages in s.errors],
+        'app_metrics_ms': {name: summary for name, summary in metrics.histograms().items() if name.startswith(('page.', 'app.', 'optimizer.'))},
+    }
+
+
+# --- Relatório ---
+
+def format_report(result):
+    lines = [f"{result['sessions']} sessão(ões) simultânea(s), {result['actions']} ação(ões) em {result['seconds']:.1f}s"]
+    lines.append("")
+    lines.append("Latência dos reruns por fluxo (ms; exec. = só a execução, sem a espera pela vez):")
+    lines.append(f"  {'fluxo':<12}{'reruns':>8}{'média':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'máx.':>10}{'exec. p50':>12}{'exec. p90':>12}")
+    for flow, s in sorted(result['latency_ms'].items()):
+        r = result['run_ms'][flow]
+        lines.append(f"  {flow:<12}{s['count']:>8}{s['mean']:>10.1f}{s['p50']:>10.1f}{s['p90']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}"
+                     f"{r['p50']:>12.1f}{r['p90']:>12.1f}")
+
+    memory = result['memory_mb']
+    retained = sorted(memory['retained_per_session'])
+    lines.append("")
+    lines.append("Memória:")
+    if retained:
+        lines.append(f"  retida por sessão com os dados abertos (tracemalloc): média {sum(retained) / len(retained):.1f} MB, "
+                     f"mediana {retained[len(retained) // 2]:.1f} MB, máx. {retained[-1]:.1f} MB")
+    if memory['rss_per_session'] is not None:
+        lines.append(f"  RSS do processo: {memory['rss_before_sessions']:.0f} MB antes das sessões, {memory['rss_after_start']:.0f} MB após abri-las, "
+                     f"{memory['rss_after_flows']:.0f} MB ao final ({memory['rss_per_session']:.1f} MB por sessão)")
+
+    if result['app_metrics_ms']:
+        lines.append("")
+        lines.append("Tempos medidos pela aplicação (ms, p50 / p90 / máx.):")
+        for name, s in sorted(result['app_metrics_ms'].items()):
+            lines.append(f"  {name:<32}{s['count']:>7}x  {s['p50']:>9.1f} / {s['p90']:>9.1f} / {s['max']:>9.1f}")
+
+    lines.append("")
+    if result['errors']:
+        lines.append(f"{len(result['errors'])} erro(s):")
+        for number, flow, messages in result['errors'][:20]:
+            lines.append(f"  - sessão {number}, {flow}: {'; '.join(messages)}")
+    else:
+        lines.append("Nenhuma exceção exibida pela aplicação.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do streamlit_app.py: várias sessões simuladas (AppTest) sobre dados sintéticos, sem rede.")
+    parser.add_argument('--sessions', type=int, default=10, help="Sessões simultâneas (padrão: 10)")
+    parser.add_argument('--iterations', type=int, default=5, help="Ações por sessão (padrão: 5)")
+    parser.add_argument('--flows', default=",".join(FLOW_WEIGHTS), help=f"Fluxos sorteados, separados por vírgula (padrão: {','.join(FLOW_WEIGHTS)})")
+    parser.add_argument('--deputies', type=int, default=50, help="Deputados no conjunto sintético (padrão: 50)")
+    parser.add_argument('--emendas', type=int, default=2000, help="Emendas no conjunto sintético (padrão: 2000)")
+    parser.add_argument('--categories', type=int, default=8, help="Categorias no conjunto sintético (padrão: 8)")
+    parser.add_argument('--think', type=float, default=0.0, help="Pausa média entre ações de uma sessão, em segundos (padrão: 0)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None, help="Pasta onde gerar os dados (padrão: pasta temporária, removida ao final)")
+    parser.add_argument('--json', default=None, help="Grava também o resultado completo neste arquivo JSON")
+    args = parser.parse_args(argv)
+
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    unknown = [flow for flow in flows if flow not in FLOW_WEIGHTS]
+    if unknown:
+        parser.error(f"Fluxo(s) desconhecido(s): {', '.join(unknown)}. Opções: {', '.join(FLOW_WEIGHTS)}")
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='emendas-carga-')
+    if os.path.exists(os.path.join(data_dir, 'deputies.json')):
+        parser.error(f"'{data_dir}' já contém dados; use uma pasta vazia para não sobrescrevê-los.")
+
+    print(f"Gerando dados sintéticos em '{data_dir}': {args.deputies} deputados, {args.emendas} emendas, {args.categories} categorias...")
+    generate_dataset(data_dir, args.deputies, args.emendas, args.categories, args.seed)
+    os.environ[DATA_DIR_VARIABLE] = data_dir
+    metrics.enabled = True # Tempos por página e do otimizador, vistos do lado da aplicação
+    try:
+        result = run_load_test(args.sessions, args.iterations, flows, args.think, seed=args.seed)
+    finally:
+        # Otimizações concluídas ainda podem estar exportando o pacote público para a pasta de dados
+        wait_for_background_exports()
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(format_report(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
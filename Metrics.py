@@ -0,0 +1,153 @@
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+
+RECENT_WINDOW = 500 # Amostras recentes mantidas por histograma (base dos percentis)
+ENV_VARIABLE = 'EMENDAS_METRICS' # EMENDAS_METRICS=1 liga a coleta desde o início do processo
+
+
+def _percentile(sorted_values, fraction):
+    """Percentil pelo posto mais próximo (sorted_values já ordenado e não vazio)."""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Histogram:
+    """Distribuição de uma medida: agregados desde o início e as amostras mais recentes."""
+    def __init__(self, window=RECENT_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        self.recent.append(value)
+
+    def summary(self):
+        ordered = sorted(self.recent)
+        return {
+            'count': self.count,
+            'last': self.recent[-1] if self.recent else None,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'p50': _percentile(ordered, 0.5) if ordered else None,
+            'p90': _percentile(ordered, 0.9) if ordered else None,
+            'p99': _percentile(ordered, 0.99) if ordered else None,
+            'max': self.max,
+            'total': self.total,
+        }
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'started')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas de desempenho do processo: contadores (increment), histogramas
+    (observe) e cronômetros em ms (timer/timed, gravados como histogramas). É compartilhado
+    por todas as sessões e thread-safe, pois otimizações e renderizações rodam em threads.
+    Desligado, cada chamada só testa self.enabled e retorna (timer devolve um objeto nulo
+    compartilhado), para que a instrumentação possa ficar nos caminhos quentes.
+    """
+    def __init__(self, enabled=False, window=RECENT_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.started_at = time.time()
+
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.add(value)
+
+    def timer(self, name):
+        """Context manager que grava a duração do bloco (ms) no histograma name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorador: grava a duração de cada chamada (ms) no histograma name."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, (time.perf_counter() - started) * 1000)
+            return wrapper
+        return decorate
+
+    # --- Leitura ---
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def histograms(self):
+        """{nome: resumo (count, last, mean, min, p50, p90, p99, max, total)}."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+    def recent(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return list(histogram.recent) if histogram is not None else []
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+metrics = MetricsRegistry(enabled=os.environ.get(ENV_VARIABLE, '').strip() not in ('', '0'))
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from AllocationOptimizer import OptimizationCancelled
+
+MODE_FULL = 'full'
+MODE_PARTIAL = 'partial'
+
+STATUS_PENDING = 'pendente'
+STATUS_RUNNING = 'otimizando'
+STATUS_DONE = 'concluída'
+STATUS_CANCELLED = 'cancelada'
+STATUS_FAILED = 'falhou'
+
+# Uma otimização por pasta de dados em todo o processo: as sessões do Streamlit têm managers
+# próprios, mas gravam nos mesmos arquivos JSON
+_run_locks = {}
+_run_locks_guard = threading.Lock()
+
+
+def _run_lock_for(data_dir):
+    key = os.path.abspath(data_dir)
+    with _run_locks_guard:
+        return _run_locks.setdefault(key, threading.Lock())
+
+
+class OptimizationJob:
+    """Estado de uma otimização em segundo plano, consultado pela interface a cada rerun."""
+    def __init__(self, mode, deputy_ids=None):
+        self.mode = mode
+        self.deputy_ids = deputy_ids
+        self.status = STATUS_PENDING
+        self.phase = "Aguardando na fila..."
+        self.progress = 0.0
+        self.message = None # Mensagem do otimizador quando concluída
+        self.error = None
+        self.diff = None # AllocationDiff entre os snapshots de antes e depois
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._cancel_requested = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in (STATUS_DONE, STATUS_CANCELLED, STATUS_FAILED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def cancel(self):
+        """Pede o cancelamento; a otimização para no próximo ponto de verificação e restaura o estado anterior."""
+        if not self.done:
+            self._cancel_requested.set()
+
+    def _update(self, phase, progress):
+        if self._cancel_requested.is_set():
+            raise OptimizationCancelled()
+        self.phase = phase
+        self.progress = min(max(progress, 0.0), 1.0)
+
+
+class OptimizationRunner:
+    """
+    Executa as otimizações do AllocationOptimizer em uma thread de segundo plano, sem travar
+    o script do Streamlit. A interface consulta o OptimizationJob (fase, progresso, resultado)
+    e pode pedir o cancelamento, verificado pelo otimizador a cada deputado processado.
+    O resultado é publicado atomicamente pelo SnapshotStore (ALLOCATION_COMMITTED); uma
+    otimização cancelada ou com erro restaura o estado anterior e não publica nada.
+    """
+    def __init__(self, optimizer, report_generator):
+        self.optimizer = optimizer
+        self.report_generator = report_generator
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='otimizacao')
+        self._run_lock = _run_lock_for(optimizer.data_manager.data_dir)
+        self.job = None # Última otimização pedida nesta sessão
+
+    @property
+    def running(self):
+        return self.job is not None and not self.job.done
+
+    def submit(self, mode, deputy_ids=None):
+        """Agenda uma otimização. Retorna (sucesso, mensagem, job)."""
+        if mode not in (MODE_FULL, MODE_PARTIAL):
+            raise ValueError(f"Modo de otimização desconhecido: {mode}")
+        if self.running:
+            return False, "Já existe uma otimização em andamento nesta sessão.", self.job
+        # Trava adquirida aqui (e liberada pela thread ao terminar): outra sessão recebe a recusa na hora
+        if not self._run_lock.acquire(blocking=False):
+            return False, "Outra sessão está executando uma otimização sobre os mesmos dados. Tente novamente quando ela terminar.", None
+        self.job = OptimizationJob(mode, list(deputy_ids) if deputy_ids is not None else None)
+        try:
+            self._executor.submit(self._run, self.job)
+        except Exception:
+            self._run_lock.release()
+            raise
+        return True, "Otimização iniciada em segundo plano.", self.job
+
+    def cancel(self):
+        if self.running:
+            self.job.cancel()
+
+    def _run(self, job):
+        job.status = STATUS_RUNNING
+        try:
+            before = self.report_generator.snapshot_store.current()
+            if job.mode == MODE_FULL:
+                job.message = self.optimizer.perform_full_redistribution(progress=job._update)
+            else:
+                job.message = self.optimizer.perform_partial_redistribution(job.deputy_ids, progress=job._update)
+            after = self.report_generator.snapshot_store.current()
+            job.diff = self.report_generator.diff_snapshots(before, after)
+            job.phase = "Otimização concluída."
+            job.progress = 1.0
+            job.status = STATUS_DONE
+        except OptimizationCancelled:
+            job.phase = "Otimização cancelada; o estado anterior foi mantido."
+            job.status = STATUS_CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.phase = f"Erro na otimização: {e}"
+            job.status = STATUS_FAILED
+            print(f"AVISO: falha na otimização em segundo plano ({job.mode}): {e}")
+        finally:
+            job.finished_at = time.time()
+            self._run_lock.release()
@@ -0,0 +1,290 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import EventBus as events
+from AggregateCube import party_from_name
+from DocumentRenderer import DocumentRenderer
+
+DEFAULT_DIRECTORY = os.path.join('data', 'public')
+MANIFEST_FILE = 'manifest.json'
+
+# Uma exportação por vez em cada pasta, em todo o processo: as sessões do Streamlit têm
+# exportadores próprios, mas gravam nos mesmos arquivos
+_export_locks = {}
+_export_locks_guard = threading.Lock()
+# Exportações automáticas de todas as sessões rodam em uma única thread de segundo plano
+_background_executor = None
+
+
+def _export_lock_for(directory):
+    key = os.path.abspath(directory)
+    with _export_locks_guard:
+        return _export_locks.setdefault(key, threading.Lock())
+
+
+def _shared_executor():
+    global _background_executor
+    with _export_locks_guard:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-publico')
+        return _background_executor
+
+
+def wait_for_background_exports():
+    """Espera as exportações automáticas já agendadas (ex.: antes de apagar a pasta de dados)."""
+    with _export_locks_guard:
+        executor = _background_executor
+    if executor is not None:
+        executor.submit(lambda: None).result() # Uma única thread: a tarefa vazia roda depois das anteriores
+
+DEPUTY_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head><meta charset="utf-8"><title>{{ name }}</title>
+<style>body { font-family: sans-serif; margin: 2em; } pre { background: #f7f7f7; padding: 1em; white-space: pre-wrap; }</style>
+</head>
+<body>
+<p><a href="../index.html">&larr; Relatório completo</a></p>
+<h1>{{ name }}</h1>
+<pre>{{ text }}</pre>
+</body>
+</html>
+"""
+
+
+class PublicBundleExporter:
+    """
+    Exporta um pacote estático, somente leitura, do estado de alocação atual, para ser
+    servido como arquivos (sem sessões Python):
+      index.html                    relatório completo em HTML, com gráficos
+      deputados/<id>.html           página de cada deputado
+      data/*.json, data/*.parquet   tabelas do ReportModel (emendas, deputados, contribuições)
+      data/deputados/<id>.json      detalhes de cada deputado
+      charts/*.json                 especificações dos gráficos
+      manifest.json                 versão exportada e hash de cada arquivo
+    A exportação é incremental: as páginas de deputados só são refeitas se o deputado ou as
+    emendas que ele financia mudaram, e nenhum arquivo com conteúdo idêntico é regravado.
+    Exportadores da mesma pasta (um por sessão) se revezam em uma trava do processo e releem
+    o manifesto do disco a cada exportação; se outro gravou depois, tudo é conferido de novo.
+    """
+    def __init__(self, report_generator, directory=DEFAULT_DIRECTORY, document_renderer=None):
+        self.report_generator = report_generator
+        self.directory = directory
+        self.document_renderer = document_renderer if document_renderer is not None else DocumentRenderer(report_generator)
+        self._environment = None # Jinja2 só é carregado no primeiro documento gerado
+        self._deputy_stamps = {} # {deputy_id: objetos do snapshot de que a página depende}
+        self._manifest = None # Último manifesto gravado por este exportador
+        self._lock = _export_lock_for(directory)
+
+    # --- Exportação automática ---
+
+    def attach(self, event_bus):
+        """
+        Reexporta em segundo plano após cada otimização confirmada. Inscreve-se em ALL_EVENTS
+        (notificados depois dos assinantes específicos e na ordem de inscrição) para rodar
+        depois que o SnapshotStore publicar o snapshot da otimização.
+        """
+        event_bus.subscribe(events.ALL_EVENTS, self._on_event)
+
+    def _on_event(self, event):
+        if event.type == events.ALLOCATION_COMMITTED:
+            _shared_executor().submit(self._export_in_background, self.report_generator.snapshot_store.current())
+
+    def _export_in_background(self, snapshot):
+        try:
+            self.export(snapshot)
+        except Exception as e:
+            print(f"AVISO: falha ao exportar o pacote público (versão {snapshot.version}): {e}")
+
+    # --- Exportação ---
+
+    def export(self, snapshot=None):
+        """Exporta (ou atualiza) o pacote para o snapshot. Retorna um resumo dos arquivos gravados."""
+        snapshot = snapshot if snapshot is not None else self.report_generator.snapshot_store.current()
+        with self._lock:
+            started = time.perf_counter()
+            manifest = self._load_manifest()
+            if manifest != self._manifest:
+                # Outro exportador gravou a pasta depois deste: as páginas em disco podem não
+                # corresponder aos carimbos guardados, então todas são conferidas pelo hash
+                self._deputy_stamps.clear()
+            previous_files = dict(manifest.get('files', {}))
+            files = {}
+            stats = {'written': 0, 'unchanged': 0, 'removed': 0, 'deputies_rendered': 0}
+
+            def write(path, content):
+                digest = hashlib.sha256(content).hexdigest()
+                files[path] = digest
+                if previous_files.get(path) == digest and os.path.exists(os.path.join(self.directory, path)):
+                    stats['unchanged'] += 1
+                    return
+                self._write_file(path, content)
+                stats['written'] += 1
+
+            model = self.report_generator.get_report_model(snapshot)
+            # Sem data de geração: o conteúdo depende só do snapshot e não muda a cada exportação
+            write('index.html', self.document_renderer.render_now('html', snapshot, timestamped=False))
+            for name, frame in (('emendas', model.emendas), ('deputados', model.deputies), ('contribuicoes', model.contributions)):
+                write(f"data/{name}.json", frame.to_json(orient='records', force_ascii=False, indent=1).encode('utf-8'))
+                parquet = self._to_parquet(frame)
+                if parquet is not None:
+                    write(f"data/{name}.parquet", parquet)
+            for name, chart in self._chart_specs(snapshot).items():
+                write(f"charts/{name}.json", self._json_bytes(chart))
+
+            for deputy in snapshot.list_deputies():
+                contributions = self.report_generator.get_deputy_contributions_by_category(deputy.id, snapshot)
+                stamp = (deputy,) + tuple(e for items in contributions.values() for e, _, _ in items)
+                json_path = f"data/deputados/{deputy.id}.json"
+                html_path = f"deputados/{deputy.id}.html"
+                previous_stamp = self._deputy_stamps.get(deputy.id)
+                if (previous_stamp is not None and len(previous_stamp) == len(stamp) and all(a is b for a, b in zip(previous_stamp, stamp))
+                        and json_path in previous_files and html_path in previous_files):
+                    # Deputado e emendas financiadas inalterados: mantém os arquivos já exportados
+                    files[json_path] = previous_files[json_path]
+                    files[html_path] = previous_files[html_path]
+                    stats['unchanged'] += 2
+                    continue
+                write(json_path, self._json_bytes(self._deputy_record(deputy, model, contributions)))
+                text = "\n".join(self.report_generator.iter_section_lines(('deputy', deputy.id), snapshot)).replace("R\\$", "R$")
+                write(html_path, self._template_environment().from_string(DEPUTY_PAGE_TEMPLATE).render(name=deputy.name, text=text).encode('utf-8'))
+                self._deputy_stamps[deputy.id] = stamp
+                stats['deputies_rendered'] += 1
+
+            current_ids = {d.id for d in snapshot.list_deputies()}
+            for deputy_id in list(self._deputy_stamps):
+                if deputy_id not in current_ids:
+                    del self._deputy_stamps[deputy_id]
+            for path in previous_files:
+                if path not in files:
+                    self._remove_file(path)
+                    stats['removed'] += 1
+
+            self._manifest = {'version': snapshot.version, 'files': files}
+            # O manifesto é gravado por último: leitores só o veem depois de todos os arquivos
+            if self._manifest != manifest:
+                self._write_file(MANIFEST_FILE, self._json_bytes(self._manifest))
+            stats['seconds'] = time.perf_counter() - started
+            return stats
+
+    def _template_environment(self):
+        if self._environment is None:
+            from jinja2 import Environment
+
+            self._environment = Environment(autoescape=True)
+        return self._environment
+
+    # --- Conteúdo ---
+
+    @staticmethod
+    def _deputy_record(deputy, model, contributions_by_category):
+        row = model.deputy_row(deputy.id)
+        record = {
+            'id': deputy.id,
+            'name': deputy.name,
+            'party': party_from_name(deputy.name),
+            'total_verba_disponivel': row['total_verba_disponivel'],
+            'allocated_total': row['allocated_total'],
+            'remaining_verba': row['remaining_verba'],
+            'actual_spent_amount': row['actual_spent_amount'],
+            'final_remaining': row['final_remaining'],
+            'contributions': [],
+        }
+        for category in sorted(contributions_by_category):
+            for emenda, contrib_detail, status in contributions_by_category[category]:
+                record['contributions'].append({
+                    'emenda_id': emenda.id,
+                    'description': emenda.description,
+                    'categoria': category,
+                    'status': status,
+                    'total': contrib_detail['total'],
+                    'from_allocated_intention': contrib_detail['from_allocated_intention'],
+                    'from_free_verba': contrib_detail['from_free_verba'],
+                })
+        return record
+
+    def _chart_specs(self, snapshot):
+        return {
+            'resumo': self.report_generator.get_summary_for_chart(snapshot),
+            'categorias': self.report_generator.get_category_chart(snapshot),
+            'emendas': self.report_generator.get_emenda_treemap(snapshot),
+            'indicadores': self.report_generator.get_distribution_analytics(snapshot).indicators,
+        }
+
+    @staticmethod
+    def _to_parquet(frame):
+        try:
+            return frame.to_parquet(index=False)
+        except ImportError:
+            # pyarrow/fastparquet ausente: o pacote fica apenas com JSON
+            return None
+
+    @staticmethod
+    def _json_bytes(data):
+        return json.dumps(data, indent=2, ensure_ascii=False, default=float).encode('utf-8')
+
+    # --- Arquivos ---
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                try:
+                    return json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+        return {}
+
+    def _write_file(self, path, content):
+        full_path = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Nome temporário único: outro processo pode estar gravando o mesmo arquivo
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), prefix=os.path.basename(full_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644) # mkstemp cria o arquivo só para o dono; o pacote é servido a terceiros
+            os.replace(tmp_path, full_path) # Quem lê o arquivo vê a versão antiga ou a nova, nunca uma parcial
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove_file(self, path):
+        full_path = os.path.join(self.directory, path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+
+
+def main(argv=None):
+    from DataManager import DataManager
+    from EventBus import EventBus
+    from DeputyManager import DeputyManager
+    from EmendaManager import EmendaManager
+    from AllocationSnapshot import SnapshotStore
+    from ReportGenerator import ReportGenerator
+
+    parser = argparse.ArgumentParser(description="Exporta o pacote público estático (HTML, JSON/Parquet e gráficos) do estado de alocação atual.")
+    parser.add_argument('directory', nargs='?', default=None, help="Pasta de destino (padrão: 'public' dentro da pasta de dados)")
+    args = parser.parse_args(argv)
+
+    data_manager = DataManager()
+    directory = args.directory if args.directory is not None else os.path.join(data_manager.data_dir, 'public')
+    event_bus = EventBus()
+    deputy_manager = DeputyManager(data_manager, event_bus)
+    emenda_manager = EmendaManager(data_manager, event_bus)
+    snapshot_store = SnapshotStore(deputy_manager, emenda_manager, event_bus)
+    report_generator = ReportGenerator(deputy_manager, emenda_manager, snapshot_store)
+
+    stats = PublicBundleExporter(report_generator, directory).export()
+    print(f"Pacote público exportado em '{directory}': {stats['written']} arquivo(s) gravado(s), "
+          f"{stats['unchanged']} inalterado(s), {stats['removed']} removido(s) em {stats['seconds']:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,224 +1,467 @@
 import math
+import os
+import threading
+import pandas as pd
 from Deputy import Deputy
 from Emenda import Emenda
 from DeputyManager import DeputyManager
 from EmendaManager import EmendaManager
+from AllocationSnapshot import SnapshotStore
+from ContributionIndex import ContributionIndex
+from LRUCache import LRUCache
+from AggregateCube import AggregateCube
+from AllocationDiff import AllocationDiff
+from DistributionAnalytics import DistributionAnalytics
+from ReportModel import ReportModel, STATUS_FULL, STATUS_PARTIAL, STATUS_NONE
+from Metrics import metrics
+
 # Removida a importação de DataManager aqui pois não é utilizada diretamente
 
+# Quantas versões de dados manter em cache (cada uma com todos os tipos: estado, relatório, gráficos...)
+MEMO_CACHE_SIZE = 4
+# Seções (deputados e emendas) renderizadas mantidas em cache
+SECTION_CACHE_SIZE = 4096
+# Linhas acumuladas por escrita ao exportar o relatório para arquivo
+REPORT_WRITE_CHUNK_LINES = 256
+# Itens (fatias, barras, retângulos) por gráfico; o restante é somado em um item "Outras"
+CHART_MAX_ITEMS = 12
+# Seções do sumário de emendas: chave -> (status, título, mensagem quando vazia)
+EMENDA_STATUS_SECTIONS = {
+    'emendas_full': (STATUS_FULL, "Emendas Totalmente Contempladas", "(Nenhuma emenda totalmente contemplada.)\n"),
+    'emendas_partial': (STATUS_PARTIAL, "Emendas Parcialmente Contempladas", "(Nenhuma emenda parcialmente contemplada.)\n"),
+    'emendas_none': (STATUS_NONE, "Emendas Não Contempladas", "(Nenhuma emenda não contemplada.)\n"),
+}
+
+def top_series(series, max_items=CHART_MAX_ITEMS):
+    """
+    Séries de um gráfico JSON ([{'name', 'data'}]) limitadas aos max_items maiores valores;
+    as demais são somadas em "Outras (n)". Mantém o gráfico legível e pequeno com muitos itens.
+    """
+    if len(series) <= max_items:
+        return series
+    ordered = sorted(series, key=lambda s: s['data'], reverse=True)
+    kept, rest = ordered[:max_items - 1], ordered[max_items - 1:]
+    return kept + [{"name": f"Outras ({len(rest)})", "data": sum(s['data'] for s in rest)}]
+
+
 class ReportGenerator:
-    def __init__(self, deputy_manager: DeputyManager, emenda_manager: EmendaManager):
+    def __init__(self, deputy_manager: DeputyManager, emenda_manager: EmendaManager, snapshot_store: SnapshotStore = None):
         self.deputy_manager = deputy_manager
         self.emenda_manager = emenda_manager
+        # Os relatórios leem snapshots confirmados, nunca os objetos que o otimizador está alterando
+        self.snapshot_store = snapshot_store if snapshot_store is not None else SnapshotStore(deputy_manager, emenda_manager)
+        self._contribution_index = None
+        self._index_lock = threading.Lock()
+        # Resultados memoizados por versão do snapshot ({versão: {tipo: resultado}}): rerodar a
+        # página de relatórios sem novas otimizações/edições não recalcula nada. O LRU descarta
+        # versões inteiras, para que ler um snapshot antigo (diff, documento em renderização)
+        # não expulse os resultados da versão atual tipo a tipo.
+        self._memo = LRUCache(MEMO_CACHE_SIZE)
+        # Texto já renderizado de cada deputado/emenda: {('deputy'|'emenda', id): (carimbo, linhas)}
+        self._section_cache = LRUCache(SECTION_CACHE_SIZE)
+
+    def _memoized(self, kind, snapshot, compute):
+        entries = self._memo.get(snapshot.version)
+        if entries is None:
+            entries = {}
+            self._memo.put(snapshot.version, entries)
+        result = entries.get(kind)
+        if result is None:
+            metrics.increment("report.cache.misses")
+            with metrics.timer(f"report.{kind[0] if isinstance(kind, tuple) else kind}.ms"):
+                result = compute(snapshot)
+            entries[kind] = result
+        else:
+            metrics.increment("report.cache.hits")
+        return result
+
+    def _cached_section(self, key, stamp, render):
+        """
+        Linhas da seção, renderizadas de novo apenas se o carimbo mudou. O carimbo são os
+        objetos do snapshot de que a seção depende: como o SnapshotStore reaproveita as
+        cópias inalteradas entre versões, a identidade do objeto é a versão da entidade.
+        """
+        cached = self._section_cache.get(key)
+        if cached is not None and len(cached[0]) == len(stamp) and all(a is b for a, b in zip(cached[0], stamp)):
+            return cached[1]
+        lines = tuple(render())
+        metrics.increment("report.sections.rendered")
+        self._section_cache.put(key, (stamp, lines))
+        return lines
+
+    @staticmethod
+    def _classify_emenda(emenda):
+        """Retorna (status, funded_amount, missing_amount) de uma emenda."""
+        if math.isclose(emenda.current_funded_amount, emenda.valor_necessario) or emenda.current_funded_amount > emenda.valor_necessario:
+            return 'TOTALMENTE CONTEMPLADA', emenda.valor_necessario, 0.0
+        elif emenda.current_funded_amount > 0:
+            return 'PARCIALMENTE CONTEMPLADA', emenda.current_funded_amount, emenda.valor_necessario - emenda.current_funded_amount
+        return 'NÃO CONTEMPLADA', 0.0, emenda.valor_necessario
+
+    def _contributions_for(self, deputy_id, snapshot):
+        """Lista (emenda, contrib_detail) do deputado no snapshot, consultando o índice sob o lock."""
+        # Renderizações em segundo plano (DocumentRenderer) leem o índice enquanto a sessão pode avançá-lo
+        with self._index_lock:
+            return self._get_contribution_index(snapshot).contributions_for(deputy_id)
+
+    def _get_contribution_index(self, snapshot):
+        """
+        Índice deputado → contribuições do snapshot. O índice mantido é atualizado de forma
+        incremental a cada novo snapshot; snapshots antigos (fixados por leitores) ganham
+        um índice temporário. Use via _contributions_for, que serializa o acesso.
+        """
+        index = self._contribution_index
+        if index is not None and index.version <= snapshot.version:
+            changes = self.snapshot_store.changed_since(index.version) if snapshot is self.snapshot_store.current() else None
+            if index.advance(snapshot, changes[1] if changes is not None else None):
+                return index
+        index = ContributionIndex(snapshot)
+        if self._contribution_index is None or snapshot.version >= self._contribution_index.version:
+            self._contribution_index = index
+        return index
 
-    def _get_current_allocation_state(self):
+    def get_deputy_contributions_by_category(self, deputy_id, snapshot=None):
         """
-        Coleta o estado atual de alocação das emendas e deputados (após otimização)
-        lendo os atributos current_funded_amount e current_contributions das emendas.
+        Contribuições de um deputado agrupadas por categoria:
+        {categoria: [(emenda, contrib_detail, status), ...]}. Custo proporcional às
+        contribuições do deputado, não ao número total de emendas.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        contributions_by_category = {}
+        for emenda, contrib_detail in self._contributions_for(deputy_id, snapshot):
+            status = self._classify_emenda(emenda)[0]
+            contributions_by_category.setdefault(emenda.categoria, []).append((emenda, contrib_detail, status))
+        return contributions_by_category
+
+    def _get_current_allocation_state(self, snapshot=None):
+        """
+        Coleta o estado de alocação das emendas e deputados (após otimização)
+        lendo os atributos current_funded_amount e current_contributions das emendas
+        de um snapshot confirmado (o atual, se nenhum for informado).
+        O resultado é memoizado pela versão do snapshot e deve ser tratado como somente leitura.
         Retorna: (emenda_report_status, total_verba_efetivamente_usada_em_emendas_no_report,
                     total_deputy_budget_available, total_deputy_budget_intended_allocation)
         """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('state', snapshot, self._compute_allocation_state)
+
+    def _compute_allocation_state(self, snapshot):
+        model = self.get_report_model(snapshot)
         emenda_report_status = {}
-        total_verba_efetivamente_usada_em_emendas_no_report = 0.0
-        total_deputy_budget_available = 0.0
-        total_deputy_budget_intended_allocation = 0.0
-
-        for emenda in self.emenda_manager.list_emendas():
-            total_verba_efetivamente_usada_em_emendas_no_report += emenda.current_funded_amount
-            
-            if math.isclose(emenda.current_funded_amount, emenda.valor_necessario) or emenda.current_funded_amount > emenda.valor_necessario:
-                status = 'TOTALMENTE CONTEMPLADA'
-                funded_amount = emenda.valor_necessario 
-                missing_amount = 0.0
-            elif emenda.current_funded_amount > 0:
-                status = 'PARCIALMENTE CONTEMPLADA'
-                funded_amount = emenda.current_funded_amount
-                missing_amount = emenda.valor_necessario - emenda.current_funded_amount
-            else:
-                status = 'NÃO CONTEMPLADA'
-                funded_amount = 0.0
-                missing_amount = emenda.valor_necessario
-
-            emenda_report_status[emenda.id] = {
+        for row in model.emendas.itertuples(index=False):
+            emenda = snapshot.get_emenda_by_id(row.id)
+            emenda_report_status[row.id] = {
                 'emenda': emenda,
-                'funded_amount': funded_amount,
-                'status': status,
-                'contributors': emenda.current_contributions.copy(), 
-                'missing_amount': missing_amount
+                'funded_amount': row.funded_amount,
+                'status': row.status,
+                'contributors': emenda.current_contributions.copy(),
+                'missing_amount': row.missing_amount
             }
-        
-        for deputy in self.deputy_manager.list_deputies():
-            total_deputy_budget_available += deputy.total_verba_disponivel
-            total_deputy_budget_intended_allocation += deputy.get_allocated_total()
+        totals = model.totals
+        return emenda_report_status, totals['funded_total'], totals['budget_available'], totals['intended_allocation']
+
+    def get_report_model(self, snapshot=None):
+        """Modelo tabular (ReportModel) do snapshot, do qual derivam todos os relatórios."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('model', snapshot, ReportModel.from_snapshot)
+
+    def get_distribution_analytics(self, snapshot=None):
+        """Indicadores de distribuição (DistributionAnalytics) do snapshot."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('analytics', snapshot, lambda snap: DistributionAnalytics(self.get_report_model(snap)))
+
+    def diff_snapshots(self, before, after=None):
+        """Diferença (AllocationDiff) entre dois estados de alocação; after padrão = snapshot atual."""
+        after = after if after is not None else self.snapshot_store.current()
+        return AllocationDiff(self.get_report_model(before), self.get_report_model(after), before.version, after.version)
+
+    def get_aggregate_cube(self, snapshot=None):
+        """Cubo de agregados (AggregateCube) do snapshot para o painel de análise."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('cube', snapshot, lambda snap: AggregateCube(self.get_report_model(snap)))
+
+    def get_deputy_listing(self, snapshot=None):
+        """
+        Tabela de listagem dos deputados: as colunas do ReportModel mais a marcação de
+        realocação e a inclinação configurada. Montada uma vez por versão do snapshot.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('deputy_listing', snapshot, self._build_deputy_listing)
+
+    def _build_deputy_listing(self, snapshot):
+        listing = self.get_report_model(snapshot).deputies.copy()
+        deputies = [snapshot.get_deputy_by_id(deputy_id) for deputy_id in listing['id']]
+        listing['needs_reallocation'] = [d.needs_reallocation for d in deputies]
+        listing['inclination_total'] = [sum(d.inclinacao_por_categoria.values()) for d in deputies]
+        return listing
+
+    @metrics.timed("report.generate_report.ms")
+    def generate_report(self, snapshot=None):
+        """Relatório completo em uma única string (para exportações pequenas; a interface usa as seções)."""
+        # Fixa um único snapshot para todo o relatório: otimizações concorrentes não o afetam
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('report', snapshot, lambda snap: "\n".join(self.iter_report_lines(snap)))
+
+    # --- Geração em fluxo (seção a seção, linha a linha) ---
+
+    def list_report_sections(self, snapshot=None):
+        """
+        Seções do relatório na ordem de exibição, como (chave, título).
+        Barato: não gera nenhuma linha, apenas descreve o que pode ser gerado sob demanda.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        sections = [('header', "Cabeçalho")]
+        for deputy in snapshot.list_deputies():
+            sections.append((('deputy', deputy.id), f"Deputado: {deputy.name} (ID: {deputy.id})"))
+        sections.append(('emendas_full', "Emendas Totalmente Contempladas"))
+        sections.append(('emendas_partial', "Emendas Parcialmente Contempladas"))
+        sections.append(('emendas_none', "Emendas Não Contempladas"))
+        sections.append(('summary', "Resumo Geral do Uso das Verbas"))
+        return sections
 
-        return emenda_report_status, total_verba_efetivamente_usada_em_emendas_no_report, total_deputy_budget_available, total_deputy_budget_intended_allocation
+    def iter_section_lines(self, section_key, snapshot=None):
+        """Gera as linhas de uma única seção do relatório (ver list_report_sections)."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        if section_key == 'header':
+            return self._header_lines()
+        if isinstance(section_key, tuple) and section_key[0] == 'deputy':
+            deputy = snapshot.get_deputy_by_id(section_key[1])
+            if deputy is None:
+                return iter(())
+            # Índice invertido: evita varrer todas as emendas para cada deputado
+            contributions = self._contributions_for(deputy.id, snapshot)
+            stamp = (deputy,) + tuple(emenda for emenda, _ in contributions)
+            return iter(self._cached_section(section_key, stamp, lambda: self._deputy_lines(deputy, snapshot)))
+        if section_key in EMENDA_STATUS_SECTIONS:
+            return self._emenda_status_lines(section_key, snapshot)
+        if section_key == 'summary':
+            return self._summary_lines(snapshot)
+        raise ValueError(f"Seção de relatório desconhecida: {section_key}")
 
+    def iter_report_lines(self, snapshot=None):
+        """Gera o relatório completo linha a linha, sem montá-lo inteiro em memória."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        for section_key, _ in self.list_report_sections(snapshot):
+            yield from self.iter_section_lines(section_key, snapshot)
 
-    def generate_report(self):
-        report_lines = []
-        report_lines.append("="*60)
-        report_lines.append("RELATÓRIO DE DISTRIBUIÇÃO DE VERBAS E STATUS DAS EMENDAS")
-        report_lines.append("="*60)
+    def write_report(self, destination, snapshot=None, chunk_lines=REPORT_WRITE_CHUNK_LINES):
+        """
+        Grava o relatório em um caminho ou arquivo texto aberto, em blocos de chunk_lines linhas.
+        Um caminho é gravado em um arquivo temporário e renomeado ao final, para nunca
+        deixar um relatório pela metade. Retorna o número de linhas gravadas.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        if hasattr(destination, 'write'):
+            return self._write_report_chunks(destination, snapshot, chunk_lines)
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = destination + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                written = self._write_report_chunks(f, snapshot, chunk_lines)
+            os.replace(tmp_path, destination)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
 
-        emenda_status, total_verba_efetivamente_usada_em_emendas_no_report, \
-            total_deputy_budget_available, total_deputy_budget_intended_allocation = \
-            self._get_current_allocation_state() 
-        
-        deputy_by_id = {d.id: d for d in self.deputy_manager.list_deputies()}
+    def _write_report_chunks(self, f, snapshot, chunk_lines):
+        written = 0
+        chunk = []
+        for line in self.iter_report_lines(snapshot):
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                f.write("\n".join(chunk) + "\n")
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            f.write("\n".join(chunk) + "\n")
+            written += len(chunk)
+        return written
+
+    def _header_lines(self):
+        yield "="*60
+        yield "RELATÓRIO DE DISTRIBUIÇÃO DE VERBAS E STATUS DAS EMENDAS"
+        yield "="*60
 
         # --- SEÇÃO DE RELATÓRIO POR DEPUTADO ---
-        report_lines.append("\n" + "═"*60)
-        report_lines.append("RELATÓRIO DE DISTRIBUIÇÃO DE VERBAS POR DEPUTADO")
-        report_lines.append("═"*60)
-        
-        for deputy in self.deputy_manager.list_deputies():
-            actual_spent_by_deputy = deputy.actual_spent_amount 
-            
-            deputy_contributions_by_category = {}
-            for emenda_id, status_info in emenda_status.items():
-                # Converte dep_id para string para corresponder às chaves do dicionário current_contributions
-                if str(deputy.id) in status_info['contributors']:
-                    emenda = status_info['emenda']
-                    contrib_detail = status_info['contributors'][str(deputy.id)]
-                    deputy_contributions_by_category.setdefault(emenda.categoria, []).append((emenda, contrib_detail, status_info['status']))
-            
-            report_lines.append(f"\n" + "═"*60) 
-            report_lines.append(f"  Deputado: {deputy.name} (ID: {deputy.id})")
-            report_lines.append(f"  Verba Total Disponível:           R\${deputy.total_verba_disponivel:,.2f}")
-            report_lines.append(f"  Verba Alocada por Categorias (Intenção): R\${deputy.get_allocated_total():,.2f}")
-            report_lines.append(f"  Verba Remanescente (Para Alocação Livre): R\${deputy.get_remaining_verba():,.2f}")
-            report_lines.append(f"  ---------------------------------------------------------------------")
-            report_lines.append(f"  Verba Efetivamente Usada em Emendas:  R\${actual_spent_by_deputy:,.2f}")
-            report_lines.append(f"  Verba Remanescente Final do Deputado: R\${deputy.total_verba_disponivel - actual_spent_by_deputy:,.2f}")
-            report_lines.append(f"\n  Detalhes das Contribuições para Emendas:")
-            
-            if deputy_contributions_by_category:
-                for category in sorted(deputy_contributions_by_category.keys()):
-                    report_lines.append(f"    ▶ Categoria: {category}\n")
-                    for emenda, contrib_detail, emenda_final_status in deputy_contributions_by_category[category]:
-                        total_contrib = contrib_detail['total']
-                        from_alloc = contrib_detail['from_allocated_intention']
-                        from_free = contrib_detail['from_free_verba']
-                        
-                        percent_of_emenda = (total_contrib / emenda.valor_necessario) * 100 if emenda.valor_necessario > 0 else 0
-                        report_lines.append(f"      - Emenda '{emenda.description}' (ID: {emenda.id})")
-                        report_lines.append(f"        Valor Necessário da Emenda: R\${emenda.valor_necessario:,.2f}")
-                        report_lines.append(f"        Contribuição Total deste Deputado: R\${total_contrib:,.2f} ({percent_of_emenda:.2f}% da emenda)")
-                        if from_alloc > 0:
-                            report_lines.append(f"          (Da Alocação por Categoria: R\${from_alloc:,.2f})")
-                        if from_free > 0:
-                            report_lines.append(f"          (Da Verba Livre: R\${from_free:,.2f})")
-                        report_lines.append(f"        Status Final da Emenda: {emenda_final_status}\n")
-            else:
-                report_lines.append("    Nenhuma contribuição direta para emendas.\n")
-            report_lines.append("═"*60) 
-
-        # --- SEÇÃO DE SUMÁRIO FINAL DAS EMENDAS (com detalhes de contribuição) ---
-        report_lines.append("\n\n" + "═"*60)
-        report_lines.append("SUMÁRIO FINAL DO STATUS DAS EMENDAS")
-        report_lines.append("═"*60)
-        
-        non_contemplated = []
-        partially_contemplated = []
-        fully_contemplated = []
-
-        for emenda_id, status_info in emenda_status.items():
-            emenda = status_info['emenda']
-            if status_info['status'] == 'NÃO CONTEMPLADA':
-                non_contemplated.append(emenda)
-            elif status_info['status'] == 'PARCIALMENTE CONTEMPLADA':
-                partially_contemplated.append(emenda)
-            else:
-                fully_contemplated.append(emenda)
-        
-        report_lines.append("\n--- Emendas Totalmente Contempladas ---\n")
-        if fully_contemplated:
-            for emenda in fully_contemplated:
-                status_info = emenda_status[emenda.id]
-                report_lines.append(f"  ✔ Emenda '{emenda.description}' (Cat: {emenda.categoria}, Valor Necessário: R\${emenda.valor_necessario:,.2f})")
-                report_lines.append(f"    Contemplado: R\${status_info['funded_amount']:,.2f}")
-                for dep_id_str, contrib_detail in status_info['contributors'].items():
-                    dep_id = int(dep_id_str) 
-                    deputy_obj = deputy_by_id.get(dep_id)
-                    deputy_name = deputy_obj.name if deputy_obj else f"Deputado ID {dep_id} (Não encontrado)" 
-                    
-                    total_contrib = contrib_detail['total']
-                    from_alloc = contrib_detail['from_allocated_intention']
-                    from_free = contrib_detail['from_free_verba']
-                    
-                    percent = (total_contrib / emenda.valor_necessario) * 100 if emenda.valor_necessario > 0 else 0
-                    
-                    contrib_str = f"    - {deputy_name}: R\${total_contrib:,.2f} ({percent:.2f}% da emenda)"
-                    if from_alloc > 0:
-                        contrib_str += f" (Intenção: R\${from_alloc:,.2f})"
-                    if from_free > 0:
-                        contrib_str += f" (Livre: R\${from_free:,.2f})"
-                    report_lines.append(contrib_str)
-                report_lines.append("\n") 
-        else:
-            report_lines.append("(Nenhuma emenda totalmente contemplada.)\n")
-
-        report_lines.append("\n--- Emendas Parcialmente Contempladas ---\n")
-        if partially_contemplated:
-            for emenda in partially_contemplated:
-                status_info = emenda_status[emenda.id]
-                report_lines.append(f"  ◐ Emenda '{emenda.description}' (Cat: {emenda.categoria}, Valor Necessário: R\${emenda.valor_necessario:,.2f})")
-                report_lines.append(f"    Contemplado: R\${status_info['funded_amount']:,.2f}, Faltam: R\${status_info['missing_amount']:,.2f}")
-                for dep_id_str, contrib_detail in status_info['contributors'].items():
-                    dep_id = int(dep_id_str) 
-                    deputy_obj = deputy_by_id.get(dep_id)
-                    deputy_name = deputy_obj.name if deputy_obj else f"Deputado ID {dep_id} (Não encontrado)" 
+        yield "\n" + "═"*60
+        yield "RELATÓRIO DE DISTRIBUIÇÃO DE VERBAS POR DEPUTADO"
+        yield "═"*60
+
+    def _deputy_lines(self, deputy, snapshot):
+        row = self.get_report_model(snapshot).deputy_row(deputy.id)
+
+        # Índice invertido: evita varrer todas as emendas para cada deputado
+        deputy_contributions_by_category = self.get_deputy_contributions_by_category(deputy.id, snapshot)
+
+        yield f"\n" + "═"*60
+        yield f"  Deputado: {row['name']} (ID: {deputy.id})"
+        yield f"  Verba Total Disponível:           R\${row['total_verba_disponivel']:,.2f}"
+        yield f"  Verba Alocada por Categorias (Intenção): R\${row['allocated_total']:,.2f}"
+        yield f"  Verba Remanescente (Para Alocação Livre): R\${row['remaining_verba']:,.2f}"
+        yield f"  ---------------------------------------------------------------------"
+        yield f"  Verba Efetivamente Usada em Emendas:  R\${row['actual_spent_amount']:,.2f}"
+        yield f"  Verba Remanescente Final do Deputado: R\${row['final_remaining']:,.2f}"
+        yield f"\n  Detalhes das Contribuições para Emendas:"
 
+        if deputy_contributions_by_category:
+            for category in sorted(deputy_contributions_by_category.keys()):
+                yield f"    ▶ Categoria: {category}\n"
+                for emenda, contrib_detail, emenda_final_status in deputy_contributions_by_category[category]:
                     total_contrib = contrib_detail['total']
                     from_alloc = contrib_detail['from_allocated_intention']
                     from_free = contrib_detail['from_free_verba']
-                    
-                    percent = (total_contrib / emenda.valor_necessario) * 100 if emenda.valor_necessario > 0 else 0
-                    
-                    contrib_str = f"    - {deputy_name}: R\${total_contrib:,.2f} ({percent:.2f}% da emenda)"
+
+                    percent_of_emenda = (total_contrib / emenda.valor_necessario) * 100 if emenda.valor_necessario > 0 else 0
+                    yield f"      - Emenda '{emenda.description}' (ID: {emenda.id})"
+                    yield f"        Valor Necessário da Emenda: R\${emenda.valor_necessario:,.2f}"
+                    yield f"        Contribuição Total deste Deputado: R\${total_contrib:,.2f} ({percent_of_emenda:.2f}% da emenda)"
                     if from_alloc > 0:
-                        contrib_str += f" (Intenção: R\${from_alloc:,.2f})"
+                        yield f"          (Da Alocação por Categoria: R\${from_alloc:,.2f})"
                     if from_free > 0:
-                        contrib_str += f" (Livre: R\${from_free:,.2f})"
-                    report_lines.append(contrib_str)
-                report_lines.append("\n") 
+                        yield f"          (Da Verba Livre: R\${from_free:,.2f})"
+                    yield f"        Status Final da Emenda: {emenda_final_status}\n"
         else:
-            report_lines.append("(Nenhuma emenda parcialmente contemplada.)\n")
+            yield "    Nenhuma contribuição direta para emendas.\n"
+        yield "═"*60
+
+    def _emenda_status_lines(self, section_key, snapshot):
+        status, heading, empty_message = EMENDA_STATUS_SECTIONS[section_key]
+        model = self.get_report_model(snapshot)
+
+        if section_key == 'emendas_full':
+            # --- SEÇÃO DE SUMÁRIO FINAL DAS EMENDAS (com detalhes de contribuição) ---
+            yield "\n\n" + "═"*60
+            yield "SUMÁRIO FINAL DO STATUS DAS EMENDAS"
+            yield "═"*60
+
+        yield f"\n--- {heading} ---\n"
+        emendas = model.emendas_with_status(status)
+        if emendas.empty:
+            yield empty_message
+            return
+        for row in emendas.itertuples(index=False):
+            emenda = snapshot.get_emenda_by_id(row.id)
+            stamp = (emenda,) + tuple(snapshot.get_deputy_by_id(int(dep_id)) for dep_id in emenda.current_contributions)
+            yield from self._cached_section(('emenda', row.id), stamp, lambda: self._emenda_lines(row, status, model))
 
-        report_lines.append("\n--- Emendas Não Contempladas ---\n")
-        if non_contemplated:
-            for emenda in non_contemplated:
-                report_lines.append(f"  ✖ Emenda '{emenda.description}' (Cat: {emenda.categoria}, Valor Necessário: R\${emenda.valor_necessario:,.2f})")
-                report_lines.append("\n") 
+    def _emenda_lines(self, emenda, status, model):
+        """Linhas de uma emenda no sumário de status (emenda = linha de ReportModel.emendas)."""
+        if status == STATUS_NONE:
+            yield f"  ✖ Emenda '{emenda.description}' (Cat: {emenda.categoria}, Valor Necessário: R\${emenda.valor_necessario:,.2f})"
+            yield "\n"
+            return
+        marker = '✔' if status == STATUS_FULL else '◐'
+        yield f"  {marker} Emenda '{emenda.description}' (Cat: {emenda.categoria}, Valor Necessário: R\${emenda.valor_necessario:,.2f})"
+        if status == STATUS_FULL:
+            yield f"    Contemplado: R\${emenda.funded_amount:,.2f}"
         else:
-            report_lines.append("(Nenhuma emenda não contemplada.)\n")
-        
+            yield f"    Contemplado: R\${emenda.funded_amount:,.2f}, Faltam: R\${emenda.missing_amount:,.2f}"
+        for contrib in model.contributions_of_emenda(emenda.id).itertuples(index=False):
+            deputy_name = contrib.deputy_name if isinstance(contrib.deputy_name, str) else f"Deputado ID {contrib.deputy_id} (Não encontrado)"
+            percent = (contrib.total / emenda.valor_necessario) * 100 if emenda.valor_necessario > 0 else 0
+
+            contrib_str = f"    - {deputy_name}: R\${contrib.total:,.2f} ({percent:.2f}% da emenda)"
+            if contrib.from_allocated_intention > 0:
+                contrib_str += f" (Intenção: R\${contrib.from_allocated_intention:,.2f})"
+            if contrib.from_free_verba > 0:
+                contrib_str += f" (Livre: R\${contrib.from_free_verba:,.2f})"
+            yield contrib_str
+        yield "\n"
+
+    def _summary_lines(self, snapshot):
+        totals = self.get_report_model(snapshot).totals
+
         # --- SEÇÃO DE RESUMO GERAL DO USO DAS VERBAS DOS DEPUTADOS ---
-        report_lines.append("\n\n" + "═"*60)
-        report_lines.append("RESUMO GERAL DO USO DAS VERBAS DOS DEPUTADOS")
-        report_lines.append("═"*60)
-        
-        total_verba_efetivamente_usada_em_emendas_from_deputies = sum(d.actual_spent_amount for d in self.deputy_manager.list_deputies())
-        remaining_deputy_budget_after_actual_spending = total_deputy_budget_available - total_verba_efetivamente_usada_em_emendas_from_deputies
-        
-        report_lines.append(f"\nVerba Total Disponível dos Deputados (Soma): R\${total_deputy_budget_available:,.2f}")
-        report_lines.append(f"Verba Total Intenção de Alocação por Deputados (em categorias): R\${total_deputy_budget_intended_allocation:,.2f}")
-        report_lines.append(f"Verba Total Efetivamente Usada em Emendas: R\${total_verba_efetivamente_usada_em_emendas_from_deputies:,.2f}")
-        report_lines.append(f"Verba Total Remanescente (não utilizada em emendas): R\${remaining_deputy_budget_after_actual_spending:,.2f}")
-        
+        yield "\n\n" + "═"*60
+        yield "RESUMO GERAL DO USO DAS VERBAS DOS DEPUTADOS"
+        yield "═"*60
+
+        remaining_deputy_budget_after_actual_spending = totals['budget_available'] - totals['spent_total']
+
+        yield f"\nVerba Total Disponível dos Deputados (Soma): R\${totals['budget_available']:,.2f}"
+        yield f"Verba Total Intenção de Alocação por Deputados (em categorias): R\${totals['intended_allocation']:,.2f}"
+        yield f"Verba Total Efetivamente Usada em Emendas: R\${totals['spent_total']:,.2f}"
+        yield f"Verba Total Remanescente (não utilizada em emendas): R\${remaining_deputy_budget_after_actual_spending:,.2f}"
+
         percentage_used = 0
-        if total_deputy_budget_available > 0:
-            percentage_used = (total_verba_efetivamente_usada_em_emendas_from_deputies / total_deputy_budget_available) * 100
-        report_lines.append(f"Percentual da Verba Total Disponível Efetivamente Usada: {percentage_used:.2f}%\n")
+        if totals['budget_available'] > 0:
+            percentage_used = (totals['spent_total'] / totals['budget_available']) * 100
+        yield f"Percentual da Verba Total Disponível Efetivamente Usada: {percentage_used:.2f}%\n"
+
+        yield "\n\n" + "═"*80
+
+    def get_category_chart(self, snapshot=None):
+        """Valor contemplado e faltante por categoria, agregado no servidor (gráfico de barras empilhadas)."""
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('category_chart', snapshot, self._build_category_chart)
 
-        report_lines.append("\n\n" + "═"*80)
-        return "\n".join(report_lines) # Retorna uma única string com quebras de linha para st.text
+    def _build_category_chart(self, snapshot):
+        by_category = self.get_report_model(snapshot).emendas.groupby('categoria')[['funded_amount', 'missing_amount']].sum()
+        return {
+            "type": "bar",
+            "title": {"text": "Valor Contemplado e Faltante por Categoria"},
+            "categories": by_category.index.tolist(),
+            "series": [
+                {"name": "Contemplado", "data": by_category['funded_amount'].tolist()},
+                {"name": "Faltante", "data": by_category['missing_amount'].tolist()},
+            ],
+        }
+
+    def get_emenda_treemap(self, snapshot=None, max_per_category=CHART_MAX_ITEMS):
+        """
+        Treemap categoria → emenda do valor necessário. Em cada categoria aparecem só as
+        max_per_category maiores emendas; as demais são agregadas em um único retângulo,
+        de modo que o gráfico não cresce com o número de emendas.
+        """
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized(('emenda_treemap', max_per_category), snapshot,
+                              lambda snap: self._build_emenda_treemap(snap, max_per_category))
+
+    def _build_emenda_treemap(self, snapshot, max_per_category):
+        emendas = self.get_report_model(snapshot).emendas.sort_values(['categoria', 'valor_necessario'], ascending=[True, False], kind='stable')
+        rank = emendas.groupby('categoria').cumcount()
+        top = emendas[rank < max_per_category - 1]
+        rest = emendas[rank >= max_per_category - 1]
+        # Categorias com exatamente max_per_category emendas não precisam do agregado
+        rest_by_category = rest.groupby('categoria').agg(valor_necessario=('valor_necessario', 'sum'), n=('id', 'size'),
+                                                         funded_amount=('funded_amount', 'sum'))
+        single = rest_by_category['n'] == 1
+        top = pd.concat([top, rest[rest['categoria'].isin(rest_by_category.index[single])]])
+        rest_by_category = rest_by_category[~single]
+        by_category = emendas.groupby('categoria')[['valor_necessario', 'funded_amount']].sum()
+
+        ids = by_category.index.tolist()
+        labels = list(ids)
+        parents = [""] * len(ids)
+        values = by_category['valor_necessario'].tolist()
+        funded = by_category['funded_amount'].tolist()
+        ids += [f"{c}/{i}" for c, i in zip(top['categoria'], top['id'])]
+        labels += top['description'].tolist()
+        parents += top['categoria'].tolist()
+        values += top['valor_necessario'].tolist()
+        funded += top['funded_amount'].tolist()
+        ids += [f"{c}/outras" for c in rest_by_category.index]
+        labels += [f"Outras ({n})" for n in rest_by_category['n']]
+        parents += rest_by_category.index.tolist()
+        values += rest_by_category['valor_necessario'].tolist()
+        funded += rest_by_category['funded_amount'].tolist()
+        return {
+            "type": "treemap",
+            "title": {"text": "Valor Necessário das Emendas por Categoria"},
+            "ids": ids, "labels": labels, "parents": parents, "values": values, "funded": funded,
+        }
 
-    def get_summary_for_chart(self):
-        emenda_status, total_verba_efetivamente_usada_em_emendas_no_report, \
-            total_deputy_budget_available, total_deputy_budget_intended_allocation = \
-            self._get_current_allocation_state()
+    def get_summary_for_chart(self, snapshot=None):
+        snapshot = snapshot if snapshot is not None else self.snapshot_store.current()
+        return self._memoized('summary_chart', snapshot, self._build_summary_chart)
 
-        remaining_deputy_budget_after_actual_spending = total_deputy_budget_available - total_verba_efetivamente_usada_em_emendas_no_report
+    def _build_summary_chart(self, snapshot):
+        totals = self.get_report_model(snapshot).totals
+        total_verba_efetivamente_usada_em_emendas_no_report = totals['funded_total']
+        remaining_deputy_budget_after_actual_spending = totals['budget_available'] - total_verba_efetivamente_usada_em_emendas_no_report
 
         chart_data = {
           "type": "pie",
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+STATUS_FULL = 'TOTALMENTE CONTEMPLADA'
+STATUS_PARTIAL = 'PARCIALMENTE CONTEMPLADA'
+STATUS_NONE = 'NÃO CONTEMPLADA'
+
+EMENDA_COLUMNS = ['id', 'description', 'categoria', 'valor_necessario', 'current_funded_amount', 'funded_amount', 'missing_amount', 'status']
+DEPUTY_COLUMNS = ['id', 'name', 'total_verba_disponivel', 'allocated_total', 'remaining_verba', 'actual_spent_amount', 'final_remaining', 'contributed_total']
+CONTRIBUTION_COLUMNS = ['emenda_id', 'deputy_id', 'deputy_name', 'categoria', 'total', 'from_allocated_intention', 'from_free_verba']
+INTENTION_COLUMNS = ['deputy_id', 'categoria', 'amount']
+
+# Rótulos das colunas nas tabelas exibidas/exportadas
+COLUMN_LABELS = {
+    'id': "ID", 'name': "Deputado", 'description': "Emenda", 'categoria': "Categoria",
+    'valor_necessario': "Valor Necessário", 'current_funded_amount': "Valor Contemplado (bruto)",
+    'funded_amount': "Valor Contemplado", 'missing_amount': "Valor Faltante", 'status': "Status",
+    'total_verba_disponivel': "Verba Total", 'allocated_total': "Alocado (Intenção)",
+    'remaining_verba': "Verba Livre", 'actual_spent_amount': "Verba Usada", 'final_remaining': "Remanescente Final",
+    'contributed_total': "Total Contribuído", 'emenda_id': "ID Emenda", 'deputy_id': "ID Deputado",
+    'deputy_name': "Deputado", 'total': "Contribuição", 'from_allocated_intention': "Da Intenção",
+    'from_free_verba': "Da Verba Livre",
+}
+
+
+class ReportModel:
+    """
+    Modelo tabular (pandas) de um AllocationSnapshot, base única de todos os relatórios.
+    - emendas: uma linha por emenda, com status, valor contemplado e valor faltante
+    - deputies: uma linha por deputado, com verba, intenção de alocação e uso efetivo
+    - contributions: uma linha por contribuição (emenda × deputado)
+    - intentions: intenção de alocação de cada deputado por categoria (deputado × categoria)
+    - deputy_category: pivô deputado × categoria do total contribuído
+    - totals: somatórios gerais
+    Os agregados são calculados de forma vetorizada (groupby/pivot) uma única vez por snapshot;
+    texto, tabelas, gráficos e exportações apenas formatam estes DataFrames.
+    """
+    def __init__(self, emendas, deputies, contributions, intentions):
+        self.emendas = emendas
+        self.deputies = deputies
+        self.contributions = contributions
+        self.intentions = intentions
+        self.deputy_category = contributions.pivot_table(
+            index='deputy_id', columns='categoria', values='total', aggfunc='sum', fill_value=0.0
+        ) if not contributions.empty else pd.DataFrame(dtype=float)
+        self.totals = {
+            'budget_available': float(deputies['total_verba_disponivel'].sum()),
+            'intended_allocation': float(deputies['allocated_total'].sum()),
+            'funded_total': float(emendas['current_funded_amount'].sum()),
+            'spent_total': float(deputies['actual_spent_amount'].sum()),
+        }
+        self._rows_by_emenda = contributions.groupby('emenda_id', sort=False).indices if not contributions.empty else {}
+        self._rows_by_deputy = contributions.groupby('deputy_id', sort=False).indices if not contributions.empty else {}
+        self._row_by_deputy = {deputy_id: pos for pos, deputy_id in enumerate(deputies['id'])}
+        self._row_by_emenda = {emenda_id: pos for pos, emenda_id in enumerate(emendas['id'])}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        emenda_rows = []
+        contribution_rows = []
+        for emenda in snapshot.list_emendas():
+            emenda_rows.append((emenda.id, emenda.description, emenda.categoria, emenda.valor_necessario, emenda.current_funded_amount))
+            for dep_id, detail in emenda.current_contributions.items():
+                contribution_rows.append((emenda.id, int(dep_id), emenda.categoria, detail.get('total', 0.0),
+                                          detail.get('from_allocated_intention', 0.0), detail.get('from_free_verba', 0.0)))
+        deputy_rows = []
+        intention_rows = []
+        for d in snapshot.list_deputies():
+            deputy_rows.append((d.id, d.name, d.total_verba_disponivel, sum(d.allocated_by_category.values()), d.actual_spent_amount))
+            intention_rows.extend((d.id, category, amount) for category, amount in d.allocated_by_category.items())
+
+        emendas = pd.DataFrame(emenda_rows, columns=EMENDA_COLUMNS[:5])
+        emendas[['valor_necessario', 'current_funded_amount']] = emendas[['valor_necessario', 'current_funded_amount']].astype(float)
+        needed = emendas['valor_necessario'].to_numpy()
+        funded = emendas['current_funded_amount'].to_numpy()
+        # Mesmo critério de math.isclose (tolerância relativa 1e-9) usado antes nos relatórios
+        full = np.isclose(funded, needed, rtol=1e-9, atol=0.0) | (funded > needed)
+        partial = ~full & (funded > 0)
+        emendas['funded_amount'] = np.where(full, needed, np.where(partial, funded, 0.0))
+        emendas['missing_amount'] = np.where(full, 0.0, np.where(partial, needed - funded, needed))
+        emendas['status'] = np.where(full, STATUS_FULL, np.where(partial, STATUS_PARTIAL, STATUS_NONE))
+
+        deputies = pd.DataFrame(deputy_rows, columns=['id', 'name', 'total_verba_disponivel', 'allocated_total', 'actual_spent_amount'])
+        deputies[['total_verba_disponivel', 'allocated_total', 'actual_spent_amount']] = \
+            deputies[['total_verba_disponivel', 'allocated_total', 'actual_spent_amount']].astype(float)
+        deputies['remaining_verba'] = deputies['total_verba_disponivel'] - deputies['allocated_total']
+        deputies['final_remaining'] = deputies['total_verba_disponivel'] - deputies['actual_spent_amount']
+
+        contributions = pd.DataFrame(contribution_rows, columns=['emenda_id', 'deputy_id', 'categoria', 'total', 'from_allocated_intention', 'from_free_verba'])
+        contributions[['total', 'from_allocated_intention', 'from_free_verba']] = \
+            contributions[['total', 'from_allocated_intention', 'from_free_verba']].astype(float)
+        names = deputies.drop_duplicates('id').set_index('id')['name']
+        contributions['deputy_name'] = contributions['deputy_id'].map(names) # NaN para deputados inexistentes
+
+        contributed = contributions.groupby('deputy_id')['total'].sum()
+        deputies['contributed_total'] = deputies['id'].map(contributed).fillna(0.0)
+        intentions = pd.DataFrame(intention_rows, columns=INTENTION_COLUMNS)
+        intentions['amount'] = intentions['amount'].astype(float)
+        return cls(emendas, deputies[DEPUTY_COLUMNS], contributions[CONTRIBUTION_COLUMNS], intentions)
+
+    def display_tables(self):
+        """Tabelas prontas para exibição/exportação: {título: DataFrame com colunas rotuladas}."""
+        deputy_category = self.deputy_category.copy()
+        if not deputy_category.empty:
+            deputy_category.index = deputy_category.index.map(self._deputy_label)
+            deputy_category.index.name = "Deputado"
+            deputy_category.columns.name = None
+        return {
+            "Deputados": self.deputies.rename(columns=COLUMN_LABELS),
+            "Emendas": self.emendas.drop(columns=['current_funded_amount']).rename(columns=COLUMN_LABELS),
+            "Contribuições": self.contributions.rename(columns=COLUMN_LABELS),
+            "Deputado × Categoria": deputy_category,
+        }
+
+    def _deputy_label(self, deputy_id):
+        row = self.deputy_row(deputy_id)
+        return f"{row['name']} (ID: {deputy_id})" if row is not None else f"Deputado ID {deputy_id}"
+
+    def emendas_with_status(self, status):
+        return self.emendas[self.emendas['status'] == status]
+
+    def contributions_of_emenda(self, emenda_id):
+        """Contribuições de uma emenda, na ordem em que foram registradas."""
+        rows = self._rows_by_emenda.get(emenda_id)
+        if rows is None:
+            return self.contributions.iloc[0:0]
+        return self.contributions.iloc[rows]
+
+    def contributions_of_deputy(self, deputy_id):
+        """Contribuições de um deputado, na ordem das emendas."""
+        rows = self._rows_by_deputy.get(deputy_id)
+        if rows is None:
+            return self.contributions.iloc[0:0]
+        return self.contributions.iloc[rows]
+
+    def emenda_row(self, emenda_id):
+        pos = self._row_by_emenda.get(emenda_id)
+        return self.emendas.iloc[pos] if pos is not None else None
+
+    def deputy_row(self, deputy_id):
+        pos = self._row_by_deputy.get(deputy_id)
+        return self.deputies.iloc[pos] if pos is not None else None
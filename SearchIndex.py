@@ -0,0 +1,247 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+
+import EventBus as events
+
+KIND_EMENDA = 'emenda'
+KIND_DEPUTY = 'deputy'
+
+# Peso de cada campo na pontuação de um resultado
+FIELD_WEIGHTS = {
+    (KIND_EMENDA, 'description'): 3.0,
+    (KIND_EMENDA, 'categoria'): 2.0,
+    (KIND_DEPUTY, 'name'): 3.0,
+    (KIND_DEPUTY, 'profile'): 1.0,
+}
+# Peso de cada tipo de casamento entre o termo buscado e o termo indexado
+MATCH_EXACT = 1.0
+MATCH_PREFIX = 0.7
+MATCH_TRIGRAM = 0.4 # Multiplicado pela similaridade (0 a 1)
+
+MIN_PREFIX_LENGTH = 2 # Termos menores só casam exatamente (evita expandir "a" para o vocabulário inteiro)
+MAX_PREFIX_EXPANSION = 200 # Termos do vocabulário considerados por prefixo
+MIN_TRIGRAM_SIMILARITY = 0.4
+DEFAULT_LIMIT = 50
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Eventos que alteram textos indexados
+_DEPUTY_EVENTS = (events.DEPUTY_ADDED, events.DEPUTY_DELETED)
+_EMENDA_EVENTS = (events.EMENDA_ADDED, events.EMENDA_DELETED)
+_INDEXED_DEPUTY_FIELDS = {'name', 'profile'}
+
+
+def fold(text):
+    """Texto em minúsculas e sem acentos ('Saúde Pública' -> 'saude publica')."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(fold(text))
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchResult:
+    def __init__(self, kind, item_id, score, title, detail):
+        self.kind = kind
+        self.id = item_id
+        self.score = score
+        self.title = title
+        self.detail = detail
+
+    def __repr__(self):
+        return f"SearchResult({self.kind!r}, {self.id}, score={self.score:.2f}, title={self.title!r})"
+
+
+class SearchIndex:
+    """
+    Índice invertido de busca textual sobre emendas (descrição, categoria) e deputados
+    (nome, perfil), com acentos removidos e sem diferença entre maiúsculas e minúsculas.
+    - termo exato e prefixo: vocabulário ordenado + bisect
+    - aproximado (erros de digitação): índice de trigramas do vocabulário, usado quando o
+      termo não tem casamento exato nem por prefixo
+    Construído na primeira busca (não atrasa o início da sessão) e depois mantido de forma
+    incremental pelos eventos dos managers: uma edição reindexa apenas os deputados/emendas afetados.
+    """
+    def __init__(self, deputy_manager, emenda_manager, event_bus=None):
+        self.deputy_manager = deputy_manager
+        self.emenda_manager = emenda_manager
+        self.event_bus = event_bus if event_bus is not None else deputy_manager.event_bus
+        self._lock = threading.RLock()
+        self._postings = {} # {termo: {(tipo, id): peso do melhor campo}}
+        self._vocabulary = [] # Termos ordenados, para busca por prefixo
+        self._trigrams = {} # {trigrama: {termo, ...}}
+        self._documents = {} # {(tipo, id): (título, detalhe, termos)}
+        self._built = False
+        self.event_bus.subscribe(events.ALL_EVENTS, self._on_event)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_built()
+            return len(self._documents)
+
+    def rebuild(self):
+        with self._lock:
+            self._postings.clear()
+            self._vocabulary = []
+            self._trigrams.clear()
+            self._documents.clear()
+            for emenda in self.emenda_manager.list_emendas():
+                self._index_emenda(emenda)
+            for deputy in self.deputy_manager.list_deputies():
+                self._index_deputy(deputy)
+            self._built = True
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    # --- Manutenção incremental ---
+
+    def _on_event(self, event):
+        if not self._built:
+            return # A construção, quando ocorrer, já lê o estado atual
+        if event.type in _DEPUTY_EVENTS:
+            self.refresh(deputy_ids=event.deputy_ids)
+        elif event.type == events.DEPUTY_UPDATED:
+            # Mudança só de verba não altera o índice
+            if _INDEXED_DEPUTY_FIELDS.intersection(event.details.get('changed_fields', _INDEXED_DEPUTY_FIELDS)):
+                self.refresh(deputy_ids=event.deputy_ids)
+        elif event.type in _EMENDA_EVENTS:
+            self.refresh(emenda_ids=event.emenda_ids)
+        elif event.type == events.STATE_RESTORED:
+            self.refresh(deputy_ids=event.deputy_ids, emenda_ids=event.emenda_ids)
+
+    def refresh(self, deputy_ids=(), emenda_ids=()):
+        """Reindexa os deputados/emendas informados a partir dos managers (removendo os que não existem mais)."""
+        with self._lock:
+            for deputy_id in deputy_ids:
+                self._remove((KIND_DEPUTY, deputy_id))
+                deputy = self.deputy_manager.get_deputy_by_id(deputy_id)
+                if deputy is not None:
+                    self._index_deputy(deputy)
+            for emenda_id in emenda_ids:
+                self._remove((KIND_EMENDA, emenda_id))
+                emenda = self.emenda_manager.get_emenda_by_id(emenda_id)
+                if emenda is not None:
+                    self._index_emenda(emenda)
+
+    def _index_emenda(self, emenda):
+        self._add((KIND_EMENDA, emenda.id), emenda.description, emenda.categoria,
+                  {'description': emenda.description, 'categoria': emenda.categoria})
+
+    def _index_deputy(self, deputy):
+        # O perfil é lido do TextStore só para extrair os termos; o texto não fica em memória
+        self._add((KIND_DEPUTY, deputy.id), deputy.name, None, {'name': deputy.name, 'profile': deputy.profile})
+
+    def _add(self, key, title, detail, fields):
+        weights = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[(key[0], field)]
+            for token in tokenize(text):
+                if weights.get(token, 0.0) < weight:
+                    weights[token] = weight
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+                for trigram in trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+            postings[key] = weight
+        self._documents[key] = (title, detail, tuple(weights))
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        for token in document[2]:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+                for trigram in trigrams(token):
+                    tokens = self._trigrams.get(trigram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._trigrams[trigram]
+
+    # --- Consulta ---
+
+    def search(self, query, kinds=None, limit=DEFAULT_LIMIT):
+        """
+        Resultados (SearchResult) que casam com todos os termos da consulta, do mais para o
+        menos relevante. kinds restringe a KIND_EMENDA e/ou KIND_DEPUTY; limit=None retorna todos.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_built()
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = self._match_term(term, kinds)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # Todos os termos precisam casar: mantém só os documentos presentes nos dois
+                    scores = {key: score + term_scores[key] for key, score in scores.items() if key in term_scores}
+                if not scores:
+                    return []
+            if limit is None:
+                best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            else:
+                best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [SearchResult(key[0], key[1], score, *self._documents[key][:2]) for key, score in best]
+
+    def _match_term(self, term, kinds):
+        """{(tipo, id): pontuação} dos documentos que casam com um termo da consulta."""
+        matches = {} # {termo do vocabulário: peso do casamento}
+        if term in self._postings:
+            matches[term] = MATCH_EXACT
+        if len(term) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_left(self._vocabulary, term)
+            for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+                if not token.startswith(term):
+                    break
+                matches.setdefault(token, MATCH_PREFIX)
+        if not matches and len(term) >= 3:
+            matches = self._similar_tokens(term)
+
+        scores = {}
+        for token, match_weight in matches.items():
+            for key, field_weight in self._postings[token].items():
+                if kinds is not None and key[0] not in kinds:
+                    continue
+                score = match_weight * field_weight
+                if scores.get(key, 0.0) < score:
+                    scores[key] = score
+        return scores
+
+    def _similar_tokens(self, term):
+        """Termos do vocabulário com similaridade de trigramas (Jaccard) suficiente com o termo."""
+        term_trigrams = trigrams(term)
+        shared = {}
+        for trigram in term_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        similar = {}
+        for token, count in shared.items():
+            similarity = count / (len(term_trigrams) + len(trigrams(token)) - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                similar[token] = MATCH_TRIGRAM * similarity
+        return similar
@@ -0,0 +1,294 @@
+import copy
+import time
+
+import EventBus as events
+
+CHUNK_SIZE = 64 # Registros por bloco compartilhado entre versões
+
+# Descrições das ações usadas como rótulo das versões (exibidas em desfazer/refazer)
+EVENT_LABELS = {
+    events.DEPUTY_ADDED: "cadastro de deputado",
+    events.DEPUTY_UPDATED: "edição de deputado",
+    events.DEPUTY_DELETED: "exclusão de deputado",
+    events.DEPUTY_ALLOCATIONS_UPDATED: "alteração de alocações",
+    events.DEPUTY_INCLINATIONS_UPDATED: "alteração de inclinações",
+    events.REALLOCATION_FLAGS_CHANGED: "marcação para redistribuição",
+    events.EMENDA_ADDED: "cadastro de emenda",
+    events.EMENDA_DELETED: "exclusão de emenda",
+    events.CATEGORY_ADDED: "cadastro de categoria",
+    events.CATEGORY_DELETED: "exclusão de categoria",
+    events.ALLOCATION_COMMITTED: "otimização de verbas",
+}
+
+
+class PersistentMap:
+    """
+    Mapa imutável {id: registro} com compartilhamento estrutural.
+    Os registros ficam em blocos de CHUNK_SIZE IDs; uma atualização copia apenas
+    os blocos tocados e reaproveita todos os outros da versão anterior.
+    Os registros armazenados devem ser tratados como somente leitura.
+    """
+    __slots__ = ('_chunks', '_size')
+
+    def __init__(self, chunks=None, size=0):
+        self._chunks = chunks if chunks is not None else {} # {numero_do_bloco: {id: registro}}
+        self._size = size
+
+    @classmethod
+    def from_items(cls, items):
+        return cls().update(dict(items))
+
+    @staticmethod
+    def _chunk_of(key):
+        return key // CHUNK_SIZE
+
+    def get(self, key, default=None):
+        chunk = self._chunks.get(self._chunk_of(key))
+        if chunk is None:
+            return default
+        return chunk.get(key, default)
+
+    def __contains__(self, key):
+        chunk = self._chunks.get(self._chunk_of(key))
+        return chunk is not None and key in chunk
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for chunk_no in sorted(self._chunks):
+            yield from sorted(self._chunks[chunk_no])
+
+    def items(self):
+        for key in self:
+            yield key, self.get(key)
+
+    def values(self):
+        for _, value in self.items():
+            yield value
+
+    def update(self, changes):
+        """
+        Retorna uma nova versão com as mudanças aplicadas ({id: registro}; registro None remove).
+        Custo proporcional ao número de blocos alterados.
+        """
+        if not changes:
+            return self
+        chunks = dict(self._chunks) # Cópia rasa do índice de blocos; os blocos em si são compartilhados
+        size = self._size
+        copied = set()
+        for key, record in changes.items():
+            chunk_no = self._chunk_of(key)
+            if chunk_no not in copied:
+                chunks[chunk_no] = dict(chunks.get(chunk_no, {}))
+                copied.add(chunk_no)
+            chunk = chunks[chunk_no]
+            if record is None:
+                if key in chunk:
+                    del chunk[key]
+                    size -= 1
+            else:
+                if key not in chunk:
+                    size += 1
+                chunk[key] = record
+        for chunk_no in copied:
+            if not chunks[chunk_no]:
+                del chunks[chunk_no]
+        return PersistentMap(chunks, size)
+
+    def changed_keys(self, other):
+        """
+        IDs cujo registro difere entre as duas versões. Blocos compartilhados
+        (mesmo objeto) são ignorados sem inspeção.
+        """
+        changed = set()
+        for chunk_no in set(self._chunks) | set(other._chunks):
+            mine = self._chunks.get(chunk_no)
+            theirs = other._chunks.get(chunk_no)
+            if mine is theirs:
+                continue
+            mine = mine or {}
+            theirs = theirs or {}
+            for key in set(mine) | set(theirs):
+                if mine.get(key) is not theirs.get(key):
+                    changed.add(key)
+        return changed
+
+
+class StateVersion:
+    """Versão imutável do conjunto de deputados, emendas e categorias."""
+    def __init__(self, number, label, deputies, emendas, categories):
+        self.number = number
+        self.label = label
+        self.deputies = deputies # PersistentMap {deputy_id: registro serializado}
+        self.emendas = emendas # PersistentMap {emenda_id: registro serializado}
+        self.categories = categories # tupla
+        self.created_at = time.time()
+
+    def __repr__(self):
+        return f"StateVersion({self.number}, {self.label!r}, deputados={len(self.deputies)}, emendas={len(self.emendas)})"
+
+
+class StateHistory:
+    """
+    Histórico de versões com desfazer/refazer. Acompanha os eventos dos managers
+    para saber quais registros mudaram e, a cada commit, cria uma nova StateVersion
+    que reaproveita os registros inalterados da anterior. Desfazer e refazer aplicam
+    aos managers apenas os registros que diferem entre as versões.
+    """
+    def __init__(self, deputy_manager, emenda_manager, category_manager=None, event_bus=None, max_versions=50):
+        self.deputy_manager = deputy_manager
+        self.emenda_manager = emenda_manager
+        self.category_manager = category_manager
+        self.event_bus = event_bus if event_bus is not None else deputy_manager.event_bus
+        self.max_versions = max_versions
+
+        self._undo_stack = []
+        self._redo_stack = []
+        self._pending_deputy_ids = set()
+        self._pending_emenda_ids = set()
+        self._pending_categories = False
+        self._pending_labels = []
+        self._restoring = False
+        self._next_number = 1
+
+        self._current = self._new_version(
+            "Estado inicial",
+            PersistentMap.from_items((d.id, self._freeze(d)) for d in deputy_manager.list_deputies()),
+            PersistentMap.from_items((e.id, self._freeze(e)) for e in emenda_manager.list_emendas()),
+            self._current_categories(),
+        )
+        self.event_bus.subscribe(events.ALL_EVENTS, self._on_event)
+
+    # --- Leitura ---
+
+    def current(self):
+        """Versão confirmada mais recente (leitura consistente, nunca alterada)."""
+        return self._current
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    def undo_label(self):
+        return self._current.label if self._undo_stack else None
+
+    def redo_label(self):
+        return self._redo_stack[-1].label if self._redo_stack else None
+
+    def has_pending_changes(self):
+        return bool(self._pending_deputy_ids or self._pending_emenda_ids or self._pending_categories)
+
+    # --- Escrita ---
+
+    def commit(self, label=None):
+        """Confirma as mudanças acumuladas desde o último commit como uma nova versão."""
+        if not self.has_pending_changes():
+            return self._current
+
+        deputy_changes = {}
+        for deputy_id in self._pending_deputy_ids:
+            deputy = self.deputy_manager.get_deputy_by_id(deputy_id)
+            deputy_changes[deputy_id] = self._freeze(deputy) if deputy is not None else None
+        emenda_changes = {}
+        for emenda_id in self._pending_emenda_ids:
+            emenda = self.emenda_manager.get_emenda_by_id(emenda_id)
+            emenda_changes[emenda_id] = self._freeze(emenda) if emenda is not None else None
+        categories = self._current_categories() if self._pending_categories else self._current.categories
+
+        version = self._new_version(
+            label or self._pending_label(),
+            self._current.deputies.update(deputy_changes),
+            self._current.emendas.update(emenda_changes),
+            categories,
+        )
+        self._push(self._undo_stack, self._current)
+        self._redo_stack.clear()
+        self._current = version
+        self._clear_pending()
+        return version
+
+    def undo(self):
+        if not self._undo_stack:
+            return False, "Nada para desfazer."
+        self.commit() # Não perde edições ainda não confirmadas
+        if not self._undo_stack:
+            return False, "Nada para desfazer."
+        target = self._undo_stack.pop()
+        label = self._current.label
+        self._push(self._redo_stack, self._current)
+        self._restore(target)
+        return True, f"Desfeito: {label}"
+
+    def redo(self):
+        if not self._redo_stack:
+            return False, "Nada para refazer."
+        target = self._redo_stack.pop()
+        self._push(self._undo_stack, self._current)
+        self._restore(target)
+        return True, f"Refeito: {target.label}"
+
+    # --- Internos ---
+
+    def _on_event(self, event):
+        if self._restoring or event.type in (events.ALLOCATION_STARTED, events.ALLOCATION_ABORTED, events.STATE_RESTORED):
+            return
+        self._pending_deputy_ids.update(event.deputy_ids)
+        self._pending_emenda_ids.update(event.emenda_ids)
+        if event.type in (events.CATEGORY_ADDED, events.CATEGORY_DELETED):
+            self._pending_categories = True
+        self._pending_labels.append(EVENT_LABELS.get(event.type, event.type))
+
+    def _restore(self, target):
+        """Aplica aos managers apenas os registros que diferem entre a versão atual e a alvo."""
+        deputy_ids = target.deputies.changed_keys(self._current.deputies)
+        emenda_ids = target.emendas.changed_keys(self._current.emendas)
+        self._restoring = True
+        try:
+            if deputy_ids:
+                self.deputy_manager.apply_records({d_id: target.deputies.get(d_id) for d_id in deputy_ids})
+            if emenda_ids:
+                self.emenda_manager.apply_records({e_id: target.emendas.get(e_id) for e_id in emenda_ids})
+            if self.category_manager is not None and target.categories != self._current.categories:
+                self.category_manager.replace_categories(target.categories)
+            self._current = target
+            self._clear_pending()
+        finally:
+            self._restoring = False
+        self.event_bus.emit(events.STATE_RESTORED, deputy_ids=sorted(deputy_ids), emenda_ids=sorted(emenda_ids),
+                            version=target.number)
+
+    def _new_version(self, label, deputies, emendas, categories):
+        version = StateVersion(self._next_number, label, deputies, emendas, categories)
+        self._next_number += 1
+        return version
+
+    def _push(self, stack, version):
+        stack.append(version)
+        if len(stack) > self.max_versions:
+            del stack[0]
+
+    def _clear_pending(self):
+        self._pending_deputy_ids.clear()
+        self._pending_emenda_ids.clear()
+        self._pending_categories = False
+        self._pending_labels.clear()
+
+    def _pending_label(self):
+        labels = list(dict.fromkeys(self._pending_labels))
+        # A marcação para redistribuição é efeito colateral das demais ações; só a cita se estiver sozinha
+        side_effect = EVENT_LABELS[events.REALLOCATION_FLAGS_CHANGED]
+        if len(labels) > 1 and side_effect in labels:
+            labels.remove(side_effect)
+        return ", ".join(labels).capitalize()
+
+    def _current_categories(self):
+        return tuple(self.category_manager.list_categories()) if self.category_manager is not None else ()
+
+    @staticmethod
+    def _freeze(obj):
+        # Cópia profunda apenas do registro alterado; os demais são compartilhados entre versões.
+        # O perfil do deputado entra só como revisão do TextStore, resolvida ao desfazer/refazer
+        return copy.deepcopy(obj.serialize())
@@ -0,0 +1,62 @@
+import gzip
+import os
+
+from LRUCache import LRUCache
+
+
+class TextStore:
+    """
+    Armazena textos longos (ex.: perfis dos deputados) fora dos arquivos JSON principais,
+    um arquivo por registro, opcionalmente comprimido com gzip. Os textos só são lidos
+    quando pedidos e os mais recentes ficam em um cache LRU.
+    """
+    def __init__(self, directory, compress=True, cache_size=32):
+        self.directory = directory
+        self.compress = compress
+        os.makedirs(self.directory, exist_ok=True)
+        self._cache = LRUCache(cache_size)
+
+    def _path(self, key, compressed):
+        return os.path.join(self.directory, f"{key}.txt.gz" if compressed else f"{key}.txt")
+
+    def get(self, key):
+        """Retorna o texto associado à chave ou None se não existir."""
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        # Aceita os dois formatos, para o caso de a compressão ter sido ligada/desligada
+        for compressed in (self.compress, not self.compress):
+            path = self._path(key, compressed)
+            if os.path.exists(path):
+                opener = gzip.open if compressed else open
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    text = f.read()
+                self._cache.put(key, text)
+                return text
+        return None
+
+    def put(self, key, text):
+        """Grava o texto da chave (None ou vazio remove)."""
+        if not text:
+            self.delete(key)
+            return
+        self._remove_files(key)
+        opener = gzip.open if self.compress else open
+        with opener(self._path(key, self.compress), 'wt', encoding='utf-8') as f:
+            f.write(text)
+        self._cache.put(key, text)
+
+    def keys(self):
+        """Chaves com texto gravado."""
+        suffixes = ('.txt.gz', '.txt')
+        return {name[:-len(suffix)] for name in os.listdir(self.directory) for suffix in suffixes if name.endswith(suffix)}
+
+    def delete(self, key):
+        self._remove_files(key)
+        self._cache.pop(key)
+
+    def _remove_files(self, key):
+        for compressed in (True, False):
+            path = self._path(key, compressed)
+            if os.path.exists(path):
+                os.remove(path)
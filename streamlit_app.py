@@ -1,10 +1,14 @@
+import time
+SCRIPT_STARTED_AT = time.perf_counter() # Início desta execução do script, para medir a inicialização
+
 import streamlit as st
-import json
 import math 
 import os
-import plotly.graph_objects as go 
+import pandas as pd
+# plotly é importado só nas funções que desenham gráficos: a Home e as páginas sem gráficos não pagam por ele
 
 # Importar suas classes de gerenciamento e modelos
+from EventBus import EventBus
 from DataManager import DataManager
 from Deputy import Deputy
 from Emenda import Emenda
@@ -12,113 +16,237 @@ from DeputyManager import DeputyManager
 from EmendaManager import EmendaManager
 from CategoryManager import CategoryManager
 from AllocationOptimizer import AllocationOptimizer
-from ReportGenerator import ReportGenerator
+from ReportGenerator import ReportGenerator, top_series
+from AllocationSnapshot import SnapshotStore
+from StateHistory import StateHistory
+from LRUCache import LRUCache
+from SearchIndex import SearchIndex, KIND_DEPUTY, KIND_EMENDA
+from DocumentRenderer import DocumentRenderer, STATUS_FAILED
+from ReportModel import COLUMN_LABELS, STATUS_FULL, STATUS_PARTIAL, STATUS_NONE
+from PublicBundleExporter import PublicBundleExporter
+from Metrics import metrics
+from OptimizationRunner import OptimizationRunner, MODE_FULL, MODE_PARTIAL, STATUS_DONE, STATUS_CANCELLED
+
+HOME_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'home.svg')
+IMPORTS_DONE_AT = time.perf_counter()
 
 # --- Funções Auxiliares para o Streamlit ---
-def initialize_session_state():
-    """Inicializa os managers e o estado da sessão, garantindo que o DataManager seja compartilhado."""
+def _create_deputy_manager():
+    deputy_manager = DeputyManager(st.session_state.data_manager, st.session_state.event_bus)
+    # Mudanças nos dados marcam automaticamente os deputados afetados para redistribuição
+    st.session_state.event_bus.subscribe(DeputyManager.REALLOCATION_TRIGGER_EVENTS, deputy_manager.handle_data_change)
+    return deputy_manager
+
+def _create_public_exporter():
+    # Pacote público estático (data/public), reexportado a cada otimização confirmada. Inscrito
+    # no barramento depois do SnapshotStore (dependência), para exportar o snapshot já publicado
+    exporter = PublicBundleExporter(
+        st.session_state.report_generator,
+        os.path.join(st.session_state.data_manager.data_dir, 'public'),
+        st.session_state.document_renderer
+    )
+    exporter.attach(st.session_state.event_bus)
+    return exporter
+
+# Subsistemas da sessão: nome -> (dependências, fábrica). Cada um é criado só quando a primeira
+# página que o usa é aberta (ver PAGE_SUBSYSTEMS), depois das suas dependências
+SESSION_SUBSYSTEMS = {
+    'data_manager': ((), DataManager),
+    # Barramento de eventos compartilhado por todos os managers da sessão
+    'event_bus': ((), EventBus),
+    'category_manager': (('data_manager', 'event_bus'), lambda: CategoryManager(st.session_state.data_manager, st.session_state.event_bus)),
+    'deputy_manager': (('data_manager', 'event_bus'), _create_deputy_manager),
+    # As emendas são validadas contra os IDs dos deputados carregados: deputados primeiro
+    'emenda_manager': (('deputy_manager',), lambda: EmendaManager(st.session_state.data_manager, st.session_state.event_bus)),
+    # Desfazer/refazer: criado antes da primeira edição, pelas páginas que alteram dados
+    'history': (('category_manager', 'deputy_manager', 'emenda_manager'), lambda: StateHistory(
+        st.session_state.deputy_manager, st.session_state.emenda_manager, st.session_state.category_manager, st.session_state.event_bus)),
+    # Snapshots confirmados do estado de alocação, lidos pelos relatórios
+    'snapshot_store': (('deputy_manager', 'emenda_manager'), lambda: SnapshotStore(
+        st.session_state.deputy_manager, st.session_state.emenda_manager, st.session_state.event_bus)),
+    'report_generator': (('snapshot_store',), lambda: ReportGenerator(
+        st.session_state.deputy_manager, st.session_state.emenda_manager, st.session_state.snapshot_store)),
+    # Busca textual sobre emendas e deputados, atualizada pelos eventos dos managers
+    'search_index': (('deputy_manager', 'emenda_manager'), lambda: SearchIndex(
+        st.session_state.deputy_manager, st.session_state.emenda_manager, st.session_state.event_bus)),
+    # Renderização de documentos (HTML/PDF) em segundo plano
+    'document_renderer': (('report_generator',), lambda: DocumentRenderer(st.session_state.report_generator)),
+    'public_exporter': (('document_renderer',), _create_public_exporter),
+    'optimizer': (('deputy_manager', 'emenda_manager'), lambda: AllocationOptimizer(
+        st.session_state.deputy_manager, st.session_state.emenda_manager, st.session_state.data_manager, st.session_state.event_bus)),
+    # Otimizações em segundo plano (uma por vez para a mesma pasta de dados, entre todas as sessões)
+    'optimization_runner': (('optimizer', 'report_generator', 'public_exporter', 'history'), lambda: OptimizationRunner(
+        st.session_state.optimizer, st.session_state.report_generator)),
+}
+
+def require_session(*names):
+    """Cria os subsistemas indicados (e suas dependências) que ainda não existem na sessão."""
+    for name in names:
+        if name in st.session_state:
+            continue
+        dependencies, factory = SESSION_SUBSYSTEMS[name]
+        require_session(*dependencies)
+        st.session_state[name] = factory()
+
+def initialize_session_state(names):
+    """Prepara os subsistemas usados pela página aberta e confirma no histórico as mudanças do rerun anterior."""
     try:
-        if 'data_manager' not in st.session_state:
-            st.session_state.data_manager = DataManager()
-        
-        if 'category_manager' not in st.session_state:
-            st.session_state.category_manager = CategoryManager(st.session_state.data_manager)
-
-        if 'deputy_manager' not in st.session_state:
-            st.session_state.deputy_manager = DeputyManager(st.session_state.data_manager)
-
-        if 'emenda_manager' not in st.session_state:
-            st.session_state.emenda_manager = EmendaManager(st.session_state.data_manager)
-
-        if 'optimizer' not in st.session_state:
-            st.session_state.optimizer = AllocationOptimizer(
-                st.session_state.deputy_manager, 
-                st.session_state.emenda_manager,
-                st.session_state.data_manager 
-            )
+        require_session(*names)
 
-        if 'report_generator' not in st.session_state:
-            st.session_state.report_generator = ReportGenerator(
-                st.session_state.deputy_manager, 
-                st.session_state.emenda_manager
-            )
+        # Cada ação do usuário termina em um rerun: as mudanças da ação anterior viram uma nova versão
+        # (durante uma otimização o estado vivo está pela metade; o commit fica para o fim dela)
+        history = st.session_state.get('history')
+        if history is not None and not optimization_running():
+            history.commit()
             
     except Exception as e:
         st.error("Ocorreu um erro crítico durante a inicialização da aplicação.")
         st.exception(e) 
         st.stop() 
 
+def optimization_running():
+    """True se uma otimização desta sessão está em andamento (o runner só existe após abrir a página de otimização)."""
+    runner = st.session_state.get('optimization_runner')
+    return runner is not None and runner.running
+
 # --- Funções para Renderizar as Páginas (Adaptadas para Streamlit) ---
 
+EDITS_BLOCKED_MESSAGE = "Otimização em andamento. Cadastros, edições e exclusões ficam bloqueados até ela terminar."
+
+def edits_blocked():
+    """
+    True (com um aviso) enquanto uma otimização desta sessão roda: o otimizador altera os
+    managers em outra thread e, se cancelado ou com erro, restaura o estado de antes, o que
+    desfaria uma edição feita no meio. Os formulários ficam desabilitados e os tratadores
+    conferem de novo no rerun do clique, já que a otimização pode ter começado depois.
+    """
+    if not optimization_running():
+        return False
+    st.warning(EDITS_BLOCKED_MESSAGE)
+    return True
+
 def home_page():
     st.title("Sistema de Gerenciamento de Emendas Parlamentares")
     st.write("""
     Bem-vindo ao sistema de gerenciamento de emendas! 
     Utilize o menu lateral para navegar pelas funcionalidades:
-    - **Gerenciar Deputados:** Cadastre, visualize, edite e configure deputados.
-    - **Gerenciar Emendas:** Cadastre, visualize e exclua emendas.
-    - **Gerenciar Categorias:** Adicione, liste e exclua categorias de emendas.
+    - **Buscar:** Encontre emendas e deputados pela descrição, categoria, nome ou perfil.
+    - **Deputados:** Cadastre, visualize, edite e configure deputados.
+    - **Emendas:** Cadastre, visualize e exclua emendas, e gerencie as categorias de emendas.
     - **Otimizar Distribuição:** Execute a otimização das verbas.
     - **Relatórios:** Visualize os resultados da distribuição.
+    - **Painel de Análise:** Filtre e agrupe a verba contribuída por categoria, status, partido e deputado.
     """)
-    st.image("https://images.unsplash.com/photo-1549490159-839556191c78?q=80&w=2940&auto=format&fit=crop&ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D", caption="Justiça e Transparência") 
+    # Imagem local: a Home não depende de nenhum recurso externo para ser exibida
+    st.image(HOME_IMAGE, caption="Justiça e Transparência", width='stretch')
     st.info("Para começar, selecione uma opção no menu à esquerda.")
-
-def manage_deputies_page():
-    st.title("Gerenciar Deputados")
-
-    menu_deputies = ["Listar Todos", "Cadastrar Novo", "Visualizar/Editar Detalhes", "Distribuir Verba por Categoria", "Configurar Inclinação", "Excluir"]
-    # Usa st.session_state para manter a seleção do submenu de deputados
-    if 'deputy_menu_choice' not in st.session_state:
-        st.session_state['deputy_menu_choice'] = "Listar Todos"
-
-    choice = st.sidebar.selectbox("Opções de Deputados", menu_deputies, key='deputy_menu_choice') 
-
-    if choice == "Listar Todos":
-        display_all_deputies_streamlit()
-    elif choice == "Cadastrar Novo":
-        add_new_deputy_streamlit()
-    elif choice == "Visualizar/Editar Detalhes":
-        view_edit_deputy_details_streamlit()
-    elif choice == "Distribuir Verba por Categoria":
-        distribute_deputy_funds_by_category_streamlit()
-    elif choice == "Configurar Inclinação":
-        configure_deputy_inclinations_streamlit()
-    elif choice == "Excluir":
-        delete_deputy_streamlit()
-
+    timing = st.session_state.get('startup_timing')
+    if timing:
+        st.caption(f"Sessão iniciada em {timing['total']:.0f} ms "
+                   f"(importações {timing['imports']:.0f} ms, dados {timing['session']:.0f} ms, página {timing['page']:.0f} ms).")
+
+LISTING_PAGE_SIZE_OPTIONS = [25, 50, 100, 250]
+
+def paginated_table(frame, key, labels):
+    """
+    Tabela ordenável e paginada (um único st.dataframe por página, custo fixo por rerun).
+    Retorna a linha selecionada para detalhamento, ou None.
+    """
+    sortable = [column for column in frame.columns if column in labels]
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        sort_by = st.selectbox("Ordenar por", sortable, format_func=lambda column: labels[column], key=f"{key}_sort_by")
+    with col2:
+        descending = st.toggle("Decrescente", key=f"{key}_descending")
+    with col3:
+        per_page = st.selectbox("Linhas por página", LISTING_PAGE_SIZE_OPTIONS, key=f"{key}_per_page")
+    total_pages = max(1, math.ceil(len(frame) / per_page))
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = total_pages # Menos páginas após filtrar ou mudar o tamanho da página
+    with col4:
+        page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1, step=1, key=f"{key}_page")
+
+    ordered = frame.sort_values(sort_by, ascending=not descending, kind='stable')
+    start = (page - 1) * per_page
+    page_frame = ordered.iloc[start:start + per_page]
+    event = st.dataframe(
+        page_frame[sortable].rename(columns=labels), width='stretch', hide_index=True,
+        on_select='rerun', selection_mode='single-row', key=f"{key}_table"
+    )
+    st.caption(f"Exibindo {len(page_frame)} de {len(frame)} registro(s). Selecione uma linha para ver os detalhes.")
+    selected_rows = event.selection.rows if event is not None else []
+    if selected_rows and selected_rows[0] < len(page_frame):
+        return page_frame.iloc[selected_rows[0]]
+    return None
+
+DEPUTY_LISTING_LABELS = {
+    'id': "ID", 'name': "Deputado", 'total_verba_disponivel': "Verba Total", 'allocated_total': "Intenção de Alocação",
+    'remaining_verba': "Verba Livre", 'actual_spent_amount': "Verba Gasta", 'contributed_total': "Total Contribuído",
+    'needs_reallocation': "Precisa de Realocação", 'inclination_total': "Inclinação (de 10)",
+}
+
+@st.fragment
 def display_all_deputies_streamlit():
     st.header("Lista de Todos os Deputados")
-    deputies = st.session_state.deputy_manager.list_deputies()
-    if not deputies:
+    # Tabela montada a partir do snapshot (uma vez por versão dos dados), não deputado a deputado
+    snapshot = st.session_state.snapshot_store.current()
+    listing = st.session_state.report_generator.get_deputy_listing(snapshot)
+    if listing.empty:
         st.info("Nenhum deputado cadastrado.")
         return
 
-    for d in deputies:
-        st.subheader(f"Deputado: {d.name} (ID: {d.id})")
-        st.write(f"Verba Total Disponível: R${d.total_verba_disponivel:,.2f}")
-        st.write(f"Intenção de Alocação (Categorias): R${d.get_allocated_total():,.2f}")
-        st.write(f"Verba Remanescente (Para Alocação Livre): R${d.get_remaining_verba():,.2f}")
-        st.write(f"Verba Efetivamente Gasta em Emendas: R${d.actual_spent_amount:,.2f}")
-        st.write(f"Precisa de Realocação: {'Sim' if d.needs_reallocation else 'Não'}")
-
-        if d.profile:
-            st.markdown(f"**Perfil:**\n{d.profile}")
-        else:
-            st.write("Perfil: (Não informado)")
-
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search = st.text_input("Buscar (nome ou perfil)", key='deputy_listing_search')
+    with col2:
+        only_pending = st.checkbox("Apenas com realocação pendente", key='deputy_listing_pending')
+    filtered = listing
+    if search:
+        found = {r.id for r in st.session_state.search_index.search(search, kinds=(KIND_DEPUTY,), limit=None)}
+        filtered = filtered[filtered['id'].isin(found)]
+    if only_pending:
+        filtered = filtered[filtered['needs_reallocation']]
+
+    selected = paginated_table(filtered, 'deputy_listing', DEPUTY_LISTING_LABELS)
+    if selected is not None:
+        deputy_detail_view(snapshot, int(selected['id']))
+
+def deputy_detail_view(snapshot, deputy_id):
+    d = snapshot.get_deputy_by_id(deputy_id)
+    if d is None:
+        return
+    st.subheader(f"Deputado: {d.name} (ID: {d.id})")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Verba Total Disponível", f"R$ {d.total_verba_disponivel:,.2f}")
+    col2.metric("Intenção de Alocação", f"R$ {d.get_allocated_total():,.2f}")
+    col3.metric("Verba Remanescente (Livre)", f"R$ {d.get_remaining_verba():,.2f}")
+    col4.metric("Verba Gasta em Emendas", f"R$ {d.actual_spent_amount:,.2f}")
+    st.write(f"Precisa de Realocação: {'Sim' if d.needs_reallocation else 'Não'}")
+    # O perfil é carregado sob demanda e exibido apenas em 'Visualizar/Editar Detalhes'
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**Alocações por Categoria (Intenção):**")
         if d.allocated_by_category:
-            st.write("**Alocações por Categoria (Intenção):**")
-            for cat, val in d.allocated_by_category.items():
-                st.write(f"  - {cat}: R${val:,.2f}")
-        
+            st.dataframe(pd.DataFrame(list(d.allocated_by_category.items()), columns=["Categoria", "Intenção"]),
+                         width='stretch', hide_index=True)
+        else:
+            st.write("Nenhuma alocação por categoria.")
+    with col2:
         if d.inclinacao_por_categoria:
             st.write(f"**Inclinação por Categoria (Total: {sum(d.inclinacao_por_categoria.values())}/10):**")
-            for cat, score in d.inclinacao_por_categoria.items():
-                st.write(f"  - {cat}: {score}/10 ({score*10:.2f}% da inclinação total do deputado)")
+            st.dataframe(pd.DataFrame(list(d.inclinacao_por_categoria.items()), columns=["Categoria", "Inclinação (de 10)"]),
+                         width='stretch', hide_index=True)
         else:
             st.write("Nenhuma inclinação por categoria configurada.")
-        st.markdown("---")
+
+    contributions = st.session_state.report_generator.get_report_model(snapshot).contributions_of_deputy(deputy_id)
+    st.write("**Contribuições para Emendas:**")
+    if contributions.empty:
+        st.write("Nenhuma contribuição registrada.")
+    else:
+        st.dataframe(contributions.drop(columns=['deputy_id', 'deputy_name']).rename(columns=COLUMN_LABELS),
+                     width='stretch', hide_index=True)
 
 def add_new_deputy_streamlit():
     st.header("Cadastrar Novo Deputado")
@@ -137,30 +265,25 @@ def add_new_deputy_streamlit():
                 st.rerun() 
         with col2:
             if st.button("Ver Lista de Deputados"):
-                # Define flags temporárias para a navegação na próxima execução do script
-                st.session_state['__nav_target_main_menu'] = "Gerenciar Deputados"
-                st.session_state['__nav_target_deputy_menu'] = "Listar Todos"
                 if 'show_deputy_add_options' in st.session_state: del st.session_state['show_deputy_add_options']
                 if 'deputy_add_success_message' in st.session_state: del st.session_state['deputy_add_success_message']
                 if 'deputy_add_warning_message' in st.session_state: del st.session_state['deputy_add_warning_message']
-                st.rerun() 
+                st.switch_page(PAGES['deputados'])
     else: 
+        blocked = edits_blocked()
         with st.form("add_deputy_form"):
             name = st.text_input("Nome do Deputado", key="new_deputy_name_input") 
             verba = st.number_input("Verba Total Disponível (R$)", min_value=0.0, format="%.2f", key="new_deputy_verba_input")
             profile_text = st.text_area("Perfil do Deputado (Opcional)", key="new_deputy_profile_input")
             
-            submitted = st.form_submit_button("Cadastrar Deputado")
+            submitted = st.form_submit_button("Cadastrar Deputado", disabled=blocked)
 
-            if submitted:
+            if submitted and not blocked:
                 if name and verba is not None:
                     profile_to_save = profile_text if profile_text.strip() else None
                     deputy = st.session_state.deputy_manager.add_deputy(name, verba, profile=profile_to_save)
                     st.session_state['deputy_add_success_message'] = f"Deputado '{deputy.name}' (ID: {deputy.id}) cadastrado com sucesso!"
-                    
-                    for d in st.session_state.deputy_manager.list_deputies():
-                        d.needs_reallocation = True
-                    st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
+                    # A marcação para redistribuição é feita pelo assinante do evento 'deputy_added'
                     st.session_state['deputy_add_warning_message'] = "Um novo deputado foi adicionado. Todos os deputados foram marcados para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' para aplicar as mudanças."
                     
                     st.session_state['show_deputy_add_options'] = True
@@ -186,30 +309,7 @@ def view_edit_deputy_details_streamlit():
         if deputy:
             st.subheader(f"Detalhes de: {deputy.name}")
 
-            with st.form(f"edit_deputy_form_{deputy.id}"):
-                new_name = st.text_input("Nome", value=deputy.name, key=f"edit_name_{deputy.id}")
-                new_verba = st.number_input("Verba Total Disponível (R$)", value=float(deputy.total_verba_disponivel), min_value=0.0, format="%.2f", key=f"edit_verba_{deputy.id}")
-                new_profile = st.text_area("Perfil do Deputado", value=deputy.profile if deputy.profile else "", key=f"edit_profile_{deputy.id}")
-                
-                edit_submitted = st.form_submit_button("Atualizar Dados do Deputado")
-
-                if edit_submitted:
-                    old_total_verba = deputy.total_verba_disponivel
-                    profile_to_save = new_profile if new_profile.strip() else None
-
-                    success, message, _ = st.session_state.deputy_manager.update_deputy(
-                        deputy.id, new_name, new_verba, profile_to_save
-                    )
-                    
-                    if success:
-                        st.success(message)
-                        if not math.isclose(old_total_verba, new_verba):
-                            deputy.needs_reallocation = True
-                            st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
-                            st.warning("!!! ATENÇÃO: A verba total do deputado foi alterada. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
-                        st.rerun() 
-                    else:
-                        st.error(message)
+            deputy_edit_form(deputy.id)
 
             st.markdown("---")
             st.subheader("Informações Atuais do Deputado")
@@ -243,17 +343,12 @@ def view_edit_deputy_details_streamlit():
                 st.write("Nenhuma inclinação por categoria configurada.")
 
             st.write("**Emendas Contribuídas:**")
-            emenda_status_all, _, _, _ = st.session_state.report_generator._get_current_allocation_state()
-            contributions_by_category_for_display = {}
-            for emenda_id, status_info in emenda_status_all.items():
-                if str(deputy.id) in status_info['contributors']: # IDs são strings nas chaves de contributors
-                    contrib_detail = status_info['contributors'][str(deputy.id)]
-                    emenda = status_info['emenda']
-                    contributions_by_category_for_display.setdefault(emenda.categoria, []).append({
-                        'emenda': emenda,
-                        'contrib_detail': contrib_detail,
-                        'status': status_info['status']
-                    })
+            # Lê do índice deputado → contribuições, sem varrer todas as emendas
+            contributions_by_category_for_display = {
+                category: [{'emenda': emenda, 'contrib_detail': contrib_detail, 'status': status}
+                           for emenda, contrib_detail, status in contributions]
+                for category, contributions in st.session_state.report_generator.get_deputy_contributions_by_category(deputy.id).items()
+            }
 
             if contributions_by_category_for_display: 
                 for category in sorted(contributions_by_category_for_display.keys()):
@@ -278,46 +373,119 @@ def view_edit_deputy_details_streamlit():
             else:
                 st.write("Este deputado não contribuiu para nenhuma emenda até o momento.")
 
-            st.subheader("Gráficos de Distribuição")
-            
-            # Gráfico 1: Verba Alocada por Categoria (Intenção)
-            allocated_verba_chart_json = generate_allocated_verba_chart_json_streamlit(deputy)
-            if allocated_verba_chart_json:
-                st.markdown("### Gráfico 1: Verba Alocada por Categoria (Intenção)")
-                labels = [s['name'] for s in allocated_verba_chart_json['series']]
-                values = [s['data'] for s in allocated_verba_chart_json['series']]
-                fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
-                fig.update_layout(title_text=allocated_verba_chart_json['title']['text'])
-                st.plotly_chart(fig, use_container_width=True)
-                st.json(allocated_verba_chart_json) 
-            else:
-                st.info("Gráfico 1: Verba Alocada por Categoria (Intenção) - Sem dados para exibir.")
-
-            # Gráfico 2: Pontos de Inclinação por Categoria
-            inclination_chart_json = generate_inclination_chart_json_streamlit(deputy)
-            if inclination_chart_json:
-                st.markdown("### Gráfico 2: Pontos de Inclinação por Categoria")
-                labels = [s['name'] for s in inclination_chart_json['series']]
-                values = [s['data'] for s in inclination_chart_json['series']]
-                fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
-                fig.update_layout(title_text=inclination_chart_json['title']['text'])
-                st.plotly_chart(fig, use_container_width=True)
-                st.json(inclination_chart_json) 
-            else:
-                st.info("Gráfico 2: Pontos de Inclinação por Categoria - Sem dados para exibir.")
-
-            # Gráfico 3: Verba Efetivamente Contribuída para Emendas (por Categoria)
-            contributed_emendas_chart_json = generate_contributed_emendas_chart_json_streamlit(deputy, contributions_by_category_for_display)
-            if contributed_emendas_chart_json:
-                st.markdown("### Gráfico 3: Verba Efetivamente Contribuída para Emendas (por Categoria)")
-                labels = [s['name'] for s in contributed_emendas_chart_json['series']]
-                values = [s['data'] for s in contributed_emendas_chart_json['series']]
-                fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
-                fig.update_layout(title_text=contributed_emendas_chart_json['title']['text'])
-                st.plotly_chart(fig, use_container_width=True)
-                st.json(contributed_emendas_chart_json) 
+            deputy_charts(deputy.id)
+
+@st.fragment
+def deputy_edit_form(deputy_id):
+    # Fragmento: enviar o formulário com erro reexecuta só o formulário, não a página inteira
+    deputy = st.session_state.deputy_manager.get_deputy_by_id(deputy_id)
+    if deputy is None:
+        return
+    blocked = edits_blocked()
+    with st.form(f"edit_deputy_form_{deputy.id}"):
+        new_name = st.text_input("Nome", value=deputy.name, key=f"edit_name_{deputy.id}")
+        new_verba = st.number_input("Verba Total Disponível (R$)", value=float(deputy.total_verba_disponivel), min_value=0.0, format="%.2f", key=f"edit_verba_{deputy.id}")
+        new_profile = st.text_area("Perfil do Deputado", value=deputy.profile if deputy.profile else "", key=f"edit_profile_{deputy.id}")
+
+        edit_submitted = st.form_submit_button("Atualizar Dados do Deputado", disabled=blocked)
+
+        if edit_submitted and not blocked:
+            old_total_verba = deputy.total_verba_disponivel
+            profile_to_save = new_profile if new_profile.strip() else None
+
+            success, message, _ = st.session_state.deputy_manager.update_deputy(
+                deputy.id, new_name, new_verba, profile_to_save
+            )
+
+            if success:
+                st.success(message)
+                if not math.isclose(old_total_verba, new_verba):
+                    st.warning("!!! ATENÇÃO: A verba total do deputado foi alterada. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
+                # Os dados mudaram: rerun completo (nome no seletor, painel de informações, desfazer/refazer)
+                st.rerun()
             else:
-                st.info("Gráfico 3: Verba Efetivamente Contribuída para Emendas (por Categoria) - Sem dados para exibir.")
+                st.error(message)
+
+CHART_KINDS = ["Pizza", "Barras", "Treemap"]
+CHART_CACHE_SIZE = 64
+
+def chart_cache():
+    # Dados e figuras dos gráficos da sessão; as figuras Plotly só são montadas quando exibidas
+    if 'chart_cache' not in st.session_state:
+        st.session_state.chart_cache = LRUCache(CHART_CACHE_SIZE)
+    return st.session_state.chart_cache
+
+def cached_figure(key, chart_data, build):
+    """Figura em cache, refeita só quando os dados do gráfico mudam (editar o perfil de um deputado não a reconstrói)."""
+    cache = chart_cache()
+    cached = cache.get(('figure',) + key)
+    if cached is not None and cached[0] == chart_data:
+        return cached[1]
+    fig = build(chart_data)
+    cache.put(('figure',) + key, (chart_data, fig))
+    return fig
+
+def series_figure(chart_json, kind):
+    """Pizza, barras ou treemap de um gráfico JSON de séries, limitado aos maiores itens (o resto vira "Outras")."""
+    import plotly.graph_objects as go
+
+    series = top_series(chart_json['series'])
+    labels = [s['name'] for s in series]
+    values = [s['data'] for s in series]
+    if kind == "Barras":
+        fig = go.Figure(data=[go.Bar(x=labels, y=values)])
+    elif kind == "Treemap":
+        fig = go.Figure(data=[go.Treemap(labels=labels, parents=[""] * len(labels), values=values)])
+    else:
+        fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
+    fig.update_layout(title_text=chart_json['title']['text'])
+    return fig
+
+def deputy_chart_data(deputy_id, snapshot):
+    """Os três gráficos JSON do deputado: [(título, dados)], calculados uma vez por versão dos dados."""
+    key = ('deputy_charts', deputy_id, snapshot.version)
+    charts = chart_cache().get(key)
+    if charts is not None:
+        return charts
+    deputy = snapshot.get_deputy_by_id(deputy_id)
+    if deputy is None:
+        return []
+    contributions_by_category_for_display = {
+        category: [{'emenda': emenda, 'contrib_detail': contrib_detail, 'status': status}
+                   for emenda, contrib_detail, status in items]
+        for category, items in st.session_state.report_generator.get_deputy_contributions_by_category(deputy_id, snapshot).items()
+    }
+    charts = [
+        ("Gráfico 1: Verba Alocada por Categoria (Intenção)", generate_allocated_verba_chart_json_streamlit(deputy)),
+        ("Gráfico 2: Pontos de Inclinação por Categoria", generate_inclination_chart_json_streamlit(deputy)),
+        ("Gráfico 3: Verba Efetivamente Contribuída para Emendas (por Categoria)",
+         generate_contributed_emendas_chart_json_streamlit(deputy, contributions_by_category_for_display)),
+    ]
+    chart_cache().put(key, charts)
+    return charts
+
+@st.fragment
+def deputy_charts(deputy_id):
+    # Fragmento: trocar de gráfico ou de tipo reexecuta só esta parte, e só o gráfico escolhido é montado
+    st.subheader("Gráficos de Distribuição")
+    charts = dict(deputy_chart_data(deputy_id, st.session_state.snapshot_store.current()))
+    if not charts:
+        return
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        title = st.selectbox("Gráfico", list(charts), key='deputy_chart_choice')
+    with col2:
+        kind = st.radio("Tipo", CHART_KINDS, horizontal=True, key='deputy_chart_kind')
+    with col3:
+        show_json = st.checkbox("Dados (JSON)", key='deputy_chart_json')
+    chart_json = charts[title]
+    if not chart_json:
+        st.info(f"{title} - Sem dados para exibir.")
+        return
+    st.plotly_chart(cached_figure(('deputy', deputy_id, title, kind), chart_json, lambda data: series_figure(data, kind)),
+                    width='stretch')
+    if show_json:
+        st.json(chart_json)
 
 
 def distribute_deputy_funds_by_category_streamlit():
@@ -335,52 +503,59 @@ def distribute_deputy_funds_by_category_streamlit():
         deputy = st.session_state.deputy_manager.get_deputy_by_id(selected_deputy_id)
 
         if deputy:
-            st.write(f"Verba Total Disponível: R${deputy.total_verba_disponivel:,.2f}")
-            st.write(f"Verba Já Alocada (Intenção): R${deputy.get_allocated_total():,.2f}")
-            st.write(f"Verba Remanescente para Distribuição Livre: R${deputy.get_remaining_verba():,.2f}")
+            deputy_allocations_editor(deputy.id)
 
-            new_allocations = deputy.allocated_by_category.copy()
+@st.fragment
+def deputy_allocations_editor(deputy_id):
+    # Fragmento: cada valor digitado reexecuta só o editor; salvar com sucesso faz o rerun completo
+    deputy = st.session_state.deputy_manager.get_deputy_by_id(deputy_id)
+    if deputy is None:
+        return
+    blocked = edits_blocked()
+    st.write(f"Verba Total Disponível: R${deputy.total_verba_disponivel:,.2f}")
+    st.write(f"Verba Já Alocada (Intenção): R${deputy.get_allocated_total():,.2f}")
+    st.write(f"Verba Remanescente para Distribuição Livre: R${deputy.get_remaining_verba():,.2f}")
 
-            if new_allocations:
-                st.subheader("Alocações por Categoria Atuais (Intenção):")
-                for cat, val in sorted(new_allocations.items()):
-                    st.write(f"  - {cat}: R${val:,.2f}")
-            else:
-                st.info("Nenhuma alocação por categoria definida ainda.")
+    new_allocations = deputy.allocated_by_category.copy()
 
-            st.markdown("---")
-            st.subheader("Definir Novas Alocações/Ajustes")
-            
-            categories_available = st.session_state.category_manager.list_categories()
-            if not categories_available:
-                st.warning("Nenhuma categoria cadastrada. Por favor, adicione categorias na seção 'Gerenciar Categorias'.")
-                return
+    if new_allocations:
+        st.subheader("Alocações por Categoria Atuais (Intenção):")
+        for cat, val in sorted(new_allocations.items()):
+            st.write(f"  - {cat}: R${val:,.2f}")
+    else:
+        st.info("Nenhuma alocação por categoria definida ainda.")
 
-            st.write("Ajuste os valores para as categorias abaixo. Digite 0 para remover uma categoria da alocação.")
-            
-            updated_allocations = {}
-            for cat in categories_available:
-                current_value = new_allocations.get(cat, 0.0)
-                new_value = st.number_input(f"Valor para '{cat}' (R$)", value=float(current_value), min_value=0.0, format="%.2f", key=f"alloc_{deputy.id}_{cat}")
-                if new_value > 0: 
-                    updated_allocations[cat] = new_value
-            
-            current_allocated_sum = sum(updated_allocations.values())
-            st.info(f"Total alocado (Intenção) até agora: R${current_allocated_sum:,.2f}. Remanescente para distribuição livre: R${deputy.total_verba_disponivel - current_allocated_sum:,.2f}")
+    st.markdown("---")
+    st.subheader("Definir Novas Alocações/Ajustes")
 
-            if st.button("Salvar Alocações"):
-                if current_allocated_sum > deputy.total_verba_disponivel and not math.isclose(current_allocated_sum, deputy.total_verba_disponivel):
-                    st.error(f"AVISO: A soma alocada (R${current_allocated_sum:,.2f}) excede a verba total disponível do deputado (R${deputy.total_verba_disponivel:,.2f}). Por favor, ajuste.")
-                else:
-                    success, message = st.session_state.deputy_manager.update_deputy_allocations(deputy.id, updated_allocations)
-                    if success:
-                        deputy.needs_reallocation = True
-                        st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
-                        st.success(message)
-                        st.warning("!!! ATENÇÃO: As intenções de verba foram alteradas. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
-                        st.rerun()
-                    else:
-                        st.error(message)
+    categories_available = st.session_state.category_manager.list_categories()
+    if not categories_available:
+        st.warning("Nenhuma categoria cadastrada. Por favor, adicione categorias na seção 'Gerenciar Categorias'.")
+        return
+
+    st.write("Ajuste os valores para as categorias abaixo. Digite 0 para remover uma categoria da alocação.")
+
+    updated_allocations = {}
+    for cat in categories_available:
+        current_value = new_allocations.get(cat, 0.0)
+        new_value = st.number_input(f"Valor para '{cat}' (R$)", value=float(current_value), min_value=0.0, format="%.2f", key=f"alloc_{deputy.id}_{cat}")
+        if new_value > 0: 
+            updated_allocations[cat] = new_value
+
+    current_allocated_sum = sum(updated_allocations.values())
+    st.info(f"Total alocado (Intenção) até agora: R${current_allocated_sum:,.2f}. Remanescente para distribuição livre: R${deputy.total_verba_disponivel - current_allocated_sum:,.2f}")
+
+    if st.button("Salvar Alocações", disabled=blocked) and not blocked:
+        if current_allocated_sum > deputy.total_verba_disponivel and not math.isclose(current_allocated_sum, deputy.total_verba_disponivel):
+            st.error(f"AVISO: A soma alocada (R${current_allocated_sum:,.2f}) excede a verba total disponível do deputado (R${deputy.total_verba_disponivel:,.2f}). Por favor, ajuste.")
+        else:
+            success, message = st.session_state.deputy_manager.update_deputy_allocations(deputy.id, updated_allocations)
+            if success:
+                st.success(message)
+                st.warning("!!! ATENÇÃO: As intenções de verba foram alteradas. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
+                st.rerun()
+            else:
+                st.error(message)
 
 def configure_deputy_inclinations_streamlit():
     st.header("Configurar Inclinação por Categoria para Deputado")
@@ -397,53 +572,146 @@ def configure_deputy_inclinations_streamlit():
         deputy = st.session_state.deputy_manager.get_deputy_by_id(selected_deputy_id)
 
         if deputy:
-            st.write(f"A soma das inclinações por categoria não pode exceder 10 pontos.")
-            
-            new_inclinations = deputy.inclinacao_por_categoria.copy()
-            current_total_inclination_score = sum(new_inclinations.values())
+            deputy_inclinations_editor(deputy.id)
 
-            if new_inclinations:
-                st.subheader("Inclinações Atuais:")
-                for cat, score in new_inclinations.items():
-                    st.write(f"  - {cat}: {score}/10 ({score*10:.2f}% da inclinação total do deputado)")
+@st.fragment
+def deputy_inclinations_editor(deputy_id):
+    # Fragmento: mover um slider reexecuta só o editor; salvar com sucesso faz o rerun completo
+    deputy = st.session_state.deputy_manager.get_deputy_by_id(deputy_id)
+    if deputy is None:
+        return
+    blocked = edits_blocked()
+    st.write(f"A soma das inclinações por categoria não pode exceder 10 pontos.")
+
+    new_inclinations = deputy.inclinacao_por_categoria.copy()
+    current_total_inclination_score = sum(new_inclinations.values())
+
+    if new_inclinations:
+        st.subheader("Inclinações Atuais:")
+        for cat, score in new_inclinations.items():
+            st.write(f"  - {cat}: {score}/10 ({score*10:.2f}% da inclinação total do deputado)")
+    else:
+        st.info("Nenhuma inclinação configurada ainda.")
+
+    st.info(f"Pontos totais distribuídos: {current_total_inclination_score}/10. Pontos restantes para distribuir: {10 - current_total_inclination_score}.")
+
+    st.markdown("---")
+    st.subheader("Definir Novas Inclinações/Ajustes")
+
+    categories_available = st.session_state.category_manager.list_categories()
+    if not categories_available:
+        st.warning("Nenhuma categoria cadastrada. Por favor, adicione categorias na seção 'Gerenciar Categorias'.")
+        return
+
+    st.write("Ajuste as pontuações de inclinação para as categorias abaixo (0 para remover).")
+
+    updated_inclinations = {}
+    for cat in categories_available:
+        current_score = new_inclinations.get(cat, 0)
+        new_score = st.slider(f"Inclinação para '{cat}'", min_value=0, max_value=10, value=current_score, key=f"incl_{deputy.id}_{cat}", help="Pontuação de 0 a 10. 0 para remover a inclinação desta categoria.")
+        if new_score > 0:
+            updated_inclinations[cat] = new_score
+
+    current_total_score = sum(updated_inclinations.values())
+    st.info(f"Pontos totais distribuídos agora: {current_total_score}/10.")
+
+    if st.button("Salvar Inclinações", disabled=blocked) and not blocked:
+        if current_total_score > 10:
+            st.error(f"AVISO: A soma das inclinações ({current_total_score}) excede o limite de 10 pontos. Por favor, ajuste.")
+        else:
+            success, message = st.session_state.deputy_manager.update_deputy_inclinations(deputy.id, updated_inclinations)
+            if success:
+                st.success(message)
+                st.warning("!!! ATENÇÃO: As inclinações foram alteradas. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
+                st.rerun()
             else:
-                st.info("Nenhuma inclinação configurada ainda.")
-            
-            st.info(f"Pontos totais distribuídos: {current_total_inclination_score}/10. Pontos restantes para distribuir: {10 - current_total_inclination_score}.")
+                st.error(message)
 
-            st.markdown("---")
-            st.subheader("Definir Novas Inclinações/Ajustes")
+# Campo editado pela matriz -> (rótulo, configuração das colunas de categoria)
+CATEGORY_MATRIX_FIELDS = {
+    "Alocações por Categoria (R$)": ('allocated_by_category', dict(min_value=0.0, format="%.2f")),
+    "Inclinações (pontos de 0 a 10)": ('inclinacao_por_categoria', dict(min_value=0, max_value=10, step=1, format="%d")),
+}
 
-            categories_available = st.session_state.category_manager.list_categories()
-            if not categories_available:
-                st.warning("Nenhuma categoria cadastrada. Por favor, adicione categorias na seção 'Gerenciar Categorias'.")
-                return
-            
-            st.write("Ajuste as pontuações de inclinação para as categorias abaixo (0 para remover).")
-
-            updated_inclinations = {}
-            for cat in categories_available:
-                current_score = new_inclinations.get(cat, 0)
-                new_score = st.slider(f"Inclinação para '{cat}'", min_value=0, max_value=10, value=current_score, key=f"incl_{deputy.id}_{cat}", help="Pontuação de 0 a 10. 0 para remover a inclinação desta categoria.")
-                if new_score > 0:
-                    updated_inclinations[cat] = new_score
-            
-            current_total_score = sum(updated_inclinations.values())
-            st.info(f"Pontos totais distribuídos agora: {current_total_score}/10.")
+def category_matrix_page():
+    st.header("Editar Alocações e Inclinações em Lote")
+    deputies = st.session_state.deputy_manager.list_deputies()
+    if not deputies:
+        st.info("Nenhum deputado cadastrado.")
+        return
+    if not st.session_state.category_manager.list_categories():
+        st.warning("Nenhuma categoria cadastrada. Por favor, adicione categorias na seção 'Gerenciar Categorias'.")
+        return
+    field_label = st.radio("Editar", list(CATEGORY_MATRIX_FIELDS), horizontal=True, key='category_matrix_field')
+    category_matrix_editor(CATEGORY_MATRIX_FIELDS[field_label][0])
 
-            if st.button("Salvar Inclinações"):
-                if current_total_score > 10:
-                    st.error(f"AVISO: A soma das inclinações ({current_total_score}) excede o limite de 10 pontos. Por favor, ajuste.")
-                else:
-                    success, message = st.session_state.deputy_manager.update_deputy_inclinations(deputy.id, updated_inclinations)
-                    if success:
-                        deputy.needs_reallocation = True
-                        st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
-                        st.success(message)
-                        st.warning("!!! ATENÇÃO: As inclinações foram alteradas. Este deputado foi marcado para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' no menu principal para aplicar as mudanças. !!!")
-                        st.rerun()
-                    else:
-                        st.error(message)
+def category_matrix_frame(deputies, categories, field):
+    """Matriz deputado × categoria do campo (0 onde o deputado não tem valor para a categoria)."""
+    rows = [[d.id, d.name, d.total_verba_disponivel] + [getattr(d, field).get(cat, 0) for cat in categories] for d in deputies]
+    return pd.DataFrame(rows, columns=["ID", "Deputado", "Verba Total"] + list(categories))
+
+@st.fragment
+def category_matrix_editor(field):
+    # Fragmento: editar células reexecuta só a matriz; salvar grava todas as mudanças de uma vez
+    deputies = st.session_state.deputy_manager.list_deputies()
+    categories = st.session_state.category_manager.list_categories()
+    column_options = next(options for name, options in CATEGORY_MATRIX_FIELDS.values() if name == field)
+    original = category_matrix_frame(deputies, categories, field)
+    blocked = edits_blocked()
+
+    st.write("Edite as células como em uma planilha (0 remove a categoria). As alterações só são gravadas ao salvar.")
+    generation = st.session_state.get('category_matrix_generation', 0) # Muda a cada gravação para recarregar a matriz
+    edited = st.data_editor(
+        original, key=f"category_matrix_{field}_{generation}", hide_index=True, width='stretch', num_rows='fixed',
+        disabled=True if blocked else ["ID", "Deputado", "Verba Total"],
+        column_config={
+            "Verba Total": st.column_config.NumberColumn(format="R$ %.2f"),
+            **{cat: st.column_config.NumberColumn(cat, **column_options) for cat in categories},
+        },
+    )
+
+    values = edited[categories].fillna(0)
+    if field == 'inclinacao_por_categoria':
+        values = values.round().astype(int)
+    changed_cells = values.ne(original[categories])
+    changed_rows = changed_cells.any(axis=1)
+    totals = values.sum(axis=1)
+    if field == 'allocated_by_category':
+        over_limit = totals > original["Verba Total"] + 1e-6
+        limit_message = "Soma das alocações acima da verba total"
+    else:
+        over_limit = totals > 10
+        limit_message = "Soma das inclinações acima de 10 pontos"
+    if over_limit.any():
+        st.warning(f"{limit_message}: " + ", ".join(original.loc[over_limit, "Deputado"]))
+
+    st.caption(f"{int(changed_cells.to_numpy().sum())} célula(s) alterada(s) em {int(changed_rows.sum())} deputado(s).")
+    if not st.button("Salvar Alterações", disabled=blocked or not changed_rows.any(), key=f"category_matrix_save_{field}") or blocked:
+        return
+
+    new_values = {}
+    for position in changed_rows[changed_rows].index:
+        row = values.loc[position]
+        cast = int if field == 'inclinacao_por_categoria' else float
+        new_values[int(original.at[position, "ID"])] = {cat: cast(row[cat]) for cat in categories if row[cat] > 0}
+    if field == 'allocated_by_category':
+        success, message, errors = st.session_state.deputy_manager.update_category_matrix(allocations_by_id=new_values)
+    else:
+        success, message, errors = st.session_state.deputy_manager.update_category_matrix(inclinations_by_id=new_values)
+    if not success:
+        st.error(message)
+        if errors is not None and not errors.empty:
+            names = {d.id: d.name for d in deputies}
+            st.dataframe(pd.DataFrame({
+                "Deputado": errors['id'].map(names),
+                "Categoria": errors['category'],
+                "Valor": errors['value'],
+                "Problema": errors['message'],
+            }), width='stretch', hide_index=True)
+        return
+    st.session_state.category_matrix_generation = generation + 1
+    st.toast(f"{message} Os deputados alterados foram marcados para redistribuição.")
+    st.rerun()
 
 def delete_deputy_streamlit():
     st.header("Excluir Deputado")
@@ -460,60 +728,72 @@ def delete_deputy_streamlit():
         deputy_name = st.session_state.deputy_manager.get_deputy_by_id(deputy_id_to_delete).name
 
         st.warning(f"Você tem certeza que deseja excluir o deputado '{deputy_name}' (ID: {deputy_id_to_delete})?")
-        if st.button(f"Confirmar Exclusão de {deputy_name}"):
+        blocked = edits_blocked()
+        if st.button(f"Confirmar Exclusão de {deputy_name}", disabled=blocked) and not blocked:
             success, message = st.session_state.deputy_manager.delete_deputy(deputy_id_to_delete)
             if success:
                 st.success(message)
-                for d in st.session_state.deputy_manager.list_deputies():
-                    d.needs_reallocation = True
-                st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
                 st.warning("Um deputado foi excluído. Todos os deputados foram marcados para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' para aplicar as mudanças.")
                 st.rerun()
             else:
                 st.error(message)
 
 
-def manage_emendas_page():
-    st.title("Gerenciar Emendas Parlamentares")
-
-    menu_emendas = ["Listar Todas", "Cadastrar Nova", "Excluir"]
-    # Usa st.session_state para manter a seleção do submenu de emendas
-    if 'emenda_menu_choice' not in st.session_state:
-        st.session_state['emenda_menu_choice'] = "Listar Todas"
-
-    choice = st.sidebar.selectbox("Opções de Emendas", menu_emendas, key='emenda_menu_choice')
-
-    if choice == "Listar Todas":
-        display_all_emendas_streamlit()
-    elif choice == "Cadastrar Nova":
-        add_new_emenda_streamlit()
-    elif choice == "Excluir":
-        delete_emenda_streamlit()
+EMENDA_LISTING_LABELS = {
+    'id': "ID", 'description': "Descrição", 'categoria': "Categoria", 'valor_necessario': "Valor Necessário",
+    'current_funded_amount': "Contemplado", 'missing_amount': "Faltante", 'status': "Status",
+}
 
+@st.fragment
 def display_all_emendas_streamlit():
     st.header("Lista de Todas as Emendas")
-    emendas = st.session_state.emenda_manager.list_emendas()
-    if not emendas:
+    snapshot = st.session_state.snapshot_store.current()
+    model = st.session_state.report_generator.get_report_model(snapshot)
+    emendas = model.emendas
+    if emendas.empty:
         st.info("Nenhuma emenda cadastrada.")
         return
 
-    emendas_by_category = {}
-    for emenda in emendas:
-        emendas_by_category.setdefault(emenda.categoria, []).append(emenda)
-    
-    total_geral_emendas = 0
-    for category in sorted(emendas_by_category.keys()):
-        category_emendas = emendas_by_category[category]
-        total_category_value = sum(e.valor_necessario for e in category_emendas)
-        total_geral_emendas += total_category_value
-        
-        st.subheader(f"Categoria: {category} (Total: R${total_category_value:,.2f})")
-        for e in category_emendas:
-            status = "TOTALMENTE" if math.isclose(e.current_funded_amount, e.valor_necessario) or e.current_funded_amount > e.valor_necessario else ("PARCIALMENTE" if e.current_funded_amount > 0 else "NÃO")
-            st.write(f"  - ID: {e.id}, Descrição: {e.description}, Valor Necessário: R${e.valor_necessario:,.2f}, Contemplado: R${e.current_funded_amount:,.2f}, Status: {status} CONTEMPLADA")
-        st.markdown("---")
-    
-    st.markdown(f"**TOTAL GERAL DE TODAS AS EMENDAS: R${total_geral_emendas:,.2f}**")
+    col1, col2, col3 = st.columns([2, 2, 2])
+    with col1:
+        search = st.text_input("Buscar (descrição ou categoria)", key='emenda_listing_search')
+    with col2:
+        categories = st.multiselect("Categorias", sorted(emendas['categoria'].unique()), key='emenda_listing_categories')
+    with col3:
+        statuses = st.multiselect("Status", [STATUS_FULL, STATUS_PARTIAL, STATUS_NONE], key='emenda_listing_statuses')
+    filtered = emendas
+    if search:
+        found = {r.id for r in st.session_state.search_index.search(search, kinds=(KIND_EMENDA,), limit=None)}
+        filtered = filtered[filtered['id'].isin(found)]
+    if categories:
+        filtered = filtered[filtered['categoria'].isin(categories)]
+    if statuses:
+        filtered = filtered[filtered['status'].isin(statuses)]
+
+    selected = paginated_table(filtered, 'emenda_listing', EMENDA_LISTING_LABELS)
+    if selected is not None:
+        emenda_detail_view(model, selected)
+
+    by_category = filtered.groupby('categoria')['valor_necessario'].sum()
+    with st.expander("Total por Categoria"):
+        st.dataframe(by_category.rename("Valor Necessário").rename_axis("Categoria").reset_index(), width='stretch', hide_index=True)
+    st.markdown(f"**TOTAL GERAL DAS EMENDAS LISTADAS: R\\${by_category.sum():,.2f}** (de R\\${emendas['valor_necessario'].sum():,.2f} no total)")
+
+def emenda_detail_view(model, emenda):
+    st.subheader(f"Emenda: {emenda['description']} (ID: {emenda['id']})")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Categoria", emenda['categoria'])
+    col2.metric("Valor Necessário", f"R$ {emenda['valor_necessario']:,.2f}")
+    col3.metric("Contemplado", f"R$ {emenda['current_funded_amount']:,.2f}")
+    col4.metric("Faltante", f"R$ {emenda['missing_amount']:,.2f}")
+    st.write(f"Status: {emenda['status']}")
+    contributions = model.contributions_of_emenda(int(emenda['id']))
+    st.write("**Contribuições dos Deputados:**")
+    if contributions.empty:
+        st.write("Nenhuma contribuição registrada.")
+    else:
+        st.dataframe(contributions.drop(columns=['emenda_id', 'categoria']).rename(columns=COLUMN_LABELS),
+                     width='stretch', hide_index=True)
 
 def add_new_emenda_streamlit():
     st.header("Cadastrar Nova Emenda")
@@ -538,28 +818,22 @@ def add_new_emenda_streamlit():
                 st.rerun() # Força a re-renderização para mostrar o formulário limpo
         with col2:
             if st.button("Ver Lista de Emendas"):
-                # Define flags temporárias para a navegação na próxima execução do script
-                st.session_state['__nav_target_main_menu'] = "Gerenciar Emendas"
-                st.session_state['__nav_target_emenda_menu'] = "Listar Todas"
                 if 'show_emenda_add_options' in st.session_state: del st.session_state['show_emenda_add_options']
                 if 'emenda_add_success_message' in st.session_state: del st.session_state['emenda_add_success_message']
                 if 'emenda_add_warning_message' in st.session_state: del st.session_state['emenda_add_warning_message']
-                st.rerun() # Força a re-renderização para a nova página
+                st.switch_page(PAGES['emendas'])
     else: # Exibe o formulário de cadastro
+        blocked = edits_blocked()
         with st.form("add_emenda_form"):
             description = st.text_input("Descrição da Emenda")
             valor = st.number_input("Valor Necessário (R$)", min_value=0.01, format="%.2f")
             categoria_name = st.selectbox("Selecione a Categoria", categories_available)
             
-            submitted = st.form_submit_button("Cadastrar Emenda")
-            if submitted:
+            submitted = st.form_submit_button("Cadastrar Emenda", disabled=blocked)
+            if submitted and not blocked:
                 if description and valor > 0 and categoria_name:
                     emenda = st.session_state.emenda_manager.add_emenda(description, valor, categoria_name)
                     st.session_state['emenda_add_success_message'] = f"Emenda '{emenda.description}' (ID: {emenda.id}) cadastrada com sucesso!"
-                    
-                    for deputy in st.session_state.deputy_manager.list_deputies():
-                        deputy.needs_reallocation = True
-                    st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
                     st.session_state['emenda_add_warning_message'] = "Uma nova emenda foi adicionada. Todos os deputados foram marcados para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' para aplicar as mudanças."
                     
                     # Seta a flag para exibir as opções pós-submissão
@@ -583,13 +857,11 @@ def delete_emenda_streamlit():
         emenda_desc = st.session_state.emenda_manager.get_emenda_by_id(emenda_id_to_delete).description
 
         st.warning(f"Você tem certeza que deseja excluir a emenda '{emenda_desc}' (ID: {emenda_id_to_delete})?")
-        if st.button(f"Confirmar Exclusão de Emenda {emenda_desc}"):
+        blocked = edits_blocked()
+        if st.button(f"Confirmar Exclusão de Emenda {emenda_desc}", disabled=blocked) and not blocked:
             success, message = st.session_state.emenda_manager.delete_emenda(emenda_id_to_delete)
             if success:
                 st.success(message)
-                for d in st.session_state.deputy_manager.list_deputies():
-                    d.needs_reallocation = True
-                st.session_state.data_manager.save_deputies(st.session_state.deputy_manager.deputies)
                 st.warning("Uma emenda foi excluída. Todos os deputados foram marcados para uma futura redistribuição de verbas. Você deve executar a opção 'Otimizar Distribuição de Verbas' para aplicar as mudanças.")
                 st.rerun()
             else:
@@ -597,14 +869,15 @@ def delete_emenda_streamlit():
 
 def manage_categories_page():
     st.title("Gerenciar Categorias")
+    blocked = edits_blocked()
 
     # Seção para Adicionar Categoria
     st.subheader("Adicionar Nova Categoria")
     with st.form("add_category_form"):
         new_category_name = st.text_input("Nome da Categoria:", key="new_category_input")
-        submitted = st.form_submit_button("Adicionar Categoria")
+        submitted = st.form_submit_button("Adicionar Categoria", disabled=blocked)
 
-        if submitted:
+        if submitted and not blocked:
             success, message = st.session_state.category_manager.add_category(new_category_name)
             if success:
                 st.success(message)
@@ -646,7 +919,7 @@ def manage_categories_page():
             if is_in_use:
                 st.button("Excluir", key=f"delete_cat_{cat}", disabled=True, help=f"Não pode excluir: {reason}")
             else:
-                if st.button("Excluir", key=f"delete_cat_{cat}"):
+                if st.button("Excluir", key=f"delete_cat_{cat}", disabled=blocked) and not blocked:
                     success, message = st.session_state.category_manager.delete_category(cat)
                     if success:
                         st.success(message)
@@ -666,6 +939,12 @@ def optimize_distribution_page():
         st.info("Nenhuma emenda cadastrada para otimizar distribuição.")
         return
 
+    runner = st.session_state.optimization_runner
+    if runner.running:
+        # Só o painel de progresso é reexecutado enquanto a otimização roda
+        st.fragment(optimization_progress_panel, run_every=OPTIMIZATION_PROGRESS_REFRESH_SECONDS)()
+        return
+
     if deputies_needing_reallocation:
         st.subheader("Deputados marcados para realocação:")
         for d in deputies_needing_reallocation:
@@ -676,25 +955,172 @@ def optimize_distribution_page():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Otimização Geral", help="Reinicia toda a distribuição de verbas."):
-                with st.spinner('Realizando otimização geral...'):
-                    message = st.session_state.optimizer.perform_full_redistribution()
-                st.success(message)
-                st.rerun()
+                start_optimization(MODE_FULL)
         with col2:
             if st.button("Otimização Parcial", help="Otimiza apenas a verba dos deputados marcados."):
-                with st.spinner('Realizando otimização parcial...'):
-                    deputy_ids_to_reallocate = [d.id for d in deputies_needing_reallocation]
-                    message = st.session_state.optimizer.perform_partial_redistribution(deputy_ids_to_reallocate)
-                st.success(message)
-                st.rerun()
+                start_optimization(MODE_PARTIAL, [d.id for d in deputies_needing_reallocation])
     else:
         st.info("Nenhum deputado marcado para realocação específica.")
         st.write("Você pode executar uma otimização geral para recalcular toda a distribuição.")
         if st.button("Executar Otimização Geral"):
-            with st.spinner('Realizando otimização geral...'):
-                message = st.session_state.optimizer.perform_full_redistribution()
-            st.success(message)
-            st.rerun()
+            start_optimization(MODE_FULL)
+
+    last_optimization_view(runner.job)
+
+OPTIMIZATION_PROGRESS_REFRESH_SECONDS = 1
+
+def start_optimization(mode, deputy_ids=None):
+    """Agenda a otimização em segundo plano; a página passa a acompanhar o progresso."""
+    success, message, _ = st.session_state.optimization_runner.submit(mode, deputy_ids)
+    if success:
+        st.rerun()
+    else:
+        st.error(message)
+
+def optimization_progress_panel():
+    runner = st.session_state.optimization_runner
+    job = runner.job
+    if not runner.running:
+        st.rerun() # Terminou: rerun completo para exibir o resultado e registrar a nova versão
+    st.subheader("Otimização em Andamento")
+    st.progress(job.progress, text=f"{job.phase} ({job.progress:.0%})")
+    st.caption(f"Iniciada há {time.time() - job.submitted_at:.0f}s. As páginas de relatório continuam mostrando o último resultado confirmado.")
+    if job.cancel_requested:
+        st.info("Cancelamento solicitado; aguardando o otimizador parar...")
+    elif st.button("Cancelar Otimização", key='cancel_optimization'):
+        runner.cancel()
+        st.rerun(scope='fragment')
+
+def last_optimization_view(job):
+    if job is None or not job.done:
+        return
+    st.markdown("---")
+    st.subheader("Resultado da Última Otimização")
+    if job.status == STATUS_CANCELLED:
+        st.warning(job.phase)
+        return
+    if job.status != STATUS_DONE:
+        st.error(job.phase)
+        return
+    st.success(job.message)
+    diff = job.diff
+    if diff.is_empty:
+        st.info("A otimização não alterou nenhuma contribuição.")
+        return
+    summary = diff.summary()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Contribuições Novas", summary['new'])
+    col2.metric("Alteradas / Removidas", f"{summary['changed']} / {summary['removed']}")
+    col3.metric("Mudanças de Status", summary['status_transitions'])
+    col4.metric("Deputados Afetados", summary['deputies'])
+    tables = diff.display_tables()
+    for tab, (title, table) in zip(st.tabs(list(tables)), tables.items()):
+        with tab:
+            st.dataframe(table, width='stretch', hide_index=True)
+
+REPORT_SECTIONS_PER_PAGE_OPTIONS = [10, 25, 50]
+
+@st.fragment
+def report_detail_view():
+    # Todo o relatório vem do mesmo snapshot; só as seções da página atual são geradas
+    report_generator = st.session_state.report_generator
+    snapshot = st.session_state.snapshot_store.current()
+    sections = report_generator.list_report_sections(snapshot)
+    section_by_title = {title: key for key, title in sections} # Os títulos incluem o ID do deputado, logo são únicos
+
+    selected_title = st.selectbox(
+        "Ir para a seção",
+        options=["Todas (paginado)"] + list(section_by_title),
+        key='report_section_selection'
+    )
+    selected_section = section_by_title.get(selected_title)
+    if selected_section is not None:
+        st.text("\n".join(report_generator.iter_section_lines(selected_section, snapshot)))
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            per_page = st.selectbox("Seções por página", REPORT_SECTIONS_PER_PAGE_OPTIONS, key='report_sections_per_page')
+        total_pages = max(1, math.ceil(len(sections) / per_page))
+        if st.session_state.get('report_page', 1) > total_pages:
+            st.session_state.report_page = total_pages # Menos páginas após mudar o tamanho da página ou excluir deputados
+        with col2:
+            page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1, step=1, key='report_page')
+        start = (page - 1) * per_page
+        for section_key, _ in sections[start:start + per_page]:
+            st.text("\n".join(report_generator.iter_section_lines(section_key, snapshot)))
+
+    if st.button("Exportar Relatório Completo (.txt)"):
+        export_path = os.path.join(st.session_state.data_manager.data_dir, 'exports', f"relatorio_v{snapshot.version}.txt")
+        with st.spinner('Gravando relatório...'):
+            line_count = report_generator.write_report(export_path, snapshot)
+        st.success(f"Relatório exportado para '{export_path}' ({line_count} linhas).")
+
+def report_tables_view():
+    # Mesmas tabelas (ReportModel) que alimentam o relatório em texto e os gráficos
+    tables = st.session_state.report_generator.get_report_model().display_tables()
+    tabs = st.tabs(list(tables))
+    for tab, (title, table) in zip(tabs, tables.items()):
+        with tab:
+            st.dataframe(table, width='stretch', hide_index=title != "Deputado × Categoria")
+            st.download_button(
+                f"Baixar '{title}' (.csv)",
+                data=table.to_csv(index=title == "Deputado × Categoria").encode('utf-8'),
+                file_name=f"{title.lower().replace(' × ', '_').replace(' ', '_')}.csv",
+                mime='text/csv',
+                key=f"download_table_{title}"
+            )
+
+DOCUMENT_FORMATS = {"HTML": 'html', "PDF": 'pdf'}
+
+DOCUMENT_PROGRESS_REFRESH_SECONDS = 1
+
+def report_documents_view():
+    # Enquanto houver documento renderizando, só este fragmento é reexecutado periodicamente
+    renderer = st.session_state.document_renderer
+    snapshot = st.session_state.snapshot_store.current()
+    rendering = any(job is not None and not job.done for job in (renderer.get_job(fmt, snapshot) for fmt in DOCUMENT_FORMATS.values()))
+    st.fragment(report_documents_panel, run_every=DOCUMENT_PROGRESS_REFRESH_SECONDS if rendering else None)(rendering)
+
+def report_documents_panel(polling):
+    renderer = st.session_state.document_renderer
+    snapshot = st.session_state.snapshot_store.current()
+    jobs = {fmt: renderer.get_job(fmt, snapshot) for fmt in DOCUMENT_FORMATS.values()}
+    if polling and all(job is None or job.done for job in jobs.values()):
+        st.rerun() # Renderização concluída: rerun completo para desligar a atualização periódica
+    cols = st.columns(len(DOCUMENT_FORMATS))
+    for col, (label, fmt) in zip(cols, DOCUMENT_FORMATS.items()):
+        with col:
+            job = jobs[fmt]
+            if job is None or job.status == STATUS_FAILED:
+                if job is not None:
+                    st.error(job.message)
+                if st.button(f"Gerar {label}", key=f"render_document_{fmt}"):
+                    renderer.submit(fmt, snapshot)
+                    st.rerun() # Rerun completo: o fragmento passa a se atualizar sozinho
+            elif not job.done:
+                st.progress(job.progress, text=job.message)
+            else:
+                st.download_button(f"Baixar {label}", data=job.data, file_name=job.file_name, mime=job.mime,
+                                   key=f"download_document_{fmt}")
+                st.caption(f"Gerado para a versão {job.version} dos dados.")
+
+def distribution_analytics_view():
+    analytics = st.session_state.report_generator.get_distribution_analytics()
+    indicators = analytics.indicators
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cobertura Geral", f"{indicators['coverage']:.1%}", help="Valor contemplado / valor necessário de todas as emendas.")
+    col2.metric("Intenção Atendida", f"{indicators['intention_honoured']:.1%}", help="Parcela da verba alocada por categoria que virou contribuição.")
+    col3.metric("Gini entre Deputados", f"{indicators['deputy_gini']:.2f}", help="Desigualdade do total contribuído por deputado (0 = igual, 1 = concentrado).")
+    col4.metric("HHI Médio por Emenda", f"{indicators['mean_emenda_hhi']:.2f}", help="Concentração média do financiamento de cada emenda entre deputados (1 = um único deputado).")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Gini entre Emendas", f"{indicators['emenda_gini']:.2f}", help="Desigualdade do valor contemplado por emenda.")
+    col2.metric("Intenção Não Utilizada", f"R${indicators['unused_intention']:,.2f}")
+    col3.metric("Verba Livre Não Utilizada", f"R${indicators['unused_free_verba']:,.2f}",
+                help="Verba total dos deputados menos o valor efetivamente gasto nas contribuições (da intenção e da verba livre).")
+    tables = analytics.display_tables()
+    for tab, (title, table) in zip(st.tabs(list(tables)), tables.items()):
+        with tab:
+            st.dataframe(table, width='stretch', hide_index=True)
 
 def reports_page():
     st.title("Relatórios de Distribuição")
@@ -703,24 +1129,176 @@ def reports_page():
         return
 
     st.subheader("Relatório Detalhado")
-    report_text = st.session_state.report_generator.generate_report()
-    st.text(report_text) 
+    report_detail_view()
+
+    st.subheader("Tabelas")
+    report_tables_view()
+
+    st.subheader("Indicadores de Distribuição")
+    distribution_analytics_view()
+
+    st.subheader("Documentos Formatados (HTML/PDF)")
+    report_documents_view()
+
+    st.subheader("Gráficos")
+    report_charts_view()
+
+REPORT_CHARTS = ["Uso da Verba", "Contemplado e Faltante por Categoria", "Emendas por Categoria"]
+
+def category_bar_figure(chart_json):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[go.Bar(name=s['name'], x=chart_json['categories'], y=s['data']) for s in chart_json['series']])
+    fig.update_layout(barmode='stack', title_text=chart_json['title']['text'])
+    return fig
+
+def emenda_treemap_figure(chart_json):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[go.Treemap(
+        ids=chart_json['ids'], labels=chart_json['labels'], parents=chart_json['parents'], values=chart_json['values'],
+        customdata=chart_json['funded'], branchvalues='total',
+        hovertemplate="%{label}<br>Necessário: R$ %{value:,.2f}<br>Contemplado: R$ %{customdata:,.2f}<extra></extra>",
+    )])
+    fig.update_layout(title_text=chart_json['title']['text'])
+    return fig
+
+@st.fragment
+def report_charts_view():
+    # Os gráficos chegam agregados do ReportGenerator (memoizados por versão): poucas dezenas de pontos por figura
+    report_generator = st.session_state.report_generator
+    snapshot = st.session_state.snapshot_store.current()
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        choice = st.radio("Gráfico", REPORT_CHARTS, horizontal=True, key='report_chart_choice')
+    with col2:
+        show_json = st.checkbox("Dados (JSON)", key='report_chart_json')
+    if choice == "Uso da Verba":
+        chart_json = report_generator.get_summary_for_chart(snapshot)
+        fig = cached_figure(('report', choice), chart_json, lambda data: series_figure(data, "Pizza"))
+    elif choice == "Contemplado e Faltante por Categoria":
+        chart_json = report_generator.get_category_chart(snapshot)
+        fig = cached_figure(('report', choice), chart_json, category_bar_figure)
+    else:
+        chart_json = report_generator.get_emenda_treemap(snapshot)
+        fig = cached_figure(('report', choice), chart_json, emenda_treemap_figure)
+    st.plotly_chart(fig, width='stretch')
+    if show_json:
+        st.json(chart_json)
+
+
+SEARCH_SCOPES = {"Tudo": None, "Emendas": (KIND_EMENDA,), "Deputados": (KIND_DEPUTY,)}
+SEARCH_RESULTS_LIMIT = 100
+SEARCH_KIND_LABELS = {KIND_EMENDA: "Emenda", KIND_DEPUTY: "Deputado"}
+
+def search_page():
+    st.title("Buscar Emendas e Deputados")
+    search_view()
+
+@st.fragment
+def search_view():
+    # Fragmento: cada busca reexecuta só esta parte; a consulta vai ao índice, sem percorrer as emendas
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        query = st.text_input("Termos da busca", placeholder="Ex.: clinica gama, saude, psol", key='search_query')
+    with col2:
+        scope = st.selectbox("Buscar em", list(SEARCH_SCOPES), key='search_scope')
+    if not query.strip():
+        st.info("Digite termos da descrição ou categoria de uma emenda, ou do nome ou perfil de um deputado. "
+                "Acentos e maiúsculas são ignorados, e palavras incompletas também são encontradas.")
+        return
 
-    st.subheader("Gráfico de Sumário de Uso de Verba (JSON)")
-    summary_chart_data = st.session_state.report_generator.get_summary_for_chart()
-    
-    if summary_chart_data:
-        labels = [s['name'] for s in summary_chart_data['series']]
-        values = [s['data'] for s in summary_chart_data['series']]
-        fig = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
-        fig.update_layout(title_text=summary_chart_data['title']['text'])
-        st.plotly_chart(fig, use_container_width=True)
-        st.json(summary_chart_data) 
+    started = time.perf_counter()
+    results = st.session_state.search_index.search(query, kinds=SEARCH_SCOPES[scope], limit=SEARCH_RESULTS_LIMIT)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    st.caption(f"{len(results)} resultado(s) em {elapsed_ms:.1f} ms" + (f" (mostrando os {SEARCH_RESULTS_LIMIT} mais relevantes)" if len(results) == SEARCH_RESULTS_LIMIT else ""))
+    if not results:
+        st.info("Nenhum resultado encontrado.")
+        return
+
+    table = pd.DataFrame({
+        "Tipo": [SEARCH_KIND_LABELS[r.kind] for r in results],
+        "ID": [r.id for r in results],
+        "Nome / Descrição": [r.title for r in results],
+        "Categoria": [r.detail or "" for r in results],
+        "Relevância": [round(r.score, 2) for r in results],
+    })
+    event = st.dataframe(table, width='stretch', hide_index=True, on_select='rerun', selection_mode='single-row', key='search_results')
+    selected_rows = event.selection.rows if event is not None else []
+    if not selected_rows or selected_rows[0] >= len(results):
+        return
+    result = results[selected_rows[0]]
+    snapshot = st.session_state.snapshot_store.current()
+    if result.kind == KIND_DEPUTY:
+        deputy_detail_view(snapshot, result.id)
     else:
-        st.info("Gráfico de Sumário de Uso de Verba - Sem dados para exibir.")
+        model = st.session_state.report_generator.get_report_model(snapshot)
+        emenda = model.emenda_row(result.id)
+        if emenda is not None:
+            emenda_detail_view(model, emenda)
+
+
+DASHBOARD_GROUPINGS = {"Categoria": 'categoria', "Status da Emenda": 'status', "Partido": 'party', "Deputado": 'deputy_id'}
+
+def dashboard_page():
+    st.title("Painel de Análise")
+    if not st.session_state.deputy_manager.list_deputies() or not st.session_state.emenda_manager.list_emendas():
+        st.info("É necessário cadastrar deputados e emendas para usar o painel.")
+        return
+
+    dashboard_view()
+
+@st.fragment
+def dashboard_view():
+    # Fragmento: mudar um filtro reexecuta só o painel
+    # Cubo materializado uma vez por alocação confirmada; os filtros só consultam agregados prontos
+    cube = st.session_state.report_generator.get_aggregate_cube()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        categories = st.multiselect("Categorias", cube.dimension_values('categoria'), key='dashboard_categories')
+        parties = st.multiselect("Partidos", cube.dimension_values('party'), key='dashboard_parties')
+    with col2:
+        statuses = st.multiselect("Status da Emenda", cube.dimension_values('status'), key='dashboard_statuses')
+        deputy_ids = st.multiselect("Deputados", list(cube.deputy_names), format_func=lambda d_id: cube.deputy_names[d_id], key='dashboard_deputies')
+    filters = {'categoria': categories, 'status': statuses, 'party': parties, 'deputy_id': deputy_ids}
+
+    contributions = cube.contributions(**filters)
+    emendas = cube.emendas(categoria=categories, status=statuses)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Verba Contribuída", f"R${contributions['total']:,.2f}")
+    col2.metric("Da Intenção / Da Verba Livre", f"R${contributions['from_allocated_intention']:,.0f} / R${contributions['from_free_verba']:,.0f}")
+    col3.metric("Contribuições", contributions['count'])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Emendas", emendas['count'])
+    col2.metric("Valor Necessário", f"R${emendas['valor_necessario']:,.2f}")
+    col3.metric("Valor Faltante", f"R${emendas['missing_amount']:,.2f}")
+    if parties or deputy_ids:
+        st.caption("Os totais de emendas consideram apenas os filtros de categoria e status.")
+
+    grouping_label = st.selectbox("Agrupar contribuições por", list(DASHBOARD_GROUPINGS), key='dashboard_grouping')
+    dimension = DASHBOARD_GROUPINGS[grouping_label]
+    breakdown = cube.contributions_by(dimension, **filters)
+    if not breakdown:
+        st.info("Nenhuma contribuição para os filtros selecionados.")
+        return
+    labels = [cube.deputy_names.get(value, f"Deputado ID {value}") if dimension == 'deputy_id' else value for value in breakdown]
+    st.plotly_chart(contribution_breakdown_figure(labels, breakdown, grouping_label), width='stretch')
+
+def contribution_breakdown_figure(labels, breakdown, grouping_label):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=[
+        go.Bar(name="Da Intenção", x=labels, y=[m['from_allocated_intention'] for m in breakdown.values()]),
+        go.Bar(name="Da Verba Livre", x=labels, y=[m['from_free_verba'] for m in breakdown.values()]),
+    ])
+    fig.update_layout(barmode='stack', title_text=f"Verba Contribuída por {grouping_label}")
+    return fig
 
 
 # --- Funções para Geração de Gráficos (JSON) ---
+
 def generate_allocated_verba_chart_json_streamlit(deputy: Deputy):
     series_data = []
     for cat, value in deputy.allocated_by_category.items():
@@ -775,44 +1353,155 @@ def generate_contributed_emendas_chart_json_streamlit(deputy: Deputy, contributi
     return chart
 
 
+def undo_redo_sidebar():
+    history = st.session_state.get('history')
+    if history is None:
+        return # Nenhuma página que altera dados foi aberta: não há o que desfazer
+    optimizing = optimization_running() # Desfazer no meio da otimização corromperia o estado
+    st.sidebar.markdown("---")
+    col1, col2 = st.sidebar.columns(2)
+    with col1:
+        if st.button("↶ Desfazer", disabled=optimizing or not history.can_undo(), help=history.undo_label(), key='undo_button') and not optimizing:
+            success, message = history.undo()
+            st.session_state['history_message'] = message
+            st.rerun()
+    with col2:
+        if st.button("↷ Refazer", disabled=optimizing or not history.can_redo(), help=history.redo_label(), key='redo_button') and not optimizing:
+            success, message = history.redo()
+            st.session_state['history_message'] = message
+            st.rerun()
+    if 'history_message' in st.session_state:
+        st.sidebar.info(st.session_state.pop('history_message'))
+    if optimizing:
+        st.sidebar.warning(EDITS_BLOCKED_MESSAGE)
+
+
 # --- Aplicação Principal Streamlit ---
+METRIC_COLUMNS = {
+    'count': "Amostras", 'last': "Última", 'mean': "Média", 'p50': "p50", 'p90': "p90", 'p99': "p99", 'max': "Máx.",
+}
+
+def metrics_page():
+    st.title("Desempenho")
+    st.caption("Tempos (ms), tamanhos (bytes) e contagens coletados por todas as sessões deste processo. "
+               "Os percentis consideram as amostras mais recentes de cada métrica.")
+    # Sem key: o widget acompanha o estado do registro, que outra sessão também pode ter mudado
+    enabled = st.toggle("Coletar métricas", value=metrics.enabled,
+                        help="Vale para todas as sessões. Também pode ser ligado ao iniciar o processo com EMENDAS_METRICS=1.")
+    if enabled != metrics.enabled:
+        metrics.enabled = enabled
+    if st.button("Zerar métricas"):
+        metrics.reset()
+    metrics_view()
+
+@st.fragment
+def metrics_view():
+    histograms = metrics.histograms()
+    counters = metrics.counters()
+    if not histograms and not counters:
+        st.info("Nenhuma métrica coletada ainda." + ("" if metrics.enabled else " Ligue a coleta e use a aplicação."))
+        return
+    st.caption(f"Coletando desde {time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(metrics.started_at))}.")
+    if st.button("Atualizar", key='metrics_refresh'):
+        st.rerun(scope='fragment')
+
+    if histograms:
+        st.subheader("Tempos e Distribuições")
+        prefix = st.text_input("Filtrar por nome", key='metrics_filter', placeholder="Ex.: page., data., optimizer.")
+        names = sorted(name for name in histograms if name.startswith(prefix.strip()))
+        table = pd.DataFrame([{'Métrica': name, **{label: histograms[name][field] for field, label in METRIC_COLUMNS.items()}}
+                              for name in names])
+        st.dataframe(table, width='stretch', hide_index=True,
+                     column_config={label: st.column_config.NumberColumn(format="%.2f") for field, label in METRIC_COLUMNS.items() if field != 'count'})
+        if names:
+            selected = st.selectbox("Amostras recentes de", names, key='metrics_selected')
+            st.line_chart(pd.Series(metrics.recent(selected), name=selected), height=220)
+
+    if counters:
+        st.subheader("Contadores")
+        st.dataframe(pd.DataFrame(sorted(counters.items()), columns=["Métrica", "Total"]), width='stretch', hide_index=True)
+
+# Subsistemas pedidos pelas páginas: leitura (snapshots/relatórios), busca e edição (histórico e managers)
+READS = ('report_generator',)
+SEARCH = ('report_generator', 'search_index')
+EDITS = ('history',)
+
+# Páginas da navegação nativa (st.navigation): cada execução roda apenas a função da página aberta,
+# depois de criar só os subsistemas que ela usa. (título, função, url, subsistemas) por seção;
+# a primeira página é a inicial
+NAVIGATION = {
+    "": [
+        ("Home", home_page, 'home', ()),
+        ("Buscar", search_page, 'buscar', SEARCH),
+    ],
+    "Deputados": [
+        ("Listar Deputados", display_all_deputies_streamlit, 'deputados', SEARCH),
+        ("Cadastrar Deputado", add_new_deputy_streamlit, 'deputados-cadastrar', EDITS),
+        ("Visualizar/Editar Detalhes", view_edit_deputy_details_streamlit, 'deputados-detalhes', EDITS + READS),
+        ("Distribuir Verba por Categoria", distribute_deputy_funds_by_category_streamlit, 'deputados-verba', EDITS),
+        ("Configurar Inclinação", configure_deputy_inclinations_streamlit, 'deputados-inclinacao', EDITS),
+        ("Editar em Lote", category_matrix_page, 'deputados-matriz', EDITS),
+        ("Excluir Deputado", delete_deputy_streamlit, 'deputados-excluir', EDITS),
+    ],
+    "Emendas": [
+        ("Listar Emendas", display_all_emendas_streamlit, 'emendas', SEARCH),
+        ("Cadastrar Emenda", add_new_emenda_streamlit, 'emendas-cadastrar', EDITS),
+        ("Excluir Emenda", delete_emenda_streamlit, 'emendas-excluir', EDITS),
+        ("Gerenciar Categorias", manage_categories_page, 'categorias', EDITS),
+    ],
+    "Distribuição": [
+        ("Otimizar Distribuição", optimize_distribution_page, 'otimizar', ('optimization_runner',)),
+        ("Relatórios", reports_page, 'relatorios', ('document_renderer',)),
+        ("Painel de Análise", dashboard_page, 'painel', READS),
+    ],
+    "Administração": [
+        ("Desempenho", metrics_page, 'desempenho', ()),
+    ],
+}
+PAGES = {} # {url: st.Page}, para st.switch_page
+PAGE_SUBSYSTEMS = {} # {url: subsistemas da sessão usados pela página}
+
+def build_navigation():
+    sections = {}
+    for section, pages in NAVIGATION.items():
+        sections[section] = []
+        for title, page_function, url_path, subsystems in pages:
+            page = st.Page(page_function, title=title, url_path=url_path, default=not PAGES)
+            PAGES[url_path] = page
+            PAGE_SUBSYSTEMS[url_path] = subsystems
+            sections[section].append(page)
+    return st.navigation(sections)
+
 def main_streamlit_app():
-    initialize_session_state()
-
-    # --- Lógica de navegação centralizada para evitar StreamlitAPIException ---
-    if '__nav_target_main_menu' in st.session_state:
-        st.session_state['main_menu_selection'] = st.session_state.pop('__nav_target_main_menu')
-        # Limpa também os submenus para evitar inconsistências, se eles existirem na flag
-        if '__nav_target_deputy_menu' in st.session_state:
-            st.session_state['deputy_menu_choice'] = st.session_state.pop('__nav_target_deputy_menu')
-        if '__nav_target_emenda_menu' in st.session_state:
-            st.session_state['emenda_menu_choice'] = st.session_state.pop('__nav_target_emenda_menu')
-        # Força o Streamlit a re-executar com o novo estado de navegação
-        st.rerun()
-    # --- Fim da lógica de navegação centralizada ---
-
-    st.sidebar.title("Navegação")
-    if 'main_menu_selection' not in st.session_state:
-        st.session_state['main_menu_selection'] = "Home"
-
-    menu_options = ["Home", "Gerenciar Deputados", "Gerenciar Emendas", "Gerenciar Categorias", "Otimizar Distribuição", "Relatórios"]
-    page = st.sidebar.selectbox("Ir para", menu_options, key='main_menu_selection', index=menu_options.index(st.session_state['main_menu_selection']))
-
-
-    if page == "Home":
-        home_page()
-    elif page == "Gerenciar Deputados":
-        # O 'deputy_menu_choice' é inicializado dentro de manage_deputies_page, antes do seu selectbox ser criado
-        manage_deputies_page()
-    elif page == "Gerenciar Emendas":
-        # O 'emenda_menu_choice' é inicializado dentro de manage_emendas_page, antes do seu selectbox ser criado
-        manage_emendas_page()
-    elif page == "Gerenciar Categorias":
-        manage_categories_page()
-    elif page == "Otimizar Distribuição":
-        optimize_distribution_page()
-    elif page == "Relatórios":
-        reports_page()
+    first_run = 'startup_timing' not in st.session_state
+    page = build_navigation()
+    url_path = page.url_path or 'home'
+    session_started_at = time.perf_counter()
+    initialize_session_state(PAGE_SUBSYSTEMS[url_path])
+    session_ready_at = time.perf_counter()
+
+    undo_redo_sidebar()
+    with metrics.timer(f"page.{url_path}.ms"):
+        page.run()
+    metrics.observe("app.rerun.ms", (time.perf_counter() - SCRIPT_STARTED_AT) * 1000)
+
+    if first_run:
+        record_startup_timing(session_started_at, session_ready_at)
+
+def record_startup_timing(session_started_at, session_ready_at):
+    """
+    Tempos da primeira execução da sessão (até a primeira página desenhada), em ms. As importações
+    só custam na primeira sessão do processo; nas seguintes os módulos já estão carregados.
+    """
+    finished_at = time.perf_counter()
+    timing = {
+        'imports': (IMPORTS_DONE_AT - SCRIPT_STARTED_AT) * 1000,
+        'session': (session_ready_at - session_started_at) * 1000,
+        'page': (finished_at - session_ready_at) * 1000,
+        'total': (finished_at - SCRIPT_STARTED_AT) * 1000,
+    }
+    st.session_state.startup_timing = timing
+    metrics.observe("app.startup.ms", timing['total'])
 
 if __name__ == "__main__":
     main_streamlit_app()
\ No newline at end of file
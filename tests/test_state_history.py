@@ -0,0 +1,106 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AllocationOptimizer import AllocationOptimizer, OptimizationCancelled, PHASE_INTENTION
+from CategoryManager import CategoryManager
+from DataManager import DataManager
+from DeputyManager import DeputyManager
+from EmendaManager import EmendaManager
+from EventBus import EventBus
+from AllocationSnapshot import SnapshotStore
+from StateHistory import StateHistory
+
+
+def _managers(data_dir):
+    data_manager = DataManager(str(data_dir))
+    event_bus = EventBus()
+    deputy_manager = DeputyManager(data_manager, event_bus)
+    emenda_manager = EmendaManager(data_manager, event_bus)
+    category_manager = CategoryManager(data_manager, event_bus)
+    return data_manager, event_bus, deputy_manager, emenda_manager, category_manager
+
+
+def _count_reads(text_store):
+    reads = []
+    original_get = text_store.get
+    def get(key):
+        reads.append(key)
+        return original_get(key)
+    text_store.get = get
+    return reads
+
+
+def test_undo_restores_profile(tmp_path):
+    data_manager, event_bus, deputy_manager, emenda_manager, category_manager = _managers(tmp_path)
+    deputy = deputy_manager.add_deputy("Fulano", 1000.0, "PERFIL ORIGINAL")
+    history = StateHistory(deputy_manager, emenda_manager, category_manager, event_bus)
+
+    deputy_manager.update_deputy(deputy.id, new_profile="NOVO PERFIL")
+    history.commit()
+    assert history.undo() == (True, "Desfeito: Edição de deputado")
+    assert deputy_manager.get_deputy_by_id(deputy.id).profile == "PERFIL ORIGINAL"
+    assert DeputyManager(DataManager(str(tmp_path))).get_deputy_by_id(deputy.id).profile == "PERFIL ORIGINAL"
+
+    assert history.redo()[0]
+    assert deputy_manager.get_deputy_by_id(deputy.id).profile == "NOVO PERFIL"
+
+
+def test_undo_of_delete_restores_profile(tmp_path):
+    data_manager, event_bus, deputy_manager, emenda_manager, category_manager = _managers(tmp_path)
+    deputy = deputy_manager.add_deputy("Fulano", 1000.0, "PERFIL")
+    history = StateHistory(deputy_manager, emenda_manager, category_manager, event_bus)
+
+    deputy_manager.delete_deputy(deputy.id)
+    history.commit()
+    assert history.undo()[0]
+    assert deputy_manager.get_deputy_by_id(deputy.id).profile == "PERFIL"
+    assert DeputyManager(DataManager(str(tmp_path))).get_deputy_by_id(deputy.id).profile == "PERFIL"
+
+
+def test_deleted_profiles_are_pruned_on_load(tmp_path):
+    data_manager, _, deputy_manager, _, _ = _managers(tmp_path)
+    kept = deputy_manager.add_deputy("Fica", 1000.0, "PERFIL A")
+    removed = deputy_manager.add_deputy("Sai", 1000.0, "PERFIL B")
+    deputy_manager.delete_deputy(removed.id)
+
+    reloaded = DataManager(str(tmp_path))
+    DeputyManager(reloaded)
+    assert reloaded.profile_store.keys() == {f"{kept.id}.1"}
+
+
+def test_history_and_snapshots_do_not_read_profiles(tmp_path):
+    data_manager, event_bus, deputy_manager, emenda_manager, category_manager = _managers(tmp_path)
+    deputy = deputy_manager.add_deputy("Fulano", 1000.0, "PERFIL")
+    data_manager, event_bus, deputy_manager, emenda_manager, category_manager = _managers(tmp_path)
+    reads = _count_reads(data_manager.profile_store)
+
+    snapshot_store = SnapshotStore(deputy_manager, emenda_manager, event_bus)
+    history = StateHistory(deputy_manager, emenda_manager, category_manager, event_bus)
+    deputy_manager.update_deputy(deputy.id, new_verba=2000.0)
+    history.commit()
+    history.undo()
+    assert reads == []
+    assert snapshot_store.current().get_deputy_by_id(deputy.id).profile is None
+
+
+def test_cancelled_optimization_leaves_nothing_to_undo(tmp_path):
+    data_manager, event_bus, deputy_manager, emenda_manager, category_manager = _managers(tmp_path)
+    category_manager.add_category("Saúde")
+    deputy_manager.add_deputy("Fulano", 1000.0)
+    emenda_manager.add_emenda("Posto", 500.0, "Saúde")
+    history = StateHistory(deputy_manager, emenda_manager, category_manager, event_bus)
+    optimizer = AllocationOptimizer(deputy_manager, emenda_manager, data_manager, event_bus)
+
+    def cancel(phase, fraction):
+        if phase == PHASE_INTENTION:
+            raise OptimizationCancelled()
+
+    with pytest.raises(OptimizationCancelled):
+        optimizer.perform_full_redistribution(progress=cancel)
+    assert not history.has_pending_changes()
+    history.commit()
+    assert not history.can_undo()